@@ -0,0 +1,74 @@
+"""
+带版本号的应用状态 - 支持按字段增量读取，写时复制，读取不加锁
+"""
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+# 一次发布的状态：全局版本号、只读字段表、各字段最后变化的版本
+StateSnapshot = namedtuple("StateSnapshot", ("version", "data", "versions"))
+
+
+class AppState:
+    """字典式状态容器，每次字段变化递增全局版本号并记录该字段的版本
+
+    前端轮询时传入上次拿到的 version，只返回之后变化过的字段。
+
+    更新在写锁内复制出新的字段表，整体替换当前快照（一次引用赋值）；已发布的快照
+    不再修改。读取只取一次快照引用，不加锁，一次 update() 的多个字段要么都可见
+    要么都不可见。
+    """
+
+    def __init__(self, initial=None):
+        self._lock = threading.Lock()
+        self._snap = StateSnapshot(0, MappingProxyType({}), MappingProxyType({}))
+        if initial:
+            self.update(initial)
+
+    @property
+    def version(self):
+        return self._snap.version
+
+    def view(self):
+        """当前快照（只读），需要一致地读取多个字段时使用"""
+        return self._snap
+
+    def __getitem__(self, key):
+        return self._snap.data[key]
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def __contains__(self, key):
+        return key in self._snap.data
+
+    def get(self, key, default=None):
+        return self._snap.data.get(key, default)
+
+    def update(self, fields=None, **kwargs):
+        if fields:
+            kwargs = {**fields, **kwargs}
+        with self._lock:
+            snap = self._snap
+            old = snap.data
+            changed = {k: v for k, v in kwargs.items() if k not in old or old[k] != v}
+            if not changed:
+                return
+            version = snap.version
+            versions = dict(snap.versions)
+            for key in changed:
+                version += 1
+                versions[key] = version
+            data = dict(old)
+            data.update(changed)
+            self._snap = StateSnapshot(version, MappingProxyType(data), MappingProxyType(versions))
+
+    def snapshot(self, since_version=None, exclude=()):
+        """since_version 为 None 时返回完整状态（去掉 exclude），否则只返回变化的字段"""
+        snap = self._snap
+        if since_version is None:
+            s = {k: v for k, v in snap.data.items() if k not in exclude}
+        else:
+            s = {k: snap.data[k] for k, ver in snap.versions.items() if ver > since_version}
+        s["version"] = snap.version
+        return s
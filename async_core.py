@@ -0,0 +1,121 @@
+"""
+异步核心 - 一个事件循环线程统一调度许可证请求、心跳、租约续期和前端分发
+
+PDD_ASYNC=1 时启用（默认关闭，各部分仍使用各自的线程）。事件循环中只做非阻塞工作；
+采集、evaluate_js 以及未安装 httpx 时的许可证请求放到核心的线程池中执行。
+asyncio 在启动核心时才导入，不增加默认模式的启动耗时。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+ASYNC_MODE = os.getenv("PDD_ASYNC", "0") == "1"
+BLOCKING_WORKERS = 4  # 采集 1 个 + 前端调用 1 个 + 许可证请求/续期
+
+
+class BlockingTask:
+    """线程池中运行的阻塞任务，提供与 threading.Thread 相同的 is_alive()/join()"""
+
+    def __init__(self, future):
+        self.future = future
+
+    def is_alive(self):
+        return not self.future.done()
+
+    def join(self, timeout=None):
+        wait([self.future], timeout)
+
+
+class LoopTimer:
+    """call_later 返回的定时器，cancel() 可在任意线程调用"""
+
+    def __init__(self, core):
+        self.core = core
+        self._handle = None
+        self._cancelled = False
+
+    def _arm(self, delay, fn):
+        if not self._cancelled:
+            self._handle = self.core.loop.call_later(delay, self.core.run_blocking, fn)
+
+    def cancel(self):
+        self._cancelled = True
+        handle = self._handle
+        if handle is not None:
+            self.core.loop.call_soon_threadsafe(handle.cancel)
+
+
+class AsyncCore:
+    """单个事件循环线程 + 阻塞工作线程池
+
+    submit(coro) 从任意线程提交协程，返回 concurrent.futures.Future；
+    run_blocking(fn, *args) 在循环中 await 线程池里的阻塞调用；
+    spawn(fn, *args) 从任意线程把长时间的阻塞任务（如一次采集）放进线程池；
+    call_later(delay, fn) 到期后在线程池中调用 fn。
+    """
+
+    def __init__(self, workers=BLOCKING_WORKERS):
+        self.loop = None
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="pdd-blocking")
+        self._thread = None
+        self._ready = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="pdd-async", daemon=True)
+            self._thread.start()
+            self._ready.wait()
+        return self
+
+    def _run(self):
+        import asyncio
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.set_default_executor(self.executor)
+        self.loop = loop
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def in_loop(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        import asyncio
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run_blocking(self, fn, *args):
+        return self.loop.run_in_executor(self.executor, fn, *args)
+
+    def spawn(self, fn, *args):
+        return BlockingTask(self.executor.submit(fn, *args))
+
+    def call_later(self, delay, fn):
+        timer = LoopTimer(self)
+        self.loop.call_soon_threadsafe(timer._arm, delay, fn)
+        return timer
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "blocking_workers": self.executor._max_workers,
+            "blocking_queue": self.executor._work_queue.qsize(),
+        }
+
+    def stop(self, timeout=2.0):
+        """停止事件循环（未完成的任务被取消），线程池不再接受新任务"""
+        if self.running:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            if not self.in_loop():
+                self._thread.join(timeout)
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,262 @@
+"""
+批量过滤与派生指标 - 商品先攒成列缓冲，按批一次完成阈值判断、派生指标和运行内分位排名
+
+安装了 NumPy 时整批向量化计算；未安装时退回纯 Python 实现，结果相同（舍入边界值可能差最后一位）。
+阈值语义与采集器一致：价格不高于 price、拼单数不低于 pinned、评价数不低于 reviews（为 0 时不限）。
+采集器（pdd_scraper，不在本仓库）仍按同样的阈值逐条过滤，阈值可能决定它打开哪些页面，因此不改为 0；
+这里再判断一次是整批的向量化比较，保证任何 runner（子进程引擎、其他采集器）的结果都满足阈值。
+"""
+import os
+import time
+from bisect import bisect_right
+
+DEFAULT_BATCH_SIZE = int(os.getenv("PDD_BATCH_SIZE", "200"))  # 0 表示逐条处理
+BATCH_DELAY = 0.2  # 攒批最长等待（秒），超时后下一条商品到达时提交
+RANK_FIELDS = ("price", "pinned")
+
+_numpy = None
+
+
+def load_numpy():
+    """NumPy 可用时返回模块，否则返回 False（只尝试导入一次）"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+
+def _to_float(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# 分位排名用的对数分桶：0 以及 0.01 到约 1e7，相邻边界相差约 2%
+RANK_BUCKETS = 1024
+_RATIO = (1e9) ** (1 / (RANK_BUCKETS - 1))
+RANK_EDGES = [0.0] + [0.01 * _RATIO ** i for i in range(RANK_BUCKETS)]
+
+
+class RankSketch:
+    """定长直方图估计某个值在已加入值中的百分位，内存和每批开销与商品数无关
+
+    桶内按线性插值，精度约为相邻边界的 2%。
+    """
+
+    def __init__(self, np=False):
+        self.np = np
+        self.total = 0
+        if np:
+            self.edges = np.array(RANK_EDGES)
+            self.counts = np.zeros(len(RANK_EDGES) + 1, dtype=np.int64)
+        else:
+            self.edges = RANK_EDGES
+            self.counts = [0] * (len(RANK_EDGES) + 1)
+
+    def state(self):
+        return {"total": self.total, "counts": self.counts.tolist() if self.np else list(self.counts)}
+
+    def load_state(self, state):
+        counts = state.get("counts") or []
+        if len(counts) != len(self.counts):
+            return
+        self.total = int(state.get("total") or 0)
+        self.counts = self.np.array(counts, dtype=self.np.int64) if self.np else list(counts)
+
+    def _frac(self, x, b):
+        edges = self.edges
+        if b == 0 or b >= len(edges):
+            return 1.0
+        lo, hi = edges[b - 1], edges[b]
+        return (x - lo) / (hi - lo)
+
+    def add_and_rank(self, values):
+        """加入一批值，返回每个值的百分位（0-100，一位小数）"""
+        if self.np:
+            return self._add_numpy(values)
+        counts = self.counts
+        idx = [bisect_right(self.edges, x) for x in values]
+        for b in idx:
+            counts[b] += 1
+        self.total += len(values)
+        below, acc = [], 0
+        for c in counts:
+            below.append(acc)
+            acc += c
+        scale = 100.0 / self.total
+        return [round((below[b] + counts[b] * self._frac(x, b)) * scale, 1) for x, b in zip(values, idx)]
+
+    def _add_numpy(self, values):
+        np, edges = self.np, self.edges
+        idx = np.searchsorted(edges, values, side="right")
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+        self.total += len(values)
+        below = np.cumsum(self.counts) - self.counts
+        # 首尾两个开区间桶按整桶计
+        inner = (idx > 0) & (idx < len(edges))
+        lo = edges[np.clip(idx - 1, 0, len(edges) - 1)]
+        hi = edges[np.clip(idx, 0, len(edges) - 1)]
+        frac = np.where(inner, (values - lo) / np.where(inner, hi - lo, 1.0), 1.0)
+        return np.round((below[idx] + self.counts[idx] * frac) * (100.0 / self.total), 1).tolist()
+
+
+class BatchColumns:
+    """一批通过阈值的商品及其数值列（list[float]，与 items 一一对应）"""
+
+    __slots__ = ("items", "price", "pinned", "reviews", "skipped")
+
+    def __init__(self, items, price, pinned, reviews, skipped=0):
+        self.items = items
+        self.price = price
+        self.pinned = pinned
+        self.reviews = reviews
+        self.skipped = skipped  # 通过阈值、被 accept 丢弃的条数
+
+    def __len__(self):
+        return len(self.items)
+
+
+class BatchFilter:
+    """按批过滤商品并补充派生字段
+
+    push(item) 返回 True 时表示应调用 flush()。flush(accept) 返回通过阈值且 accept(item) 为真
+    （如跨次去重）的商品（BatchColumns），只有这些商品计入分位排名，每条商品补充：
+      price_per_review  价格 / 评价数（评价数为 0 时按 1）
+      price_pct         价格在本次采集已通过商品中的百分位（0-100，RankSketch 估计）
+      pinned_pct        拼单数在本次采集已通过商品中的百分位（0-100，RankSketch 估计）
+    """
+
+    def __init__(self, price=0, pinned=0, reviews=0, size=DEFAULT_BATCH_SIZE, delay=BATCH_DELAY, use_numpy=True):
+        self.price = float(price or 0)
+        self.pinned = float(pinned or 0)
+        self.reviews = float(reviews or 0)
+        self.size = max(1, int(size))
+        self.delay = delay
+        self.np = load_numpy() if use_numpy else False
+        self.rejected = 0
+        self.flushes = 0
+        self._items = []
+        self._first_at = None
+        # 本次采集已通过商品的分布，用于分位排名
+        self._ranks = {f: RankSketch(self.np) for f in RANK_FIELDS}
+
+    def state(self):
+        """累计状态（写入采集断点）"""
+        return {"rejected": self.rejected, "flushes": self.flushes,
+                "ranks": {f: r.state() for f, r in self._ranks.items()}}
+
+    def load_state(self, state):
+        self.rejected = int(state.get("rejected") or 0)
+        self.flushes = int(state.get("flushes") or 0)
+        for field, rank in (state.get("ranks") or {}).items():
+            if field in self._ranks:
+                self._ranks[field].load_state(rank)
+
+    @property
+    def backend(self):
+        return "numpy" if self.np else "python"
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        """攒批缓冲的深度和滞后（最早一条已等待的秒数）"""
+        return {"policy": "batch", "depth": len(self._items), "maxsize": self.size,
+                "lag": round(time.monotonic() - self._first_at, 3) if self._items else 0.0,
+                "rejected": self.rejected, "flushes": self.flushes}
+
+    @property
+    def expired(self):
+        """缓冲中最早的商品已等待超过 delay"""
+        return bool(self._items) and time.monotonic() - self._first_at >= self.delay
+
+    def push(self, item):
+        if not self._items:
+            self._first_at = time.monotonic()
+        self._items.append(item)
+        return len(self._items) >= self.size or time.monotonic() - self._first_at >= self.delay
+
+    def flush(self, accept=None):
+        """accept(item) 在阈值判断之后、分位排名之前按顺序调用，返回假值的商品被丢弃"""
+        items, self._items = self._items, []
+        if not items:
+            return BatchColumns([], [], [], [])
+        self.flushes += 1
+        out = self._flush_numpy(items, accept) if self.np else self._flush_python(items, accept)
+        self.rejected += len(items) - len(out) - out.skipped
+        return out
+
+    def _column(self, items, field):
+        np = self.np
+        values = [item.get(field) for item in items]
+        try:
+            col = np.array(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            return np.array([_to_float(v) for v in values], dtype=np.float64)
+        return np.nan_to_num(col, nan=0.0)
+
+    def _flush_numpy(self, items, accept=None):
+        np = self.np
+        price = self._column(items, "price")
+        pinned = self._column(items, "pinned")
+        reviews = self._column(items, "reviews")
+        mask = np.ones(len(items), dtype=bool)
+        if self.price > 0:
+            mask &= price <= self.price
+        if self.pinned > 0:
+            mask &= pinned >= self.pinned
+        if self.reviews > 0:
+            mask &= reviews >= self.reviews
+        if not mask.all():
+            keep = np.flatnonzero(mask)
+            items = [items[i] for i in keep]
+            price, pinned, reviews = price[mask], pinned[mask], reviews[mask]
+        skipped = 0
+        if accept is not None and items:
+            keep = [i for i, item in enumerate(items) if accept(item)]
+            skipped = len(items) - len(keep)
+            if skipped:
+                items = [items[i] for i in keep]
+                price, pinned, reviews = price[keep], pinned[keep], reviews[keep]
+        if not items:
+            return BatchColumns([], [], [], [], skipped)
+        ppr = np.round(price / np.maximum(reviews, 1.0), 4)
+        price_pct = self._ranks["price"].add_and_rank(price)
+        pinned_pct = self._ranks["pinned"].add_and_rank(pinned)
+        for item, a, b, c in zip(items, ppr.tolist(), price_pct, pinned_pct):
+            item["price_per_review"] = a
+            item["price_pct"] = b
+            item["pinned_pct"] = c
+        return BatchColumns(items, price.tolist(), pinned.tolist(), reviews.tolist(), skipped)
+
+    def _flush_python(self, items, accept=None):
+        out, price, pinned, reviews = [], [], [], []
+        skipped = 0
+        for item in items:
+            p = _to_float(item.get("price"))
+            n = _to_float(item.get("pinned"))
+            r = _to_float(item.get("reviews"))
+            if (self.price > 0 and p > self.price) or (self.pinned > 0 and n < self.pinned) \
+                    or (self.reviews > 0 and r < self.reviews):
+                continue
+            if accept is not None and not accept(item):
+                skipped += 1
+                continue
+            out.append(item)
+            price.append(p)
+            pinned.append(n)
+            reviews.append(r)
+        if not out:
+            return BatchColumns([], [], [], [], skipped)
+        price_pct = self._ranks["price"].add_and_rank(price)
+        pinned_pct = self._ranks["pinned"].add_and_rank(pinned)
+        for item, p, r, a, b in zip(out, price, reviews, price_pct, pinned_pct):
+            item["price_per_review"] = round(p / max(r, 1.0), 4)
+            item["price_pct"] = a
+            item["pinned_pct"] = b
+        return BatchColumns(out, price, pinned, reviews, skipped)
@@ -0,0 +1,209 @@
+"""
+桥接热路径基准 - 合成 run_scraper → on_item/on_progress → evaluate_js，同时轮询 getState/getResults
+
+  python -m benchmarks.bridge                          # 两个桥接各跑一次，输出 JSON
+  python -m benchmarks.bridge --items 50000 --rate 5000 --js-cost 0.0005 --out bench.json
+  python -m benchmarks.bridge --compare bench.json     # 与之前的结果比较
+
+每个桥接在独立子进程中运行，峰值 RSS 互不影响。
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BRIDGES = ("Bridge", "EnhancedBridge")
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(rss / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+    except ImportError:
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / 1024 / 1024, 1)
+        except Exception:
+            return None
+
+
+class Poller(threading.Thread):
+    """按固定频率调用桥接的查询方法，记录耗时和返回的 JSON 字节数"""
+
+    def __init__(self, calls, hz):
+        super().__init__(daemon=True)
+        self.calls = calls
+        self.interval = 1.0 / hz
+        self.latency = []
+        self.bytes = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            for call in self.calls:
+                t0 = time.perf_counter()
+                result = call()
+                self.latency.append(time.perf_counter() - t0)
+                self.bytes += len(json.dumps(result, ensure_ascii=False, default=str).encode("utf-8"))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_one(name, args):
+    """在当前进程中跑一个桥接，返回指标"""
+    from benchmarks import fakes
+    config_dir = fakes.isolate_config()
+    fakes.install()
+    fakes.SCRAPER.update(items=args.items, rate=args.rate, progress_every=args.progress_every)
+    window = fakes.FakeWindow(cost=args.js_cost)
+    export_dir = tempfile.mkdtemp(prefix="pdd_bench_")
+    try:
+        if name == "Bridge":
+            import ui_webview
+            fakes.stub_license(ui_webview)
+            api = ui_webview.Bridge(window)
+            polls = [api.getState]
+        else:
+            import scraper_service
+            import enhanced_webview
+            fakes.stub_license(scraper_service)
+            api = enhanced_webview.EnhancedBridge(window)
+            api._wait_ready()
+            polls = [lambda: api.getState(api.state.version), lambda: api.getResults(50)]
+
+        poller = Poller(polls, args.poll_hz)
+        poller.start()
+        t0 = time.perf_counter()
+        r = api.startScrape({"keyword": "bench", "price": 200, "pinned": 0, "reviews": 0, "exportDir": export_dir, "format": args.format,
+                             "batchSize": args.batch_size})
+        if r.get("status") != "OK":
+            raise RuntimeError(f"startScrape failed: {r}")
+        fakes.recorder.done.wait()
+        scraped = time.perf_counter()
+        # 等待结果文件写完、前端事件发送完
+        if name == "EnhancedBridge":
+            api.scraping_thread.join()
+            api.dispatcher.stop(timeout=60)
+        else:
+            while api.state["status"] != "idle":
+                time.sleep(0.01)
+        drained = time.perf_counter()
+        poller.stop()
+        if name == "EnhancedBridge":
+            api.shutdown()  # 关闭结果库和配置写入，之后删除临时配置目录
+
+        rec = fakes.recorder
+        n = len(rec.item_latency)
+        scrape_s = rec.finished - rec.started
+        return {
+            "items": n,
+            "scrape_s": round(scrape_s, 3),
+            "items_per_s": round(n / scrape_s, 1) if scrape_s else None,
+            "end_to_end_s": round(drained - t0, 3),
+            "drain_ms": round((drained - scraped) * 1000, 1),
+            "on_item_p50_us": round(percentile(rec.item_latency, 0.5) * 1e6, 1),
+            "on_item_p99_us": round(percentile(rec.item_latency, 0.99) * 1e6, 1),
+            "on_progress_p50_us": round(percentile(rec.progress_latency, 0.5) * 1e6, 1),
+            "on_progress_p99_us": round(percentile(rec.progress_latency, 0.99) * 1e6, 1),
+            "evaluate_js_calls": window.calls,
+            "evaluate_js_bytes": window.bytes,
+            "evaluate_js_s": round(window.seconds, 3),
+            "poll_calls": len(poller.latency),
+            "poll_p50_us": round(percentile(poller.latency, 0.5) * 1e6, 1),
+            "poll_p99_us": round(percentile(poller.latency, 0.99) * 1e6, 1),
+            "poll_bytes": poller.bytes,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    finally:
+        shutil.rmtree(export_dir, ignore_errors=True)
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+
+def run_all(args):
+    results = {}
+    for name in args.bridge or BRIDGES:
+        cmd = [sys.executable, "-m", "benchmarks.bridge", "--child", name] + _forward(args)
+        proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            results[name] = {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+            continue
+        results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {k: getattr(args, k) for k in ("items", "rate", "progress_every", "js_cost", "poll_hz", "format", "batch_size")},
+        "results": results,
+    }
+
+
+def _forward(args):
+    return [
+        "--items", str(args.items), "--rate", str(args.rate), "--progress-every", str(args.progress_every),
+        "--js-cost", str(args.js_cost), "--poll-hz", str(args.poll_hz), "--format", args.format,
+        "--batch-size", str(args.batch_size),
+    ]
+
+
+def compare(current, previous):
+    """打印与之前结果的比值（当前/之前）"""
+    lines = []
+    for name, cur in current["results"].items():
+        prev = previous.get("results", {}).get(name)
+        if not prev or "error" in cur:
+            continue
+        for key, value in cur.items():
+            old = prev.get(key)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+                lines.append(f"{name:15s} {key:22s} {old:>14} -> {value:>14}  x{value / old:.2f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="桥接热路径基准")
+    ap.add_argument("--bridge", action="append", choices=BRIDGES, help="只跑指定桥接，可重复")
+    ap.add_argument("--items", type=int, default=20000)
+    ap.add_argument("--rate", type=float, default=0, help="合成商品速率（条/秒），0 为不限速")
+    ap.add_argument("--progress-every", type=int, default=20)
+    ap.add_argument("--js-cost", type=float, default=0.0002, help="模拟每次 evaluate_js 的开销（秒）")
+    ap.add_argument("--poll-hz", type=float, default=20, help="getState/getResults 轮询频率")
+    ap.add_argument("--batch-size", type=int, default=200, help="EnhancedBridge 批量过滤阶段的批大小，0 为逐条处理")
+    ap.add_argument("--format", default="csv", choices=["xlsx", "csv", "jsonl"], help="EnhancedBridge 结果文件格式")
+    ap.add_argument("--out", help="结果写入 JSON 文件")
+    ap.add_argument("--compare", help="与之前保存的结果 JSON 比较")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_one(args.child, args)))
+        return 0
+
+    result = run_all(args)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print(compare(result, json.load(f)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+导出格式基准 - 合成结果行写入各导出格式，比较写入吞吐和文件大小
+
+  python -m benchmarks.export
+  python -m benchmarks.export --rows 200000 --formats xlsx csv csv.gz parquet --out export.json
+
+未安装可选依赖（openpyxl / zstandard / pyarrow）的格式标记为 skipped。
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from result_export import EXPORT_FORMATS, ExportUnavailable, export_rows, export_path
+
+DEFAULT_FORMATS = [f for f in EXPORT_FORMATS if f != "excel"]
+
+
+def synthetic_rows(n, seed=0):
+    rng = random.Random(seed)
+    words = ["手机壳", "数据线", "保温杯", "拖鞋", "收纳盒", "雨伞", "袜子", "台灯", "抽纸", "牙刷"]
+    for i in range(n):
+        goods_id = 100000000 + i
+        yield {
+            "title": " ".join(rng.choice(words) for _ in range(4)) + f" 款{i % 97}",
+            "price": round(rng.uniform(1, 300), 2),
+            "pinned": rng.randint(0, 100000),
+            "reviews": rng.randint(0, 20000),
+            "url": f"https://mobile.yangkeduo.com/goods.html?goods_id={goods_id}",
+        }
+
+
+def bench_format(fmt, rows, workdir, repeat=1):
+    path = export_path(os.path.join(workdir, "bench"), fmt)
+    times = []
+    try:
+        for i in range(repeat):
+            t0 = time.perf_counter()
+            n = export_rows(synthetic_rows(rows, seed=i), path, fmt)
+            times.append(time.perf_counter() - t0)
+    except ExportUnavailable as e:
+        return {"format": fmt, "skipped": str(e)}
+    best = min(times)
+    size = os.path.getsize(path)
+    os.remove(path)
+    return {
+        "format": fmt,
+        "rows": n,
+        "seconds": round(best, 3),
+        "rows_per_s": int(n / best) if best else 0,
+        "file_size": size,
+        "bytes_per_row": round(size / n, 1) if n else 0.0,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="导出格式写入基准")
+    ap.add_argument("--rows", type=int, default=100000)
+    ap.add_argument("--formats", nargs="+", default=DEFAULT_FORMATS, choices=sorted(EXPORT_FORMATS))
+    ap.add_argument("--repeat", type=int, default=3, help="每个格式重复次数，取最快一次")
+    ap.add_argument("--out", help="结果写入 JSON 文件")
+    args = ap.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="pdd_export_bench_")
+    try:
+        # 合成数据本身的开销（已计入各格式耗时）
+        t0 = time.perf_counter()
+        for _ in synthetic_rows(args.rows):
+            pass
+        gen = time.perf_counter() - t0
+        results = [bench_format(fmt, args.rows, workdir, args.repeat) for fmt in args.formats]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    base = next((r for r in results if r["format"] == "xlsx" and "seconds" in r), None)
+    for r in results:
+        if base is not None and "seconds" in r:
+            r["speedup_vs_xlsx"] = round(base["seconds"] / r["seconds"], 2) if r["seconds"] else None
+            r["size_vs_xlsx"] = round(r["file_size"] / base["file_size"], 3)
+    text = json.dumps({"rows": args.rows, "generate_seconds": round(gen, 3), "results": results},
+                      ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+基准用替身 - 假 webview 窗口、合成 run_scraper 和许可证打桩
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import types
+
+# 合成采集参数，由基准在运行前设置
+SCRAPER = {
+    "items": 20000,  # 商品总数
+    "rate": 0,  # 每秒商品数，0 表示不限速
+    "progress_every": 20,  # 每多少条商品回调一次进度
+    "list_size": 40,  # 每个列表页的商品数
+}
+
+
+class ScraperRecorder:
+    """记录合成采集中每次回调的耗时"""
+
+    def __init__(self):
+        self.item_latency = []
+        self.progress_latency = []
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def reset(self):
+        self.__init__()
+
+
+recorder = ScraperRecorder()
+
+
+def _make_item(i, rng):
+    return {
+        "goods_id": str(100000000 + i),
+        "title": f"合成商品{i} 夏季新款加厚耐磨多功能收纳整理箱家用大号",
+        "price": round(rng.uniform(1, 200), 2),
+        "pinned": rng.randint(0, 100000),
+        "reviews": rng.randint(0, 5000),
+        "url": f"https://mobile.yangkeduo.com/goods.html?goods_id={100000000 + i}",
+        "shop": f"店铺{i % 500}",
+    }
+
+
+def run_scraper(keyword, price, pinned, reviews, on_item=None, on_progress=None, stop_event=None, output_path=None,
+                cursor=None, **kwargs):
+    """按 SCRAPER 配置生成商品，记录 on_item/on_progress 的调用耗时
+
+    进度中的 cursor 为已生成的商品数，传入 cursor 时从该位置继续（生成的商品与不中断时相同）。
+    """
+    rng = random.Random(42)
+    start = int(cursor or 0)
+    for i in range(start):
+        _make_item(i, rng)
+    total = SCRAPER["items"]
+    interval = 1.0 / SCRAPER["rate"] if SCRAPER["rate"] else 0.0
+    every = SCRAPER["progress_every"]
+    recorder.started = time.perf_counter()
+    next_at = recorder.started
+    try:
+        for i in range(start, total):
+            if stop_event is not None and stop_event.is_set():
+                break
+            if interval:
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            item = _make_item(i, rng)
+            if on_item:
+                t0 = time.perf_counter()
+                on_item(item)
+                recorder.item_latency.append(time.perf_counter() - t0)
+            if on_progress and (i + 1) % every == 0:
+                info = {
+                    "visited": i + 1,
+                    "collected": i + 1,
+                    "filtered": 0,
+                    "list_count": (i + 1) // SCRAPER["list_size"],
+                    "batch_progress": f"{i + 1}/{total}",
+                    "cursor": i + 1,
+                }
+                t0 = time.perf_counter()
+                on_progress(info)
+                recorder.progress_latency.append(time.perf_counter() - t0)
+    finally:
+        recorder.finished = time.perf_counter()
+        recorder.done.set()
+
+
+class FakeWindow:
+    """记录 evaluate_js 调用次数、字节数和耗时；cost 模拟每次跨进程调用的固定开销（秒）"""
+
+    def __init__(self, cost=0.0002):
+        self.cost = cost
+        self.calls = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self.events = types.SimpleNamespace(shown=_Event(), loaded=_Event(), closed=_Event())
+
+    def evaluate_js(self, script):
+        t0 = time.perf_counter()
+        if self.cost:
+            time.sleep(self.cost)
+        with self._lock:
+            self.calls += 1
+            self.bytes += len(script.encode("utf-8"))
+            self.seconds += time.perf_counter() - t0
+
+    def create_file_dialog(self, *args, **kwargs):
+        return None
+
+    def expose(self, func):
+        pass
+
+    def destroy(self):
+        pass
+
+
+class _Event:
+    def __iadd__(self, handler):
+        return self
+
+
+def isolate_config():
+    """APPDATA/HOME 指向新的临时目录，配置、结果库、断点和去重索引不写入真实的配置目录
+
+    必须在导入桥接模块之前调用（config_store 导入时确定配置目录），返回临时目录供调用方删除。
+    """
+    path = tempfile.mkdtemp(prefix="pdd_bench_config_")
+    os.environ["APPDATA"] = path
+    os.environ["HOME"] = path
+    return path
+
+
+def install():
+    """用替身替换 webview 和 pdd_scraper，必须在导入桥接模块之前调用"""
+    webview = types.ModuleType("webview")
+    webview.FOLDER_DIALOG = 20
+    webview.create_window = lambda *a, **k: FakeWindow()
+    webview.start = lambda *a, **k: None
+    sys.modules["webview"] = webview
+
+    scraper = types.ModuleType("pdd_scraper")
+    scraper.run_scraper = run_scraper
+    scraper.DEFAULT_KEYWORD = "收纳箱"
+    scraper.DEFAULT_PRICE_THRESHOLD = 200.0
+    scraper.DEFAULT_PINNED_THRESHOLD = 0
+    scraper.DEFAULT_REVIEWS_THRESHOLD = 0
+    sys.modules["pdd_scraper"] = scraper
+
+
+def stub_license(*modules):
+    """让许可证检查直接通过，不访问网络"""
+    ok = {"status": "OK", "license_id": 1, "session_token": "bench", "expires_at": "2099-01-01T00:00:00"}
+    for module in modules:
+        if hasattr(module, "load_license_state"):
+            module.load_license_state = lambda *a, **k: {"license_key": "BENCH"}
+        if hasattr(module, "validate_cached"):
+            module.validate_cached = lambda *a, **k: dict(ok)
+        if hasattr(module, "validate_cached_async"):
+            module.validate_cached_async = _async_result(ok)
+
+
+def _async_result(result):
+    async def call(*args, **kwargs):
+        return dict(result)
+    return call
@@ -0,0 +1,115 @@
+"""
+有界队列检查 - item_pipeline.BoundedQueue 各溢出策略的行为，以及控制消息不会被丢弃
+
+  python -m benchmarks.pipeline
+
+检查项（任何一项失败时退出码为 1）：
+- 队列满时以 block 入队的控制消息只挤掉一条可丢弃的商品，没有可挤的商品时等待而不丢弃
+- drop_oldest 保留最新的商品；sample 队列过半后按比例抽样
+- 慢消费者 + block：生产者等待，条目不丢、不乱序
+- PipelineStage.call 在之前入队的条目处理完后调用，调用方不等待
+"""
+import json
+import sys
+import threading
+import time
+
+from item_pipeline import BoundedQueue, PipelineStage
+
+
+def drain(q):
+    return [q.get_nowait() for _ in range(q.qsize())]
+
+
+def check_control(fail):
+    # 两条控制消息 + 一条商品，满队列再放一条控制消息：挤掉商品，控制消息全部保留
+    q = BoundedQueue(3, "drop_oldest")
+    q.put("ctl1", "block")
+    q.put("ctl2", "block")
+    q.put("item")
+    if not q.put("ctl3", "block", timeout=0.05):
+        fail("control.rejected", q.stats())
+    if q.stats()["dropped"] != 1:
+        fail("control.dropped", q.stats())
+    got = drain(q)
+    if got != ["ctl1", "ctl2", "ctl3"]:
+        fail("control.order", got)
+
+    # 满队列全是商品：一条控制消息只挤掉一条
+    q = BoundedQueue(3, "drop_oldest")
+    for i in range(3):
+        q.put(i)
+    q.put("ctl", "block")
+    got = drain(q)
+    if got != [1, 2, "ctl"]:
+        fail("control.single_eviction", got)
+
+    # 满队列全是控制消息：等到消费者取走一条后入队
+    q = BoundedQueue(2, "drop_oldest")
+    q.put("a", "block")
+    q.put("b", "block")
+    threading.Timer(0.05, q.get).start()
+    if not q.put("c", "block", timeout=2.0) or q.stats()["dropped"]:
+        fail("control.wait", q.stats())
+
+
+def check_policies(fail):
+    q = BoundedQueue(10, "drop_oldest")
+    for i in range(25):
+        q.put(i)
+    got = drain(q)
+    if got != list(range(15, 25)):
+        fail("drop_oldest.kept", got)
+
+    q = BoundedQueue(10, "sample")
+    for i in range(100):
+        q.put(i)
+    s = q.stats()
+    if s["sampled"] == 0 or s["depth"] > 10:
+        fail("sample.stats", s)
+
+
+def check_block(fail):
+    out = []
+    stage = PipelineStage("check", lambda batch: (time.sleep(0.002), out.extend(batch)), maxsize=20, max_batch=5)
+    stage.start()
+    for i in range(500):
+        stage.put(i)
+    stage.drain()
+    stage.close()
+    if out != list(range(500)):
+        fail("block.lossless", {"count": len(out)})
+    if stage.stats()["blocked_seconds"] <= 0:
+        fail("block.backpressure", stage.stats())
+
+
+def check_call(fail):
+    out, seen = [], []
+    stage = PipelineStage("call", lambda batch: (time.sleep(0.001), out.extend(batch)), maxsize=50, max_batch=7)
+    stage.start()
+    for i in range(200):
+        stage.put(i)
+        if i % 40 == 39:
+            stage.call(lambda n: seen.append((n, len(out))), i + 1)
+    stage.drain()
+    stage.close()
+    if seen != [(n, n) for n in range(40, 201, 40)]:
+        fail("call.order", seen)
+    if out != list(range(200)):
+        fail("call.lossless", {"count": len(out)})
+
+
+def main():
+    failures = []
+
+    def fail(name, detail):
+        failures.append({"check": name, "detail": detail})
+
+    for check in (check_control, check_policies, check_block, check_call):
+        check(fail)
+    print(json.dumps({"failures": failures, "ok": not failures}, ensure_ascii=False, indent=2, default=str))
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+启动耗时基准 - 用 -X importtime 统计导入启动模块的耗时，并检查重模块没有进入启动路径
+
+  python -m benchmarks.startup
+  python -m benchmarks.startup --budget-ms 150 --baseline startup_baseline.json --out startup.json
+
+超出预算、比基线慢超过容差或导入了重模块时退出码为 1。
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 这些模块只允许在窗口显示后由后台线程导入
+HEAVY_MODULES = ("webview", "pdd_scraper", "requests", "urllib3", "openpyxl", "numpy", "pyarrow")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_profile(module):
+    """在干净的子进程中导入 module，返回 [(模块名, self_us, cumulative_us, 层级)]"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
+
+
+def measure(module="enhanced_webview", runs=5, top=10):
+    totals = []
+    rows = []
+    for _ in range(runs):
+        rows = import_profile(module)
+        totals.append(next(cum for name, _, cum, _ in rows if name == module) / 1000)
+    imported = {name for name, *_ in rows}
+    heavy = sorted(n for n in imported if n.split(".")[0] in HEAVY_MODULES)
+    slowest = sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "runs": runs,
+        "median_ms": round(statistics.median(totals), 2),
+        "min_ms": round(min(totals), 2),
+        "max_ms": round(max(totals), 2),
+        "modules": len(imported),
+        "heavy_imports": heavy,
+        "slowest_self_ms": [{"module": n, "self_ms": round(s / 1000, 2)} for n, s, _, _ in slowest],
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="启动导入耗时基准")
+    ap.add_argument("--module", default="enhanced_webview")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget-ms", type=float, default=None, help="导入耗时中位数上限")
+    ap.add_argument("--baseline", help="之前保存的结果 JSON，用于回归比较")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="相对基线允许变慢的比例")
+    ap.add_argument("--out", help="结果写入 JSON 文件")
+    args = ap.parse_args(argv)
+
+    result = measure(args.module, args.runs)
+    failures = []
+    if result["heavy_imports"]:
+        failures.append(f"启动路径导入了重模块: {', '.join(result['heavy_imports'])}")
+    if args.budget_ms is not None and result["median_ms"] > args.budget_ms:
+        failures.append(f"导入耗时 {result['median_ms']}ms 超出预算 {args.budget_ms}ms")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        limit = base["median_ms"] * (1 + args.tolerance)
+        result["baseline_ms"] = base["median_ms"]
+        if result["median_ms"] > limit:
+            failures.append(f"导入耗时 {result['median_ms']}ms 比基线 {base['median_ms']}ms 慢超过 {args.tolerance:.0%}")
+    result["failures"] = failures
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
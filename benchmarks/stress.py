@@ -0,0 +1,207 @@
+"""
+并发压力测试 - 合成采集全速运行时，多个线程不停调用桥接的查询/清空方法，检查读到的状态是否一致
+
+  python -m benchmarks.stress
+  python -m benchmarks.stress --items 100000 --threads 8 --out stress.json
+
+检查项（任何一项失败或桥接方法抛出异常时退出码为 1）：
+- getState：version 单调不减；同一次进度更新的 visited/collected/batch_progress 相互一致
+- getResults：记录序号连续递减且落在 [oldest, newest] 内；第一页第一条就是 newest；
+  三个字段的统计条数相同，且等于 newest + 1（有记录时）
+- getState(include=["stats"])：三个字段的统计条数相同
+"""
+import argparse
+import json
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict
+
+from benchmarks.bridge import percentile
+
+
+class Checker:
+    def __init__(self):
+        self.violations = Counter()
+        self.examples = {}
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def fail(self, name, detail):
+        with self._lock:
+            self.violations[name] += 1
+            self.examples.setdefault(name, detail)
+
+    def error(self, method, exc):
+        with self._lock:
+            key = f"{method}: {type(exc).__name__}: {exc}"
+            self.errors[key] += 1
+            if self.errors[key] == 1:
+                self.examples.setdefault(key, traceback.format_exc(limit=4))
+
+
+def check_state(checker, s, total):
+    visited, collected, progress = s.get("visited"), s.get("collected"), s.get("batch_progress")
+    # 合成采集中三者由同一次进度更新写入
+    if visited != collected:
+        checker.fail("state.visited_collected", {"visited": visited, "collected": collected})
+    if visited and progress != f"{visited}/{total}":
+        checker.fail("state.batch_progress", {"visited": visited, "batch_progress": progress})
+
+
+def check_stats(checker, name, stats):
+    counts = {f: st["count"] for f, st in stats.items()}
+    if len(set(counts.values())) > 1:
+        checker.fail(f"{name}.stats_counts", counts)
+    return counts
+
+
+def check_results(checker, r, cursor):
+    items, newest, oldest = r["items"], r["newest"], r["oldest"]
+    seqs = [it["seq"] for it in items]
+    if any(b != a - 1 for a, b in zip(seqs, seqs[1:])):
+        checker.fail("results.contiguous", seqs[:10])
+    if seqs and not (oldest <= seqs[-1] and seqs[0] <= newest):
+        checker.fail("results.range", {"first": seqs[0], "last": seqs[-1], "oldest": oldest, "newest": newest})
+    if cursor is None and seqs and seqs[0] != newest:
+        checker.fail("results.first_is_newest", {"first": seqs[0], "newest": newest})
+    counts = check_stats(checker, "results", r["stats"])
+    if newest >= 0 and counts["price"] != newest + 1:
+        checker.fail("results.stats_vs_newest", {"count": counts["price"], "newest": newest})
+
+
+class Hammer(threading.Thread):
+    """不停调用桥接方法直到 stop，记录每个方法的耗时"""
+
+    def __init__(self, api, checker, total, seed, clear_every):
+        super().__init__(daemon=True)
+        self.api = api
+        self.checker = checker
+        self.total = total
+        self.rng = random.Random(seed)
+        self.clear_every = clear_every
+        self.latency = defaultdict(list)
+        self._stop_event = threading.Event()
+
+    def _call(self, method, fn):
+        t0 = time.perf_counter()
+        try:
+            return fn()
+        except Exception as e:
+            self.checker.error(method, e)
+            return None
+        finally:
+            self.latency[method].append(time.perf_counter() - t0)
+
+    def run(self):
+        api, checker = self.api, self.checker
+        version = 0
+        calls = 0
+        while not self._stop_event.is_set():
+            calls += 1
+            s = self._call("getState", api.getState)
+            if s is not None:
+                if s["version"] < version:
+                    checker.fail("state.version_monotonic", {"before": version, "after": s["version"]})
+                version = s["version"]
+                check_state(checker, s, self.total)
+            d = self._call("getState(since)", lambda: api.getState(max(0, version - 5)))
+            if d is not None and d["version"] < version:
+                checker.fail("state.version_monotonic", {"before": version, "after": d["version"]})
+            cursor = self.rng.choice([None, None, max(0, api.results.count - self.rng.randint(1, 500))])
+            offset = self.rng.choice([0, 0, 50])
+            r = self._call("getResults", lambda: api.getResults(50, offset if cursor is not None else 0, cursor))
+            if r is not None:
+                check_results(checker, r, cursor)
+            st = self._call("getState(stats)", lambda: api.getState(None, ["stats", "dispatch"]))
+            if st is not None:
+                check_stats(checker, "state", st["stats"])
+            if calls % 20 == 0:
+                self._call("getMetrics", api.getMetrics)
+                self._call("listJobs", api.listJobs)
+            if self.clear_every and calls % self.clear_every == 0:
+                self._call("clearResults", api.clearResults)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run(args):
+    from benchmarks import fakes
+    config_dir = fakes.isolate_config()
+    fakes.install()
+    fakes.SCRAPER.update(items=args.items, rate=args.rate, progress_every=args.progress_every)
+    import scraper_service
+    import enhanced_webview
+    fakes.stub_license(scraper_service)
+    api = enhanced_webview.EnhancedBridge(fakes.FakeWindow(cost=args.js_cost))
+    api._wait_ready()
+    export_dir = tempfile.mkdtemp(prefix="pdd_stress_")
+    checker = Checker()
+    try:
+        r = api.startScrape({"keyword": "stress", "exportDir": export_dir, "format": "csv", "warehouse": False,
+                             "retention": args.retention})
+        if r.get("status") != "OK":
+            raise RuntimeError(f"startScrape failed: {r}")
+        hammers = [Hammer(api, checker, args.items, i, args.clear_every if i == 0 else 0) for i in range(args.threads)]
+        for h in hammers:
+            h.start()
+        api.scraping_thread.join()
+        for h in hammers:
+            h.stop()
+        api.dispatcher.stop(timeout=30)
+        final = api.getState()
+        if final["collected"] != args.items or api.results.count != args.items:
+            checker.fail("final.count", {"collected": final["collected"], "results": api.results.count})
+    finally:
+        api.shutdown()
+        shutil.rmtree(export_dir, ignore_errors=True)
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+    rec = fakes.recorder
+    scrape_s = rec.finished - rec.started
+    latency = defaultdict(list)
+    for h in hammers:
+        for method, values in h.latency.items():
+            latency[method].extend(values)
+    return {
+        "config": {k: getattr(args, k) for k in ("items", "rate", "threads", "retention", "clear_every")},
+        "items_per_s": round(args.items / scrape_s, 1) if scrape_s else None,
+        "on_item_p99_us": round(percentile(rec.item_latency, 0.99) * 1e6, 1),
+        "calls": {m: {"n": len(v), "p50_us": round(percentile(v, 0.5) * 1e6, 1),
+                      "p99_us": round(percentile(v, 0.99) * 1e6, 1)} for m, v in sorted(latency.items())},
+        "violations": dict(checker.violations),
+        "errors": dict(checker.errors),
+        "examples": checker.examples,
+        "ok": not checker.violations and not checker.errors,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="桥接并发压力测试")
+    ap.add_argument("--items", type=int, default=50000)
+    ap.add_argument("--rate", type=float, default=0, help="合成商品速率（条/秒），0 为不限速")
+    ap.add_argument("--progress-every", type=int, default=5)
+    ap.add_argument("--threads", type=int, default=4, help="调用桥接方法的线程数")
+    ap.add_argument("--retention", type=int, default=2000)
+    ap.add_argument("--clear-every", type=int, default=50, help="第一个线程每多少轮调用一次 clearResults，0 为不调用")
+    ap.add_argument("--js-cost", type=float, default=0.0)
+    ap.add_argument("--out", help="结果写入 JSON 文件")
+    args = ap.parse_args(argv)
+
+    result = run(args)
+    text = json.dumps(result, ensure_ascii=False, indent=2, default=str)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
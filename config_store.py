@@ -0,0 +1,191 @@
+"""
+配置与本地状态 - 应用数据目录（PDDScraper）下的 config.json
+
+启动后第一次访问时读取一次，之后读写都只访问内存；修改由后台线程在 WRITE_DELAY 秒内
+合并为一次写盘（先写临时文件再改名），交互路径上没有小文件读写。键有固定类型：
+
+  export_dir   str    导出目录
+  last_params  dict   上次的采集参数
+  license      dict   激活信息（license_key、license_id）
+  lease        dict   验证租约（见 license_client.LicenseLease），None 表示没有
+  job_history  list   已结束任务的摘要（最近 JOB_HISTORY_LIMIT 条）
+
+config.json 不存在时从旧文件迁移：配置目录下的 app.ini 和工作目录下的 license_state.json
+（迁移后不再读取旧文件）。
+"""
+import atexit
+import copy
+import json
+import os
+import sys
+import threading
+
+CONFIG_DIR = os.path.join(os.getenv("APPDATA", os.path.expanduser("~")), "PDDScraper")
+CONFIG_FILE = "config.json"
+WRITE_DELAY = 0.5  # 合并写盘的等待时间（秒）
+JOB_HISTORY_LIMIT = 200
+
+# 键 -> (类型, 默认值)
+KEYS = {
+    "export_dir": (str, ""),
+    "last_params": (dict, {}),
+    "license": (dict, {}),
+    "lease": (dict, None),
+    "job_history": (list, []),
+}
+
+
+def _check(key, value):
+    if key not in KEYS:
+        raise KeyError(f"未知的配置项: {key}")
+    kind, default = KEYS[key]
+    if not isinstance(value, kind) and not (value is None and default is None):
+        raise TypeError(f"配置项 {key} 应为 {kind.__name__}，实际为 {type(value).__name__}")
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _legacy(directory):
+    """旧版本分散的配置文件"""
+    data = {}
+    try:
+        with open(os.path.join(directory, "app.ini"), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("export_dir="):
+                    data["export_dir"] = line.split("=", 1)[1].strip()
+    except OSError:
+        pass
+    state = _read_json("license_state.json")
+    if isinstance(state, dict) and state:
+        data["license"] = state
+    return data
+
+
+class ConfigStore:
+    """config.json 的内存副本：get 返回副本，set/append 只改内存并唤醒后台写入"""
+
+    def __init__(self, directory=CONFIG_DIR, delay=WRITE_DELAY):
+        self.directory = directory
+        self.path = os.path.join(directory, CONFIG_FILE)
+        self.delay = delay
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._data = None
+        self._dirty = False
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+        self._writer = None
+
+    def _loaded(self):
+        # 调用方持有 _lock
+        if self._data is None:
+            data = _read_json(self.path)
+            if data is None:
+                data = _legacy(self.directory)
+                self._dirty = bool(data)
+            self._data = {}
+            for key, value in (data or {}).items():
+                try:
+                    _check(key, value)
+                except (KeyError, TypeError):
+                    continue
+                self._data[key] = value
+            if self._dirty:
+                self._schedule()
+        return self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            data = self._loaded()
+            if key in data:
+                return copy.deepcopy(data[key])
+        if default is not None:
+            return default
+        return copy.deepcopy(KEYS[key][1])
+
+    def set(self, key, value):
+        _check(key, value)
+        with self._lock:
+            data = self._loaded()
+            if key in data and data[key] == value:
+                return
+            data[key] = copy.deepcopy(value)
+            self._schedule()
+
+    def update(self, fields):
+        for key, value in fields.items():
+            self.set(key, value)
+
+    def append(self, key, entry, limit=JOB_HISTORY_LIMIT):
+        """列表类配置项追加一条，只保留最近 limit 条"""
+        with self._lock:
+            data = self._loaded()
+            items = data.get(key)
+            if items is None:
+                _check(key, [])
+                items = data[key] = []
+            items.append(copy.deepcopy(entry))
+            del items[:-limit]
+            self._schedule()
+
+    def _schedule(self):
+        # 调用方持有 _lock
+        self._dirty = True
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._run, name="config-writer", daemon=True)
+            self._writer.start()
+        self._wake.set()
+
+    def _run(self):
+        while not self._closing.is_set():
+            self._wake.wait()
+            # 等一小段时间，把连续的修改合并成一次写盘；关闭时立即写
+            self._closing.wait(self.delay)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """把未写盘的修改立即写入（原子替换）"""
+        with self._io_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                text = json.dumps(self._data, ensure_ascii=False, separators=(",", ":"))
+                self._dirty = False
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp, self.path)
+                self.writes += 1
+            except OSError as e:
+                with self._lock:
+                    self._dirty = True
+                print(f"保存配置失败: {e}", file=sys.stderr)
+
+    def close(self):
+        self._closing.set()
+        self._wake.set()
+        self.flush()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_config():
+    """进程内共用的配置存储（首次调用时创建，退出时写入未保存的修改）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConfigStore()
+            atexit.register(_store.flush)
+        return _store
@@ -0,0 +1,224 @@
+"""
+跨次采集去重索引 - SQLite 持久化（商品ID/链接），内存 Bloom 过滤器在前
+
+同一商品在 TTL 内再次出现时直接丢弃，不进入结果缓冲、结果文件和前端。
+范围（scope）为 global 时所有关键词共用，为 keyword 时按关键词分别去重。
+"""
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+DEDUP_SCOPES = ("off", "global", "keyword")
+DEFAULT_SCOPE = os.getenv("PDD_DEDUP", "off")
+DEFAULT_TTL = float(os.getenv("PDD_DEDUP_TTL", str(30 * 86400)))  # 秒，默认30天
+FLUSH_EVERY = 500  # 新键攒够多少条写一次库
+GLOBAL_SCOPE = ""
+
+
+def item_key(item):
+    """去重键：goods_id，其次链接中的 goods_id 参数，最后是完整链接"""
+    goods_id = item.get("goods_id")
+    if goods_id:
+        return str(goods_id)
+    url = item.get("url") or ""
+    if not url:
+        return None
+    ids = parse_qs(urlparse(url).query).get("goods_id")
+    return ids[0] if ids else url
+
+
+def scope_for(mode, keyword):
+    if mode == "keyword":
+        return keyword or GLOBAL_SCOPE
+    return GLOBAL_SCOPE
+
+
+class BloomFilter:
+    """定长位数组 + 双重哈希，只会误报不会漏报"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(1, int(capacity))
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class DedupIndex:
+    """线程安全的去重索引，多个采集任务共用一个实例
+
+    新键先进入内存缓冲，攒够 FLUSH_EVERY 条或调用 flush() 时批量写库。
+    Bloom 过滤器判定不存在时无需查库；判定存在时再按 TTL 查库确认。
+    每个范围用过的最大 TTL 记在 scope_ttl 表中，清理过期记录时按它和默认 TTL 中较大者保留。
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.counters = {"checked": 0, "skipped": 0, "bloom_negative": 0, "db_lookups": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            "scope TEXT NOT NULL, key TEXT NOT NULL, seen_at REAL NOT NULL, "
+            "PRIMARY KEY (scope, key)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS scope_ttl (scope TEXT PRIMARY KEY, ttl REAL NOT NULL) WITHOUT ROWID")
+        self._db.commit()
+        self._scope_ttl = dict(self._db.execute("SELECT scope, ttl FROM scope_ttl").fetchall())
+        self.purge()
+        self._load_bloom()
+
+    @staticmethod
+    def _bloom_key(scope, key):
+        return f"{scope}\x1f{key}"
+
+    def _load_bloom(self):
+        count = self._db.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+        self._bloom = BloomFilter(max(100000, count * 2))
+        for scope, key in self._db.execute("SELECT scope, key FROM seen"):
+            self._bloom.add(self._bloom_key(scope, key))
+
+    def _known(self, scope, key, ttl):
+        """调用方持有锁"""
+        if self._bloom_key(scope, key) not in self._bloom:
+            self.counters["bloom_negative"] += 1
+            return False
+        cutoff = time.time() - ttl
+        seen_at = self._pending.get((scope, key))
+        if seen_at is None:
+            self.counters["db_lookups"] += 1
+            row = self._db.execute("SELECT seen_at FROM seen WHERE scope = ? AND key = ?", (scope, key)).fetchone()
+            seen_at = row[0] if row else None
+        return seen_at is not None and seen_at >= cutoff
+
+    def check_and_add(self, scope, key, ttl=None):
+        """键在 TTL 内已出现过返回 False；否则记录并返回 True"""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            if ttl > self._scope_ttl.get(scope, self.ttl):
+                self._remember_ttl(scope, ttl)
+            self.counters["checked"] += 1
+            if self._known(scope, key, ttl):
+                self.counters["skipped"] += 1
+                return False
+            self._pending[(scope, key)] = time.time()
+            self._bloom.add(self._bloom_key(scope, key))
+            if len(self._pending) >= FLUSH_EVERY:
+                self._flush_locked()
+            return True
+
+    def _remember_ttl(self, scope, ttl):
+        """调用方持有锁；记录范围用过的更大的 TTL，之后的清理不会删掉它仍在有效期内的记录"""
+        self._scope_ttl[scope] = ttl
+        self._db.execute("INSERT OR REPLACE INTO scope_ttl (scope, ttl) VALUES (?, ?)", (scope, ttl))
+        self._db.commit()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        rows = [(scope, key, seen_at) for (scope, key), seen_at in self._pending.items()]
+        self._db.executemany("INSERT OR REPLACE INTO seen (scope, key, seen_at) VALUES (?, ?, ?)", rows)
+        self._db.commit()
+        self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def purge(self, ttl=None):
+        """删除过期记录，返回删除条数（Bloom 中残留的旧键只会多一次查库）
+
+        ttl 为空时每个范围按默认 TTL 和该范围用过的最大 TTL 中较大者判断是否过期。
+        """
+        with self._lock:
+            self._flush_locked()
+            if ttl is not None:
+                n = self._db.execute("DELETE FROM seen WHERE seen_at < ?", (time.time() - ttl,)).rowcount
+            else:
+                n = self._db.execute(
+                    "DELETE FROM seen WHERE seen_at < ? - max(?, COALESCE("
+                    "(SELECT ttl FROM scope_ttl WHERE scope_ttl.scope = seen.scope), 0))",
+                    (time.time(), self.ttl),
+                ).rowcount
+            self._db.commit()
+        return n
+
+    def forget_since(self, scope, since):
+        """删除某范围内 since 之后记录的键（从断点继续时，断点之后采集的商品要重新采集）
+
+        Bloom 中残留的键只会多一次查库。
+        """
+        with self._lock:
+            for key in [k for k, seen_at in self._pending.items() if k[0] == scope and seen_at > since]:
+                del self._pending[key]
+            n = self._db.execute("DELETE FROM seen WHERE scope = ? AND seen_at > ?", (scope, since)).rowcount
+            self._db.commit()
+        return n
+
+    def clear(self, scope=None):
+        """清空全部或某个范围的记录"""
+        with self._lock:
+            self._pending.clear()
+            if scope is None:
+                n = self._db.execute("DELETE FROM seen").rowcount
+            else:
+                n = self._db.execute("DELETE FROM seen WHERE scope = ?", (scope,)).rowcount
+            self._db.commit()
+            self._load_bloom()
+        return n
+
+    def stats(self):
+        with self._lock:
+            self._flush_locked()
+            scopes = dict(self._db.execute("SELECT scope, COUNT(*) FROM seen GROUP BY scope").fetchall())
+            s = dict(self.counters)
+        s["size"] = sum(scopes.values())
+        s["scopes"] = {scope or "global": n for scope, n in scopes.items()}
+        s["ttl"] = self.ttl
+        s["path"] = self.path
+        return s
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._db.close()
+
+
+class DedupFilter:
+    """绑定到一次采集的去重过滤：accept(item) 为 False 时丢弃该商品"""
+
+    def __init__(self, index, scope, ttl=None):
+        self.index = index
+        self.scope = scope
+        self.ttl = ttl
+        self.skipped = 0
+
+    def accept(self, item):
+        key = item_key(item)
+        if key is None or self.index.check_and_add(self.scope, key, self.ttl):
+            return True
+        self.skipped += 1
+        return False
@@ -0,0 +1,115 @@
+"""
+本地许可证服务替身 - 用于联调和测试租约/心跳逻辑
+
+运行：uvicorn dev_license_server:app --port 8010
+环境变量：
+  DEV_LICENSE_KEYS   逗号分隔的有效激活码（默认 DEV-KEY）
+  DEV_LICENSE_TTL    validate 返回的租约时长（秒，默认 60）
+  DEV_LICENSE_DELAY  每个请求的人工延迟（秒，默认 0），模拟慢服务
+"""
+import os
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+app = FastAPI(title="dev license server")
+
+KEYS = {k.strip() for k in os.getenv("DEV_LICENSE_KEYS", "DEV-KEY").split(",") if k.strip()}
+TTL = int(os.getenv("DEV_LICENSE_TTL", "60"))
+DELAY = float(os.getenv("DEV_LICENSE_DELAY", "0"))
+EXPIRES_AT = (datetime.now(timezone.utc) + timedelta(days=30)).isoformat()
+
+bindings = {}  # license_key -> machine_hash
+sessions = {}  # session_token -> license_id
+stats = {"activate": 0, "validate": 0, "heartbeat": 0, "end": 0}
+
+
+class ActivateIn(BaseModel):
+    license_key: str
+    machine_hash: str
+    app_version: str = ""
+
+
+class ValidateIn(BaseModel):
+    license_key: str
+    machine_hash: str
+
+
+class SessionIn(BaseModel):
+    license_id: int
+    machine_hash: str
+    session_token: str
+
+
+def _license_id(key):
+    return sorted(KEYS).index(key) + 1
+
+
+def _check(key, machine_hash):
+    if key not in KEYS:
+        return {"status": "INVALID"}
+    bound = bindings.get(key)
+    if bound and bound != machine_hash:
+        return {"status": "BOUND_OTHER"}
+    return None
+
+
+def _delay():
+    if DELAY:
+        time.sleep(DELAY)
+
+
+@app.post("/licenses/activate")
+def activate(body: ActivateIn):
+    _delay()
+    stats["activate"] += 1
+    err = _check(body.license_key, body.machine_hash)
+    if err:
+        return err
+    bindings[body.license_key] = body.machine_hash
+    return {"status": "OK", "license_id": _license_id(body.license_key), "expires_at": EXPIRES_AT}
+
+
+@app.post("/licenses/validate")
+def validate(body: ValidateIn):
+    _delay()
+    stats["validate"] += 1
+    err = _check(body.license_key, body.machine_hash)
+    if err:
+        return err
+    if body.license_key not in bindings:
+        return {"status": "INVALID", "message": "not activated"}
+    token = secrets.token_hex(16)
+    sessions[token] = _license_id(body.license_key)
+    return {
+        "status": "OK",
+        "license_id": _license_id(body.license_key),
+        "session_token": token,
+        "expires_at": EXPIRES_AT,
+        "lease_ttl": TTL,
+    }
+
+
+@app.post("/sessions/heartbeat")
+def heartbeat(body: SessionIn):
+    _delay()
+    stats["heartbeat"] += 1
+    if sessions.get(body.session_token) != body.license_id:
+        return {"status": "INVALID"}
+    return {"status": "OK"}
+
+
+@app.post("/sessions/end")
+def end(body: SessionIn):
+    _delay()
+    stats["end"] += 1
+    sessions.pop(body.session_token, None)
+    return {"status": "OK"}
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
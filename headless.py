@@ -0,0 +1,281 @@
+"""
+无界面运行入口 - 命令行批量采集 / 本地 HTTP JSON 接口，事件以 NDJSON 输出
+
+  python -m headless --keyword 手机壳 --price 30 --pinned 1000 --reviews 50 --export-dir ./out
+  python -m headless --keyword A --keyword B --export-dir ./out --format csv   # 多关键词走任务队列
+  python -m headless --resume 1a2b3c4d                                         # 从断点继续（任务ID见 start 事件）
+  python -m headless --serve --port 8765                                       # POST /api/<方法>，GET /events?since=N
+
+serve 模式的每个请求都要带 Authorization: Bearer <令牌>（--token / PDD_API_TOKEN，未设置时启动时生成并
+输出到 stderr）；POST 只接受 application/json，带 Origin 时必须是本接口自己的地址。自定义请求头和 JSON
+请求体都会触发浏览器的预检请求，网页无法跨站调用。
+"""
+import argparse
+import hmac
+import json
+import os
+import secrets
+import multiprocessing
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from scraper_service import ScraperService
+from job_scheduler import FINAL_STATUSES
+
+EVENT_NAMES = {"__onItems": "items", "__onProgress": "progress", "__onStatus": "status", "__onLicense": "license_result",
+               "__onSweep": "sweep"}
+
+# HTTP 接口可调用的服务方法
+API_METHODS = (
+    "getMachineHash", "getSystemInfo", "setExportDir", "activate", "validate", "endSession",
+    "startScrape", "stopScrape", "resumeScrape", "listCheckpoints", "discardCheckpoint", "getState", "getResults", "clearResults", "recoverResults",
+    "exportData", "enqueueJobs", "listJobs", "cancelJob", "getHistory",
+    "startSweep", "getSweep", "evaluateSweep",
+    "getMetrics", "startMetricsDump", "stopMetricsDump", "startProfiler", "stopProfiler",
+    "getDedupStats", "clearDedup", "queryResults", "exportQuery", "listRuns",
+    "setProgressRate",
+)
+
+
+class NdjsonEmitter:
+    """事件写成一行一个 JSON；serve 模式下同时保留最近的事件供 /events 拉取"""
+
+    def __init__(self, stream=None, keep=0):
+        self.stream = stream
+        self.events = deque(maxlen=keep) if keep else None
+        self.seq = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, name, payload):
+        self.write(EVENT_NAMES.get(name, name), payload)
+
+    def write(self, event, data):
+        with self._lock:
+            self.seq += 1
+            record = {"seq": self.seq, "ts": time.time(), "event": event, "data": data}
+            if self.events is not None:
+                self.events.append(record)
+            if self.stream is not None:
+                self.stream.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                self.stream.flush()
+
+    def since(self, seq):
+        with self._lock:
+            return [r for r in self.events or () if r["seq"] > seq]
+
+
+def _job_params(args, keyword):
+    return {
+        "keyword": keyword,
+        "price": args.price,
+        "pinned": args.pinned,
+        "reviews": args.reviews,
+        "exportDir": args.export_dir,
+        "format": args.format,
+        "engine": args.engine,
+        "dedup": args.dedup,
+        "dedupTtl": args.dedup_ttl,
+        "overflow": args.overflow,
+    }
+
+
+def _sweep_grid(args):
+    """--sweep-* 参数转为扫描网格，都未给出时返回 None"""
+    grid = {}
+    for field in ("price", "pinned", "reviews"):
+        values = getattr(args, "sweep_" + field)
+        if values:
+            grid[field] = [float(v) for v in values.split(",") if v.strip()]
+    return grid or None
+
+
+def _wait(service, emitter, jobs, interval):
+    """等待任务结束，多任务时定时输出汇总进度；Ctrl+C 停止采集"""
+    try:
+        while any(job.status not in FINAL_STATUSES for job in jobs):
+            time.sleep(interval)
+            if len(jobs) > 1:
+                emitter.write("jobs", service.jobs.summary()["overall"])
+    except KeyboardInterrupt:
+        emitter.write("status", "stopping")
+        for job in jobs:
+            service.jobs.cancel(job.id)
+            job.stop_event.set()
+        while any(job.status not in FINAL_STATUSES for job in jobs if job.status != "queued"):
+            time.sleep(0.1)
+    return [job.to_dict() for job in jobs]
+
+
+def run_cli(args):
+    emitter = NdjsonEmitter(sys.stdout)
+    service = ScraperService(emitter, max_jobs=args.max_jobs, async_mode=args.async_mode or None)
+    try:
+        if args.activate:
+            r = service.activate(args.activate, wait=True)
+            emitter.write("activate", r)
+            if r.get("status") != "OK":
+                return 2
+        r = service.validate(wait=True)
+        emitter.write("license", r)
+        if r.get("status") != "OK":
+            return 2
+
+        keywords = args.keyword or [None]
+        grid = _sweep_grid(args)
+        if grid and len(keywords) > 1:
+            emitter.write("start", {"status": "ERROR", "message": "参数扫描只支持一个关键词"})
+            return 1
+        if args.resume:
+            r = service.resumeScrape(args.resume)
+            jobs = [service.job] if r.get("status") == "OK" else []
+        elif grid:
+            r = service.startSweep(dict(_job_params(args, keywords[0]), grid=grid, sweepFormat=args.sweep_format))
+            jobs = [service.job] if r.get("status") == "OK" else []
+        elif len(keywords) == 1:
+            # 单个关键词与界面一致：流式输出商品和进度
+            r = service.startScrape(_job_params(args, keywords[0]))
+            jobs = [service.job] if r.get("status") == "OK" else []
+        else:
+            r = service.enqueueJobs([_job_params(args, kw) for kw in keywords])
+            jobs = [service.jobs.get(job_id) for job_id in r.get("jobs", [])]
+        emitter.write("start", r)
+        if r.get("status") != "OK":
+            return 1
+        results = _wait(service, emitter, jobs, args.interval)
+        if service.scraping_thread is not None:
+            # 扫描评估在采集线程里、任务结束之后进行，等它发出 sweep 事件
+            service.scraping_thread.join()
+        emitter.write("done", results)
+        return 0 if all(j["status"] in ("done", "stopped") for j in results) else 1
+    finally:
+        service.shutdown()
+
+
+def allowed_origins(host, port):
+    return {f"http://{h}:{port}" for h in (host, "127.0.0.1", "localhost", "[::1]")}
+
+
+def make_handler(service, emitter, token, origins=()):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, body, content_type="application/json"):
+            data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False, default=str).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", content_type + "; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _authorized(self):
+            """检查来源和令牌，不通过时已发送错误响应"""
+            origin = self.headers.get("Origin")
+            if origin is not None and origin not in origins:
+                self._send(403, {"status": "FORBIDDEN", "message": "不允许的来源"})
+                return False
+            auth = self.headers.get("Authorization") or ""
+            if not hmac.compare_digest(auth.encode(), f"Bearer {token}".encode()):
+                self._send(401, {"status": "UNAUTHORIZED", "message": "缺少或错误的令牌"})
+                return False
+            return True
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            url = urlparse(self.path)
+            if url.path != "/events":
+                return self._send(404, {"status": "NOT_FOUND"})
+            since = int(parse_qs(url.query).get("since", ["0"])[0])
+            lines = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in emitter.since(since))
+            self._send(200, lines.encode(), "application/x-ndjson")
+
+        def do_POST(self):
+            name = urlparse(self.path).path.rsplit("/", 1)[-1]
+            if not self.path.startswith("/api/") or name not in API_METHODS:
+                return self._send(404, {"status": "NOT_FOUND"})
+            if not self._authorized():
+                return
+            content_type = (self.headers.get("Content-Type") or "").split(";", 1)[0].strip().lower()
+            if content_type != "application/json":
+                return self._send(415, {"status": "ERROR", "message": "请求体必须是 application/json"})
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"null")
+                method = getattr(service, name)
+                if isinstance(body, list):
+                    result = method(*body)
+                elif isinstance(body, dict):
+                    result = method(**body)
+                else:
+                    result = method()
+                self._send(200, result)
+            except Exception as e:
+                self._send(400, {"status": "ERROR", "message": str(e)})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def run_server(args):
+    emitter = NdjsonEmitter(sys.stdout if args.ndjson else None, keep=args.keep_events)
+    service = ScraperService(emitter, max_jobs=args.max_jobs, async_mode=args.async_mode or None)
+    token = args.token or os.getenv("PDD_API_TOKEN") or secrets.token_urlsafe(24)
+    handler = make_handler(service, emitter, token, allowed_origins(args.host, args.port))
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"headless API: http://{args.host}:{args.port}/api/<method>", file=sys.stderr)
+    if not (args.token or os.getenv("PDD_API_TOKEN")):
+        print(f"token: {token}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(prog="headless", description="PDD 采集无界面运行")
+    ap.add_argument("--keyword", action="append", help="关键词，可重复；多个关键词走任务队列")
+    ap.add_argument("--price", type=float, default=None)
+    ap.add_argument("--pinned", type=float, default=None)
+    ap.add_argument("--reviews", type=int, default=None)
+    ap.add_argument("--export-dir", default="")
+    ap.add_argument("--format", default="xlsx", choices=["xlsx", "csv", "jsonl"])
+    ap.add_argument("--engine", default=None, choices=["thread", "process"])
+    ap.add_argument("--dedup", default=None, choices=["off", "global", "keyword"], help="跳过之前采集过的商品")
+    ap.add_argument("--dedup-ttl", type=float, default=None, help="去重记录有效期（秒）")
+    ap.add_argument("--overflow", metavar="SPEC", help="各消费者队列满时的策略，如 ui=sample,sink=block,warehouse=drop_oldest")
+    ap.add_argument("--resume", metavar="JOB_ID", help="从断点继续之前停止或中断的采集")
+    ap.add_argument("--max-jobs", type=int, default=None, help="同时运行的任务数")
+    ap.add_argument("--async", dest="async_mode", action="store_true", help="许可证、心跳和事件分发使用单个事件循环（同 PDD_ASYNC=1）")
+    ap.add_argument("--sweep-price", metavar="LIST", help="参数扫描：价格阈值列表，逗号分隔（0 为不限）")
+    ap.add_argument("--sweep-pinned", metavar="LIST", help="参数扫描：拼单数阈值列表")
+    ap.add_argument("--sweep-reviews", metavar="LIST", help="参数扫描：评价数阈值列表")
+    ap.add_argument("--sweep-format", default="csv", help="参数扫描每组结果的导出格式（同 exportData）")
+    ap.add_argument("--activate", metavar="CODE", help="先用激活码激活")
+    ap.add_argument("--interval", type=float, default=1.0, help="汇总进度输出间隔（秒）")
+    ap.add_argument("--serve", action="store_true", help="启动本地 HTTP JSON 接口")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--token", default=None, help="serve 模式的访问令牌（默认取 PDD_API_TOKEN，都未设置时随机生成）")
+    ap.add_argument("--ndjson", action="store_true", help="serve 模式下同时向 stdout 输出事件")
+    ap.add_argument("--keep-events", type=int, default=5000, help="serve 模式保留的事件条数")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.serve:
+        return run_server(args)
+    return run_cli(args)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
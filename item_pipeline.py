@@ -0,0 +1,297 @@
+"""
+商品流水线 - 采集线程到各消费者（前端、结果文件、结果库）之间的有界队列和溢出策略
+
+采集器 → 批量过滤/统计（采集线程内）→ 结果存储（定长环形缓冲）→ 各消费者的有界队列：
+  sink       结果文件写入线程（PipelineStage）
+  warehouse  结果库写入线程（result_warehouse.ResultWarehouse）
+  ui         前端分发线程（ui_dispatcher.UIDispatcher）
+
+队列满时按消费者的策略处理：
+  block        采集线程等待消费者（不丢数据）
+  drop_oldest  丢弃队列中最旧的商品，保留最新的
+  sample       队列过半后每 SAMPLE_EVERY 条只保留 1 条，满了再丢弃最旧的
+
+状态、断点、同步等控制消息总是按 block 入队，不会被丢弃。每个队列报告深度、最高水位、
+滞后（最旧一条已等待的秒数）和丢弃条数，见 getState().pipeline。
+"""
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+from metrics import metrics
+
+POLICIES = ("block", "drop_oldest", "sample")
+CONSUMERS = ("ui", "sink", "warehouse")
+DEFAULT_POLICIES = {"ui": "drop_oldest", "sink": "block", "warehouse": "block"}
+SINK_QUEUE_SIZE = int(os.getenv("PDD_SINK_QUEUE", "5000"))
+SAMPLE_EVERY = 10
+SAMPLE_FROM = 0.5  # sample 策略从队列深度超过这一比例时开始抽样
+
+
+def parse_policies(value=None):
+    """溢出策略：默认值 <- PDD_OVERFLOW 环境变量 <- value
+
+    value 与环境变量相同，可以是 {"ui": "sample"} 或 "ui=sample,sink=block"；
+    未知的消费者或策略抛出 ValueError。
+    """
+    out = dict(DEFAULT_POLICIES)
+    for spec in (os.getenv("PDD_OVERFLOW", ""), value):
+        if not spec:
+            continue
+        if isinstance(spec, str):
+            spec = dict(part.split("=", 1) for part in spec.replace(" ", "").split(",") if "=" in part)
+        for consumer, policy in spec.items():
+            if consumer not in CONSUMERS:
+                raise ValueError(f"不支持的消费者: {consumer}")
+            policy = str(policy).lower().replace("-", "_")
+            if policy not in POLICIES:
+                raise ValueError(f"不支持的溢出策略: {policy}")
+            out[consumer] = policy
+    return out
+
+
+class BoundedQueue:
+    """带溢出策略的有界队列，接口与 queue.Queue 相近（get 超时抛出 queue.Empty）
+
+    put(entry, policy) 的 policy 缺省为队列的策略；以 block 入队的条目不会被挤掉，
+    队列满时它会先挤掉最旧的可丢弃条目。
+    task_done/join 与 queue.Queue 相同，被丢弃的条目视为已完成。
+    """
+
+    def __init__(self, maxsize, policy="block", sample_every=SAMPLE_EVERY):
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.sample_every = max(1, int(sample_every))
+        self._items = deque()  # (入队时刻, 条目, 可丢弃)
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+        self._unfinished = 0
+        self._offered = 0  # sample 策略的计数
+        self.counters = {"put": 0, "dropped": 0, "sampled": 0, "blocked_seconds": 0.0, "high_water": 0}
+
+    def qsize(self):
+        return len(self._items)
+
+    def empty(self):
+        return not self._items
+
+    def _evict_oldest(self):
+        # 调用方持有锁；移除最旧的可丢弃条目，没有时返回 False
+        for i, (_, _, droppable) in enumerate(self._items):
+            if droppable:
+                del self._items[i]
+                self._discarded(1)
+                return True
+        return False
+
+    def _discarded(self, n):
+        self.counters["dropped"] += n
+        self._unfinished -= n
+        if not self._unfinished:
+            self._all_done.notify_all()
+
+    def _wait_not_full(self, timeout):
+        # 调用方持有锁；等到有空位或超时
+        t0 = time.monotonic()
+        deadline = None if timeout is None else t0 + timeout
+        while len(self._items) >= self.maxsize:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            self._not_full.wait(remaining)
+        self.counters["blocked_seconds"] += time.monotonic() - t0
+
+    def put(self, entry, policy=None, timeout=None):
+        """入队，返回是否入队（被抽样跳过、等待超时或无法腾出位置时为 False）"""
+        policy = policy or self.policy
+        with self._lock:
+            if policy == "sample" and len(self._items) >= self.maxsize * SAMPLE_FROM:
+                self._offered += 1
+                if self._offered % self.sample_every:
+                    self.counters["sampled"] += 1
+                    return False
+            if len(self._items) >= self.maxsize:
+                if policy == "block":
+                    # 按 block 入队的条目（控制消息）优先挤掉一条可丢弃的商品，没有时才等待
+                    if not self._evict_oldest():
+                        self._wait_not_full(timeout)
+                    if len(self._items) >= self.maxsize:
+                        self.counters["dropped"] += 1
+                        return False
+                elif not self._evict_oldest():
+                    self.counters["dropped"] += 1
+                    return False
+            self._items.append((time.monotonic(), entry, policy != "block"))
+            self._unfinished += 1
+            self.counters["put"] += 1
+            if len(self._items) > self.counters["high_water"]:
+                self.counters["high_water"] = len(self._items)
+            self._not_empty.notify()
+            return True
+
+    def put_nowait(self, entry):
+        return self.put(entry, timeout=0)
+
+    def get(self, block=True, timeout=None):
+        with self._lock:
+            if not block:
+                if not self._items:
+                    raise queue.Empty
+            elif timeout is None:
+                while not self._items:
+                    self._not_empty.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while not self._items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self._not_empty.wait(remaining)
+            entry = self._items.popleft()[1]
+            self._not_full.notify()
+            return entry
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def get_many(self, limit, timeout=None):
+        """等待至多 timeout 秒直到有条目，然后取出最多 limit 条（没有时返回空列表）"""
+        try:
+            first = self.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        out = [first]
+        with self._lock:
+            items = self._items
+            while items and len(out) < limit:
+                out.append(items.popleft()[1])
+            self._not_full.notify_all()
+        return out
+
+    def task_done(self, n=1):
+        with self._lock:
+            self._unfinished -= n
+            if self._unfinished <= 0:
+                self._unfinished = 0
+                self._all_done.notify_all()
+
+    def join(self, timeout=None):
+        """等待已入队的条目全部处理完，返回是否在 timeout 内完成"""
+        with self._lock:
+            return self._all_done.wait_for(lambda: not self._unfinished, timeout)
+
+    @property
+    def lag(self):
+        """最旧一条条目已等待的秒数"""
+        try:
+            return time.monotonic() - self._items[0][0]
+        except IndexError:
+            return 0.0
+
+    def stats(self):
+        s = dict(self.counters)
+        s["blocked_seconds"] = round(s["blocked_seconds"], 3)
+        s["policy"] = self.policy
+        s["depth"] = len(self._items)
+        s["maxsize"] = self.maxsize
+        s["lag"] = round(self.lag, 3)
+        return s
+
+
+class _Call:
+    """PipelineStage.call 放入队列的标记"""
+
+    __slots__ = ("fn", "args")
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+
+
+class PipelineStage(threading.Thread):
+    """一个消费者：有界队列 + 工作线程，consume(items) 在工作线程中按批调用
+
+    call(fn) 让工作线程在之前入队的条目处理完后调用 fn（如写断点），调用方不等待；
+    drain() 等待已入队的条目处理完；close() 处理完剩余条目后退出。
+    """
+
+    def __init__(self, name, consume, maxsize=SINK_QUEUE_SIZE, policy="block", max_batch=500):
+        super().__init__(name=f"pipeline-{name}", daemon=True)
+        self.stage = name
+        self.consume = consume
+        self.queue = BoundedQueue(maxsize, policy)
+        self.max_batch = max_batch
+        self.processed = 0
+        self.errors = 0
+        self._stop_event = threading.Event()
+
+    def put(self, entry):
+        if not self.is_alive():
+            # 工作线程未运行（或已关闭）时直接在调用方线程处理
+            self._consume([entry])
+            return True
+        return self.queue.put(entry)
+
+    def call(self, fn, *args):
+        """按入队顺序在工作线程中调用 fn(*args)；标记按 block 入队，不会被丢弃"""
+        entry = _Call(fn, args)
+        if not self.is_alive():
+            self._call(entry)
+            return
+        self.queue.put(entry, "block")
+
+    def _call(self, entry):
+        try:
+            entry.fn(*entry.args)
+        except Exception as e:
+            self.errors += 1
+            print(f"{self.stage} 调用失败: {e}", file=sys.stderr)
+
+    def _consume(self, batch):
+        t0 = time.perf_counter()
+        try:
+            self.consume(batch)
+        except Exception as e:
+            self.errors += 1
+            metrics.incr("item.errors")
+            print(f"{self.stage} 处理失败: {e}", file=sys.stderr)
+        metrics.observe(f"pipeline.{self.stage}", time.perf_counter() - t0)
+        self.processed += len(batch)
+
+    def run(self):
+        while True:
+            batch = self.queue.get_many(self.max_batch, timeout=0.1)
+            if batch:
+                run = []
+                for entry in batch:
+                    if type(entry) is _Call:
+                        if run:
+                            self._consume(run)
+                            run = []
+                        self._call(entry)
+                    else:
+                        run.append(entry)
+                if run:
+                    self._consume(run)
+                self.queue.task_done(len(batch))
+            elif self._stop_event.is_set() and self.queue.empty():
+                return
+
+    def drain(self, timeout=None):
+        return self.queue.join(timeout)
+
+    def close(self, timeout=None):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def stats(self):
+        s = self.queue.stats()
+        s["processed"] = self.processed
+        s["errors"] = self.errors
+        return s
@@ -0,0 +1,75 @@
+"""
+采集断点 - 任务参数、进度、累计统计、结果文件位置和采集游标定期原子写入磁盘
+
+停止或崩溃后可从断点继续同一个结果文件和统计（resumeScrape）。每个任务一个
+<任务ID>.json，先写临时文件再改名，读到的总是某一次完整的断点。
+"""
+import json
+import os
+import time
+
+from metrics import metrics
+
+CHECKPOINT_INTERVAL = float(os.getenv("PDD_CHECKPOINT_INTERVAL", "5"))  # 两次断点的最短间隔（秒）
+CHECKPOINT_VERSION = 1
+
+
+def checkpoint_path(directory, job_id):
+    return os.path.join(directory, f"{job_id}.json")
+
+
+def write_checkpoint(path, data):
+    """原子写入（临时文件 + 改名）；为保持开销低不做 fsync"""
+    t0 = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"), default=str)
+    os.replace(tmp, path)
+    metrics.observe("checkpoint.write", time.perf_counter() - t0)
+
+
+def read_checkpoint(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != CHECKPOINT_VERSION:
+        return None
+    return data
+
+
+def remove_checkpoint(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def list_checkpoints(directory):
+    """目录下所有断点的摘要（最近保存的在前）"""
+    if not os.path.isdir(directory):
+        return []
+    out = []
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        data = read_checkpoint(os.path.join(directory, name))
+        if data is None:
+            continue
+        progress = data.get("progress") or {}
+        out.append({
+            "job_id": data["job_id"],
+            "keyword": data["params"].get("keyword"),
+            "status": data.get("status"),
+            "outfile": data.get("out_path"),
+            "rows": (data.get("results") or {}).get("count", 0),
+            "visited": progress.get("visited", 0),
+            "batch_progress": progress.get("batch_progress"),
+            "has_cursor": data.get("cursor") is not None,
+            "run_time": int(data.get("run_time") or 0),
+            "saved_at": data.get("saved_at"),
+        })
+    out.sort(key=lambda c: c["saved_at"] or 0, reverse=True)
+    return out
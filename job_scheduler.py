@@ -0,0 +1,512 @@
+"""
+采集任务与调度 - 每个任务独立的 stop_event、结果文件和进度，线程池并发执行
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from item_pipeline import PipelineStage, parse_policies
+from job_checkpoint import CHECKPOINT_INTERVAL, CHECKPOINT_VERSION, write_checkpoint, remove_checkpoint
+from metrics import metrics
+from process_engine import run_in_process
+from result_sink import open_sink
+from result_store import ResultStore
+
+DEFAULT_MAX_JOBS = int(os.getenv("PDD_MAX_JOBS", "0")) or max(1, min(4, os.cpu_count() or 1))
+JOB_RETENTION = 1000  # 队列任务默认保留的结果条数
+FINISHED_JOBS_KEPT = 50  # 调度器保留的已结束任务数（更早的只在配置的 job_history 中）
+PROGRESS_FIELDS = {"visited": 0, "collected": 0, "filtered": 0, "list_count": 0, "batch_progress": "0/0"}
+FINAL_STATUSES = ("done", "stopped", "cancelled", "error")
+ENGINES = ("thread", "process")
+DEFAULT_ENGINE = os.getenv("PDD_ENGINE", "thread")
+
+
+def make_output_path(export_dir, fmt, suffix=""):
+    """pdd_results_<时间戳>[_<suffix>].<扩展名>"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ext = "xlsx" if fmt in (None, "excel") else fmt
+    name = f"pdd_results_{timestamp}_{suffix}.{ext}" if suffix else f"pdd_results_{timestamp}.{ext}"
+    return os.path.join(export_dir, name)
+
+
+class ScrapeJob:
+    """一次采集任务
+
+    params 需包含 keyword/price/pinned/reviews/format；on_item/on_progress/on_status
+    为可选钩子，签名为 hook(job, 数据)，在采集线程中调用。dedup 为可选的
+    dedup_index.DedupFilter，已采集过的商品在写入结果之前丢弃；warehouse 为可选的
+    result_warehouse.ResultWarehouse，每条结果同时写入本地结果库。
+
+    batch 为可选的 batch_filter.BatchFilter：商品先攒批，整批过滤阈值、补充派生指标、
+    更新统计后再逐条写文件和调用 on_item；攒满、等待超时、断点到期和结束时提交。
+
+    结果文件由任务自己的写入线程（item_pipeline.PipelineStage）写出，结果文件和结果库队列满时
+    按 params["overflow"] 中的策略处理（见 item_pipeline.parse_policies）；断点由写入线程在写完
+    之前入队的商品后写入，关闭文件前等写入线程处理完。
+
+    checkpoint_path 不为空时在开始、每隔 CHECKPOINT_INTERVAL 秒的进度回调和结束时写入断点
+    （见 job_checkpoint）；resume 为读取到的断点，任务从中恢复进度、统计、结果文件位置和
+    采集游标（进度信息中的 cursor，继续时作为 cursor 参数传给 runner）。
+    """
+
+    def __init__(self, job_id, params, out_path, results=None, on_item=None, on_progress=None, on_status=None,
+                 dedup=None, warehouse=None, checkpoint_path=None, resume=None, batch=None):
+        self.id = job_id
+        self.params = dict(params)
+        self.out_path = out_path
+        self.results = results if results is not None else ResultStore(params.get("retention") or JOB_RETENTION)
+        self.hooks = {"item": on_item, "progress": on_progress, "status": on_status}
+        self.dedup = dedup
+        self.warehouse = warehouse
+        self.batch = batch
+        self.policies = self.params.get("overflow") or parse_policies()
+        self.sink_stage = None
+        self.stop_event = threading.Event()
+        self.status = "queued"
+        self.progress = dict(PROGRESS_FIELDS)
+        self.error = None
+        self.sink = None
+        self.future = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._started = None
+        self._finished = None
+        self._last_callback = None  # 上次回调返回的时刻，用于统计采集器自身耗时
+        self.profiler = None  # profiler.RunProfiler，cprofile 模式在采集线程中启用
+        self.checkpoint_path = checkpoint_path
+        self.cursor = None
+        self._cursor_rows = 0  # 收到当前游标时的累计结果数
+        self._aligned = None  # 收到当前游标时的断点内容（含结果文件位置），结束时用
+        self._last_checkpoint = None
+        self._checkpointed_at = 0.0
+        self._elapsed = 0.0  # 之前各次运行的累计时长
+        self._resume_sink = False
+        if resume:
+            self.cursor = resume.get("cursor")
+            self.progress.update(resume.get("progress") or {})
+            self.results.load_state(resume.get("results") or {})
+            self.created_at = resume.get("created_at", self.created_at)
+            self._elapsed = resume.get("run_time") or 0.0
+            self._resume_sink = resume.get("sink") or False
+            self._cursor_rows = self.results.count
+            if self.dedup is not None:
+                self.dedup.skipped = resume.get("skipped", 0)
+            if self.batch is not None:
+                self.batch.load_state(resume.get("batch") or {})
+
+    def _hook(self, name, payload):
+        hook = self.hooks.get(name)
+        if hook:
+            hook(self, payload)
+
+    def _set_status(self, status):
+        self.status = status
+        self._hook("status", status)
+
+    @property
+    def skipped(self):
+        return self.dedup.skipped if self.dedup is not None else 0
+
+    @property
+    def rejected(self):
+        """批量阶段按阈值丢弃的商品数"""
+        return self.batch.rejected if self.batch is not None else 0
+
+    @property
+    def run_time(self):
+        if self._started is None:
+            return self._elapsed
+        return self._elapsed + (self._finished or time.monotonic()) - self._started
+
+    def open_sink(self):
+        if self.sink is None:
+            self.sink = open_sink(self.out_path, self.params.get("format"), resume=self._resume_sink)
+        return self.sink
+
+    def checkpoint(self, status="running"):
+        """写入断点；断点中的行数/偏移与累计统计一致
+
+        参数、进度、累计统计和游标在调用方线程中取得，然后交给结果文件写入线程：它写完之前
+        入队的商品后把结果文件落盘，连同文件位置一起写入断点，采集线程不等待磁盘。结果文件
+        写入线程未运行（开始前、结束后）时直接写入。
+
+        游标之后还有已提交的结果时跳过这一次（等下一次进度对齐游标）。结束时若最后一次进度
+        之后还有结果，这些结果不在游标之内，继续时会被重新采集，因此写入收到游标时记下的
+        状态（_aligned），继续时结果文件截断回当时的位置。
+        """
+        if self.checkpoint_path is None or self.sink is None:
+            return
+        try:
+            misaligned = self.cursor is not None and self.results.count != self._cursor_rows
+            if status != "running" and misaligned:
+                aligned = self._aligned if self._aligned is not None and "sink" in self._aligned \
+                    else self._last_checkpoint
+                if aligned is not None:
+                    write_checkpoint(self.checkpoint_path, dict(aligned, status=status, run_time=self.run_time))
+                return
+            if status == "running" and misaligned:
+                return
+            data = self._state(status)
+            self._checkpointed_at = time.monotonic()
+        except Exception as e:
+            metrics.incr("checkpoint.errors")
+            print(f"写入采集断点失败: {e}", file=sys.stderr)
+            return
+        if self.sink_stage is not None and not self.sink.closed:
+            self.sink_stage.call(self._write_checkpoint, data)
+        else:
+            self._write_checkpoint(data)
+
+    def _state(self, status):
+        """断点内容（结果文件位置除外），在调用方线程中取得"""
+        return {
+            "version": CHECKPOINT_VERSION,
+            "job_id": self.id,
+            "status": status,
+            "params": self.params,
+            "out_path": self.out_path,
+            "cursor": self.cursor,
+            "progress": dict(self.progress),
+            "results": self.results.state(),
+            "skipped": self.skipped,
+            "batch": self.batch.state() if self.batch is not None else None,
+            "run_time": self.run_time,
+            "created_at": self.created_at,
+            "saved_at": time.time(),
+        }
+
+    def _align(self):
+        """游标前进时记下对齐的状态；结果文件位置由写入线程在写完之前入队的商品后补上"""
+        if self.checkpoint_path is None or self.sink is None:
+            return
+        self._aligned = data = self._state("running")
+        if self.sink_stage is not None and not self.sink.closed:
+            self.sink_stage.call(self._mark_sink, data)
+        else:
+            self._mark_sink(data)
+
+    def _mark_sink(self, data):
+        if not self.sink.closed:
+            data["sink"] = self.sink.position()
+
+    def _write_checkpoint(self, data):
+        """结果文件落盘后写入断点（在结果文件写入线程中调用，之前入队的商品都已写入）"""
+        try:
+            if not self.sink.closed:
+                self.sink.flush()
+            data["sink"] = self.sink.checkpoint
+            write_checkpoint(self.checkpoint_path, data)
+            self._last_checkpoint = data
+        except Exception as e:
+            metrics.incr("checkpoint.errors")
+            print(f"写入采集断点失败: {e}", file=sys.stderr)
+
+    def on_item(self, item):
+        """各阶段分别计时：scraper.item_gap 为两次回调之间采集器自身的耗时
+
+        on_item 钩子收到的商品带 seq（结果序号）。
+        """
+        t0 = time.perf_counter()
+        if self._last_callback is not None:
+            metrics.observe("scraper.item_gap", t0 - self._last_callback)
+        if self.batch is not None:
+            if self.batch.push(item):
+                self._flush_batch()
+            self._last_callback = time.perf_counter()
+            return
+        try:
+            t = t0
+            if self.dedup is not None:
+                accepted = self.dedup.accept(item)
+                t = time.perf_counter()
+                metrics.observe("item.dedup", t - t0)
+                if not accepted:
+                    metrics.incr("dedup.skipped")
+                    self._last_callback = t
+                    return
+            rec = self.results.add(item)
+            t1 = time.perf_counter()
+            metrics.observe("item.store", t1 - t)
+            self._to_sink(item)
+            if self.warehouse is not None:
+                self.warehouse.add(self.id, self.params["keyword"], item, self.policies["warehouse"])
+            t2 = time.perf_counter()
+            metrics.observe("item.sink", t2 - t1)
+            self._hook("item", dict(item, seq=rec.seq))
+            t3 = time.perf_counter()
+            metrics.observe("item.hook", t3 - t2)
+            metrics.observe("item.total", t3 - t0)
+            metrics.incr("items")
+        except Exception as e:
+            metrics.incr("item.errors")
+            print(f"处理商品项失败: {e}", file=sys.stderr)
+        self._last_callback = time.perf_counter()
+
+    def _flush_batch(self):
+        """提交攒下的一批：整批过滤阈值、去重（去重丢弃的商品不计入分位排名）和统计，
+        存活的商品逐条写文件、调用钩子"""
+        t0 = time.perf_counter()
+        try:
+            pending = len(self.batch)
+            batch = self.batch.flush(self.dedup.accept if self.dedup is not None else None)
+            t1 = time.perf_counter()
+            metrics.observe("batch.filter", t1 - t0)
+            metrics.incr("batch.flushes")
+            if pending != len(batch) + batch.skipped:
+                metrics.incr("filter.rejected", pending - len(batch) - batch.skipped)
+            if batch.skipped:
+                metrics.incr("dedup.skipped", batch.skipped)
+            if not len(batch):
+                return
+            first = self.results.add_batch(batch.items, batch.price, batch.pinned, batch.reviews)
+            t2 = time.perf_counter()
+            metrics.observe("batch.store", t2 - t1)
+            write = self._to_sink
+            for item in batch.items:
+                write(item)
+            if self.warehouse is not None:
+                keyword, policy = self.params["keyword"], self.policies["warehouse"]
+                for item in batch.items:
+                    self.warehouse.add(self.id, keyword, item, policy)
+            t3 = time.perf_counter()
+            metrics.observe("batch.sink", t3 - t2)
+            if self.hooks.get("item"):
+                for seq, item in enumerate(batch.items, first):
+                    self._hook("item", dict(item, seq=seq))
+            t4 = time.perf_counter()
+            metrics.observe("batch.hook", t4 - t3)
+            metrics.observe("batch.total", t4 - t0)
+            metrics.incr("items", len(batch))
+        except Exception as e:
+            metrics.incr("item.errors")
+            print(f"处理商品批次失败: {e}", file=sys.stderr)
+
+    def _to_sink(self, item):
+        if self.sink_stage is not None:
+            self.sink_stage.put(item)
+        else:
+            self.sink.write(item)
+
+    def _write_sink(self, items):
+        """结果文件写入线程中调用"""
+        write = self.sink.write
+        for item in items:
+            write(item)
+
+    def _start_sink_stage(self):
+        self.sink_stage = PipelineStage("sink", self._write_sink, policy=self.policies["sink"])
+        self.sink_stage.start()
+
+    def pipeline_stats(self):
+        """各阶段的队列深度、滞后和丢弃数（前端队列由调用方补充）"""
+        s = {}
+        if self.batch is not None:
+            s["filter"] = self.batch.stats()
+        s["store"] = {"policy": "drop_oldest", "depth": len(self.results), "maxsize": self.results.retention,
+                      "count": self.results.count}
+        if self.sink_stage is not None:
+            s["sink"] = self.sink_stage.stats()
+        if self.warehouse is not None:
+            s["warehouse"] = self.warehouse.stats()["queue"]
+        return s
+
+    def on_progress(self, info):
+        """游标只在之前的商品都已提交时更新；攒批缓冲中的商品只在等待超时或断点到期时提交，
+        断点交给结果文件写入线程，进度回调不落盘、不等待
+        """
+        t0 = time.perf_counter()
+        try:
+            self.progress = {k: info.get(k, v) for k, v in PROGRESS_FIELDS.items()}
+            due = self.checkpoint_path is not None and time.monotonic() - self._checkpointed_at >= CHECKPOINT_INTERVAL
+            pending = self.batch is not None and len(self.batch)
+            if pending and (due or self.batch.expired):
+                self._flush_batch()
+                pending = False
+            if "cursor" in info and not pending and \
+                    (info["cursor"] != self.cursor or self.results.count != self._cursor_rows):
+                self.cursor = info["cursor"]
+                self._cursor_rows = self.results.count
+                self._align()
+            if due:
+                self.checkpoint()
+            self._hook("progress", info)
+            metrics.observe("progress.hook", time.perf_counter() - t0)
+        except Exception as e:
+            metrics.incr("progress.errors")
+            print(f"处理进度失败: {e}", file=sys.stderr)
+        self._last_callback = time.perf_counter()
+
+    def run(self, runner):
+        """在当前线程执行 runner(keyword, price, pinned, reviews, **callbacks)"""
+        if self.stop_event.is_set():
+            self._set_status("cancelled")
+            return
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        status = "done"
+        profiler = self.profiler
+        try:
+            self.open_sink()
+            self._start_sink_stage()
+            if self.warehouse is not None:
+                self.warehouse.begin_run(self.id, self.params["keyword"], self.params, self.out_path)
+            self.checkpoint()
+            self._set_status("running")
+            if profiler is not None:
+                profiler.enable()
+            # 只有继续采集时才传 cursor，采集器从游标处接着翻页
+            resume = {"cursor": self.cursor} if self.cursor is not None else {}
+            runner(
+                self.params["keyword"],
+                self.params["price"],
+                self.params["pinned"],
+                self.params["reviews"],
+                on_item=self.on_item,
+                on_progress=self.on_progress,
+                stop_event=self.stop_event,
+                output_path=None,  # 结果由 sink 流式写入
+                **resume
+            )
+            if self.stop_event.is_set():
+                status = "stopped"
+        except Exception as e:
+            print(f"采集任务 {self.id} 异常: {e}", file=sys.stderr)
+            self.error = str(e)
+            status = "error"
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            if self.batch is not None and len(self.batch) and self.sink is not None:
+                self._flush_batch()
+            if self.dedup is not None:
+                try:
+                    self.dedup.index.flush()
+                except Exception as e:
+                    print(f"写入去重索引失败: {e}", file=sys.stderr)
+            if self.sink_stage is not None:
+                self.sink_stage.close()
+            # 未完成且可继续的任务保留结果文件的断点，继续时接着写
+            resumable = self.checkpoint_path is not None and status != "done"
+            if self.sink is not None:
+                try:
+                    self.sink.close(keep_checkpoint=resumable)
+                except Exception as e:
+                    print(f"写入结果文件失败: {e}", file=sys.stderr)
+                    self.error = self.error or str(e)
+                    status = "error"
+            self.finished_at = time.time()
+            self._finished = time.monotonic()
+            if self.checkpoint_path is not None:
+                if status == "done":
+                    remove_checkpoint(self.checkpoint_path)
+                else:
+                    self.checkpoint(status)
+            if self.warehouse is not None and self.status == "running":
+                self.warehouse.end_run(self.id, status, self.results.count)
+            self._set_status(status)
+
+    def to_dict(self):
+        avg = self.results.averages()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "keyword": self.params.get("keyword"),
+            "price": self.params.get("price"),
+            "pinned": self.params.get("pinned"),
+            "reviews": self.params.get("reviews"),
+            "engine": self.params.get("engine", DEFAULT_ENGINE),
+            "outfile": self.out_path,
+            "rows": self.results.count,
+            "skipped": self.skipped,
+            "rejected": self.rejected,
+            "avg_price": avg["price"],
+            "avg_pinned": avg["pinned"],
+            "run_time": int(self.run_time),
+            "error": self.error,
+            "created_at": self.created_at,
+            **self.progress,
+        }
+
+
+class JobScheduler:
+    """有界线程池执行采集任务，最多 max_workers 个任务同时运行，其余排队
+
+    engine=process 的任务由池中线程驱动一个采集子进程，解析不占用主进程 GIL。
+    提交新任务时只保留最近 keep_finished 个已结束的任务，长时间运行时不会一直持有旧任务的结果和文件。
+    """
+
+    def __init__(self, runner, max_workers=None, keep_finished=FINISHED_JOBS_KEPT):
+        self.runner = runner
+        self.max_workers = max_workers or DEFAULT_MAX_JOBS
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="scrape-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def new_job_id(self):
+        return uuid.uuid4().hex[:8]
+
+    def runner_for(self, job):
+        if job.params.get("engine", DEFAULT_ENGINE) == "process":
+            return run_in_process
+        return self.runner
+
+    def _prune(self):
+        """调用方持有锁；移除最早的已结束任务，只保留 keep_finished 个"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINAL_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def submit(self, job):
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(job.run, self.runner_for(job))
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """排队中的任务直接取消，运行中的任务通过 stop_event 协作停止"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.stop_event.set()
+        if job.future is not None and job.future.cancel():
+            job._set_status("cancelled")
+        return job
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def summary(self):
+        jobs = [job.to_dict() for job in self.jobs()]
+        overall = {k: 0 for k in ("visited", "collected", "filtered", "rows", "skipped", "rejected")}
+        by_status = {}
+        for j in jobs:
+            for k in overall:
+                overall[k] += j.get(k) or 0
+            by_status[j["status"]] = by_status.get(j["status"], 0) + 1
+        overall["jobs"] = by_status
+        overall["max_workers"] = self.max_workers
+        return {"jobs": jobs, "overall": overall}
+
+    def stop_all(self):
+        """排队中的任务取消，运行中的任务停止，返回受影响的任务数"""
+        jobs = [job for job in self.jobs() if job.status not in FINAL_STATUSES]
+        for job in jobs:
+            self.cancel(job.id)
+        return len(jobs)
+
+    def shutdown(self):
+        self.stop_all()
+        self._executor.shutdown(wait=False)
@@ -1,9 +1,14 @@
 import os
 import hashlib
+import hmac
 import json
+import random
 import time
 import threading
-import requests
+from datetime import datetime
+from functools import lru_cache
+from config_store import get_config
+from metrics import LatencyHistogram, metrics
 
 API_BASE = os.getenv("LICENSE_API_BASE", "http://127.0.0.1:8010")
 
@@ -20,66 +25,616 @@ def get_machine_guid() -> str:
     except Exception:
         return os.getenv("COMPUTERNAME", "UNKNOWN")
 
+@lru_cache(maxsize=1)
 def get_machine_hash() -> str:
+    # 注册表查询 + 哈希，进程内只计算一次；不写入配置，复制配置目录不会带走设备绑定
     return _sha256_hex(get_machine_guid())
 
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+RETRY_STATUS = (502, 503, 504)
+RETRY_DEADLINE = 15.0  # 一次调用（含重试和退避）的总时长上限（秒）
+
+class LicenseClient:
+    """共享 requests.Session 的许可证客户端：连接池复用 keep-alive 连接，
+    幂等请求只在连接失败（请求未到达服务端）和 502/503/504 时按带抖动的指数退避重试；
+    读超时不重试（validate 会在服务端建立会话），整次调用不超过 deadline 秒"""
+
+    def __init__(self, base: str = API_BASE, pool_size: int = 4, retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 8.0,
+                 connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT,
+                 deadline: float = RETRY_DEADLINE):
+        self.base = base.rstrip("/")
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = (connect_timeout, read_timeout)
+        self.deadline = deadline
+        self.latency = {}
+        self.errors = {}
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # requests 在第一次请求时才导入，不拖慢启动
+        import requests
+        from requests.adapters import HTTPAdapter
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def _histogram(self, path):
+        hist = self.latency.get(path)
+        if hist is None:
+            hist = self.latency.setdefault(path, LatencyHistogram())
+        return hist
+
+    def backoff_delay(self, attempt):
+        # full jitter: [0, min(max_backoff, backoff * 2^attempt)]
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def retry_delay(self, attempt, attempts, deadline):
+        """第 attempt 次失败后的退避时间；没有剩余次数或退避后会超过 deadline 时返回 None"""
+        if attempt + 1 >= attempts:
+            return None
+        delay = self.backoff_delay(attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def request_timeout(self, deadline):
+        """(连接超时, 读超时)，不超过距 deadline 的剩余时间"""
+        remaining = max(0.1, deadline - time.monotonic())
+        return min(self.timeout[0], remaining), min(self.timeout[1], remaining)
+
+    def post(self, path: str, payload: dict, idempotent: bool = True):
+        import requests
+        attempts = self.retries + 1 if idempotent else 1
+        deadline = time.monotonic() + self.deadline
+        hist = self._histogram(path)
+        for attempt in range(attempts):
+            t0 = time.monotonic()
+            try:
+                r = self.session.post(self.base + path, json=payload, timeout=self.request_timeout(deadline))
+            except requests.ConnectionError:
+                # 包括 ConnectTimeout；ReadTimeout 不是 ConnectionError，直接抛出
+                hist.observe(time.monotonic() - t0)
+                self.errors[path] = self.errors.get(path, 0) + 1
+                delay = self.retry_delay(attempt, attempts, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except requests.Timeout:
+                hist.observe(time.monotonic() - t0)
+                self.errors[path] = self.errors.get(path, 0) + 1
+                raise
+            hist.observe(time.monotonic() - t0)
+            if r.status_code in RETRY_STATUS:
+                delay = self.retry_delay(attempt, attempts, deadline)
+                if delay is not None:
+                    self.errors[path] = self.errors.get(path, 0) + 1
+                    time.sleep(delay)
+                    continue
+            return r
+
+    @staticmethod
+    def _result(r, missing_ok: bool = False):
+        # 若服务端暂未实现该接口，返回404，不抛出致命错误
+        if missing_ok and r.status_code == 404:
+            return {"status": "UNSUPPORTED"}
+        r.raise_for_status()
+        return r.json()
+
+    def activate(self, license_key: str, machine_hash: str):
+        # 激活会绑定设备，不自动重试
+        r = self.post("/licenses/activate", {"license_key": license_key, "machine_hash": machine_hash, "app_version": "ui"}, idempotent=False)
+        return self._result(r)
+
+    def validate(self, license_key: str, machine_hash: str):
+        r = self.post("/licenses/validate", {"license_key": license_key, "machine_hash": machine_hash})
+        return self._result(r)
+
+    def heartbeat(self, license_id: int, machine_hash: str, session_token: str):
+        r = self.post("/sessions/heartbeat", {"license_id": license_id, "machine_hash": machine_hash, "session_token": session_token})
+        return self._result(r)
+
+    def end_session(self, license_id: int, machine_hash: str, session_token: str):
+        r = self.post("/sessions/end", {"license_id": license_id, "machine_hash": machine_hash, "session_token": session_token})
+        return self._result(r, missing_ok=True)
+
+    def stats(self):
+        """各接口的延迟直方图和失败次数"""
+        return {path: dict(hist.snapshot(), errors=self.errors.get(path, 0)) for path, hist in list(self.latency.items())}
+
+_client = LicenseClient()
+
+def get_client() -> LicenseClient:
+    return _client
+
 def activate(license_key: str, machine_hash: str):
-    url = f"{API_BASE}/licenses/activate"
-    r = requests.post(url, json={"license_key": license_key, "machine_hash": machine_hash, "app_version": "ui"}, timeout=10)
-    r.raise_for_status()
-    return r.json()
+    return _client.activate(license_key, machine_hash)
 
 def validate(license_key: str, machine_hash: str):
-    url = f"{API_BASE}/licenses/validate"
-    r = requests.post(url, json={"license_key": license_key, "machine_hash": machine_hash}, timeout=10)
-    r.raise_for_status()
-    return r.json()
+    return _client.validate(license_key, machine_hash)
 
 def heartbeat(license_id: int, machine_hash: str, session_token: str):
-    url = f"{API_BASE}/sessions/heartbeat"
-    r = requests.post(url, json={"license_id": license_id, "machine_hash": machine_hash, "session_token": session_token}, timeout=10)
-    r.raise_for_status()
-    return r.json()
+    return _client.heartbeat(license_id, machine_hash, session_token)
 
 def end_session(license_id: int, machine_hash: str, session_token: str):
-    url = f"{API_BASE}/sessions/end"
-    r = requests.post(url, json={"license_id": license_id, "machine_hash": machine_hash, "session_token": session_token}, timeout=10)
-    # 若服务端暂未实现该接口，返回404，不抛出致命错误
-    if r.status_code == 404:
-        return {"status": "UNSUPPORTED"}
-    r.raise_for_status()
-    return r.json()
-
-def save_license_state(data: dict, path: str = "license_state.json"):
-    try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f)
-    except Exception:
-        pass
+    return _client.end_session(license_id, machine_hash, session_token)
+
+class AsyncLicenseClient:
+    """许可证接口的协程版本，在 async_core.AsyncCore 的事件循环中调用
+
+    安装了 httpx 时用 httpx.AsyncClient（连接复用、重试条件、退避和总时长上限与同步客户端相同），
+    否则在核心线程池中调用同步客户端。延迟和失败次数都记在同步客户端上。
+    """
+
+    def __init__(self, core, sync: LicenseClient = None):
+        self.core = core
+        self.sync = sync or _client
+        self._http = None
+
+    @property
+    def http(self):
+        # httpx 在第一次请求时才导入；未安装时为 False
+        if self._http is None:
+            try:
+                import httpx
+            except ImportError:
+                self._http = False
+            else:
+                connect, read = self.sync.timeout
+                self._http = httpx.AsyncClient(
+                    base_url=self.sync.base,
+                    timeout=httpx.Timeout(read, connect=connect),
+                    limits=httpx.Limits(max_connections=self.sync.pool_size, max_keepalive_connections=self.sync.pool_size),
+                )
+        return self._http
+
+    async def aclose(self):
+        if self._http:
+            await self._http.aclose()
+        self._http = None
+
+    async def post(self, path: str, payload: dict, idempotent: bool = True):
+        http = self.http
+        if not http:
+            return await self.core.run_blocking(self.sync.post, path, payload, idempotent)
+        import asyncio
+        import httpx
+        sync = self.sync
+        attempts = sync.retries + 1 if idempotent else 1
+        deadline = time.monotonic() + sync.deadline
+        hist = sync._histogram(path)
+        for attempt in range(attempts):
+            t0 = time.monotonic()
+            connect, read = sync.request_timeout(deadline)
+            try:
+                r = await http.post(path, json=payload, timeout=httpx.Timeout(read, connect=connect))
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                hist.observe(time.monotonic() - t0)
+                sync.errors[path] = sync.errors.get(path, 0) + 1
+                delay = sync.retry_delay(attempt, attempts, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except httpx.TransportError:
+                hist.observe(time.monotonic() - t0)
+                sync.errors[path] = sync.errors.get(path, 0) + 1
+                raise
+            hist.observe(time.monotonic() - t0)
+            if r.status_code in RETRY_STATUS:
+                delay = sync.retry_delay(attempt, attempts, deadline)
+                if delay is not None:
+                    sync.errors[path] = sync.errors.get(path, 0) + 1
+                    await asyncio.sleep(delay)
+                    continue
+            return r
+
+    async def activate(self, license_key: str, machine_hash: str):
+        r = await self.post("/licenses/activate", {"license_key": license_key, "machine_hash": machine_hash, "app_version": "ui"}, idempotent=False)
+        return LicenseClient._result(r)
+
+    async def validate(self, license_key: str, machine_hash: str):
+        r = await self.post("/licenses/validate", {"license_key": license_key, "machine_hash": machine_hash})
+        return LicenseClient._result(r)
+
+    async def heartbeat(self, license_id: int, machine_hash: str, session_token: str):
+        r = await self.post("/sessions/heartbeat", {"license_id": license_id, "machine_hash": machine_hash, "session_token": session_token})
+        return LicenseClient._result(r)
+
+    async def end_session(self, license_id: int, machine_hash: str, session_token: str):
+        r = await self.post("/sessions/end", {"license_id": license_id, "machine_hash": machine_hash, "session_token": session_token})
+        return LicenseClient._result(r, missing_ok=True)
+
+# 激活信息保存在配置存储（config_store）的 license 项，读写都只访问内存
+def save_license_state(data: dict):
+    get_config().set("license", dict(data))
+
+def load_license_state() -> dict:
+    return get_config().get("license")
+
+# 验证租约：成功的验证结果在有效期内直接复用，到期前后台续期
+LEASE_TTL = int(os.getenv("LICENSE_LEASE_TTL", "3600"))
+LEASE_REFRESH_RATIO = 0.8  # 租约用掉 80% 时后台重新验证
+
+def _thread_timer(delay, fn):
+    timer = threading.Timer(delay, fn)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+# 租约续期定时器：timer_factory(delay, fn) 返回带 cancel() 的对象，异步模式下由事件循环调度
+_timer_factory = _thread_timer
+
+def set_timer_factory(factory=None):
+    global _timer_factory
+    _timer_factory = factory or _thread_timer
 
-def load_license_state(path: str = "license_state.json") -> dict:
+def _parse_expires_at(value):
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
     except Exception:
-        return {}
+        return None
+
+class LicenseLease:
+    """验证结果缓存，保存在配置存储的 lease 项
+
+    签名的密钥由 LICENSE_SALT 和机器码组成，本机用户都能得到，只能发现损坏、拷贝到
+    其他机器或不经意的修改，不能防止有意伪造；租约时长有上限，过期后仍以服务端验证为准。
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        self._lock = threading.Lock()
+        self._lease = None
+        self._refreshing = False
+        self._timer = None
+        self._load()
+
+    def _sign(self, lease: dict) -> str:
+        key = (os.getenv("LICENSE_SALT", "dev-salt-change") + lease.get("machine_hash", "")).encode()
+        body = json.dumps({k: v for k, v in lease.items() if k != "sig"}, sort_keys=True).encode()
+        return hmac.new(key, body, hashlib.sha256).hexdigest()
+
+    def _load(self):
+        try:
+            lease = self.config.get("lease")
+            if lease and hmac.compare_digest(lease.get("sig", ""), self._sign(lease)):
+                self._lease = lease
+                self._schedule_refresh()
+        except Exception:
+            self._lease = None
+
+    def _save(self):
+        self.config.set("lease", self._lease)
+
+    def store(self, license_key: str, machine_hash: str, result: dict):
+        now = time.time()
+        ttl = result.get("lease_ttl") or result.get("ttl") or LEASE_TTL
+        expires = now + float(ttl)
+        license_expires = _parse_expires_at(result.get("expires_at"))
+        if license_expires:
+            expires = min(expires, license_expires)
+        lease = {
+            "license_key": license_key,
+            "machine_hash": machine_hash,
+            "result": result,
+            "issued_at": now,
+            "expires_at": expires,
+        }
+        lease["sig"] = self._sign(lease)
+        with self._lock:
+            self._lease = lease
+            self._save()
+        self._schedule_refresh()
+
+    def invalidate(self):
+        with self._lock:
+            self._lease = None
+            self._save()
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+    def get(self, license_key: str, machine_hash: str):
+        """返回有效租约中的验证结果，没有或已过期时返回 None"""
+        with self._lock:
+            lease = self._lease
+        if not lease or lease["license_key"] != license_key or lease["machine_hash"] != machine_hash:
+            return None
+        if time.time() >= lease["expires_at"]:
+            return None
+        return dict(lease["result"], cached=True, lease_expires_at=lease["expires_at"])
+
+    def _schedule_refresh(self):
+        with self._lock:
+            lease = self._lease
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if not lease:
+                return
+            span = lease["expires_at"] - lease["issued_at"]
+            delay = max(1.0, lease["issued_at"] + span * LEASE_REFRESH_RATIO - time.time())
+            self._timer = _timer_factory(delay, self.refresh)
+
+    def refresh(self):
+        """后台重新验证；网络异常时保留租约直到到期，服务端拒绝时立即作废
+
+        服务端每次验证都会换发会话令牌，新令牌交给正在运行的心跳，旧会话随即结束（见 _renew_session）。
+        """
+        with self._lock:
+            lease = self._lease
+            if not lease or self._refreshing:
+                return
+            self._refreshing = True
+        try:
+            r = validate(lease["license_key"], lease["machine_hash"])
+            if r.get("status") == "OK":
+                self.store(lease["license_key"], lease["machine_hash"], r)
+                _renew_session(r, lease["machine_hash"])
+            else:
+                self.invalidate()
+        except Exception:
+            with self._lock:
+                if self._lease is lease and time.time() < lease["expires_at"]:
+                    self._timer = _timer_factory(60, self.refresh)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+_lease = None
+_lease_lock = threading.Lock()
+
+def get_lease() -> LicenseLease:
+    global _lease
+    with _lease_lock:
+        if _lease is None:
+            _lease = LicenseLease()
+        return _lease
+
+def _lease_hit(lease, license_key, machine_hash, force):
+    if not force:
+        cached = lease.get(license_key, machine_hash)
+        if cached is not None:
+            metrics.incr("license.lease_hits")
+            return cached
+    metrics.incr("license.lease_misses")
+    return None
+
+def _lease_update(lease, license_key, machine_hash, r):
+    if r.get("status") == "OK":
+        lease.store(license_key, machine_hash, r)
+    elif r.get("status") in ("EXPIRED", "INVALID", "BOUND_OTHER"):
+        lease.invalidate()
+    return r
+
+def validate_cached(license_key: str, machine_hash: str, force: bool = False):
+    """租约有效时立即返回缓存结果，否则同步验证并建立新租约"""
+    lease = get_lease()
+    cached = _lease_hit(lease, license_key, machine_hash, force)
+    if cached is not None:
+        return cached
+    return _lease_update(lease, license_key, machine_hash, validate(license_key, machine_hash))
+
+async def validate_cached_async(client: AsyncLicenseClient, license_key: str, machine_hash: str, force: bool = False):
+    """validate_cached 的协程版本"""
+    lease = get_lease()
+    cached = _lease_hit(lease, license_key, machine_hash, force)
+    if cached is not None:
+        return cached
+    return _lease_update(lease, license_key, machine_hash, await client.validate(license_key, machine_hash))
 
 class HeartbeatThread(threading.Thread):
-    def __init__(self, license_id: int, machine_hash: str, session_token: str, interval: int = 30):
+    """会话心跳：按单调时钟固定节拍发送，stop() 立即生效
+
+    连续失败达到 max_failures 次后每次失败都回调 on_failure(failures, error)，
+    由调用方决定是否暂停采集。
+    """
+
+    def __init__(self, license_id: int, machine_hash: str, session_token: str, interval: int = 30,
+                 on_failure=None, max_failures: int = 3):
         super().__init__(daemon=True)
         self.license_id = license_id
         self.machine_hash = machine_hash
         self.session_token = session_token
         self.interval = interval
-        self._stop = False
+        self.on_failure = on_failure
+        self.max_failures = max_failures
+        self.failures = 0
+        self.last_error = None
+        self._stop_event = threading.Event()
+
+    def _beat(self):
+        t0 = time.monotonic()
+        try:
+            r = heartbeat(self.license_id, self.machine_hash, self.session_token)
+            if r.get("status", "OK") == "OK":
+                return None
+            return r.get("message") or r.get("status")
+        except Exception as e:
+            return str(e)
+        finally:
+            metrics.observe("license.heartbeat_rtt", time.monotonic() - t0)
 
     def run(self):
-        while not self._stop:
+        next_at = time.monotonic()
+        while not self._stop_event.is_set():
+            error = self._beat()
+            # 停止后返回的结果已过期，直接丢弃
+            if self._stop_event.is_set():
+                break
+            if error is None:
+                self.failures = 0
+            else:
+                metrics.incr("license.heartbeat_failures")
+                self.failures += 1
+                self.last_error = error
+                if self.on_failure and self.failures >= self.max_failures:
+                    try:
+                        self.on_failure(self.failures, error)
+                    except Exception:
+                        pass
+            # 按固定节拍计算下一次，不随请求耗时漂移；落后太多时跳过错过的节拍
+            next_at += self.interval
+            now = time.monotonic()
+            if next_at < now:
+                next_at = now + self.interval
+            self._stop_event.wait(next_at - now)
+
+    def stop(self, timeout: float = None):
+        self._stop_event.set()
+        if timeout is not None and self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+class AsyncHeartbeat:
+    """HeartbeatThread 的事件循环版本：同样的节拍和失败回调，作为核心循环中的一个任务运行
+
+    on_failure 在核心线程池中调用，不阻塞事件循环。
+    """
+
+    def __init__(self, client: AsyncLicenseClient, license_id: int, machine_hash: str, session_token: str,
+                 interval: int = 30, on_failure=None, max_failures: int = 3):
+        self.client = client
+        self.license_id = license_id
+        self.machine_hash = machine_hash
+        self.session_token = session_token
+        self.interval = interval
+        self.on_failure = on_failure
+        self.max_failures = max_failures
+        self.failures = 0
+        self.last_error = None
+        self._stopped = False
+        self._future = None
+
+    def start(self):
+        self._future = self.client.core.submit(self._run())
+        return self
+
+    def is_alive(self):
+        return self._future is not None and not self._future.done()
+
+    async def _beat(self):
+        t0 = time.monotonic()
+        try:
+            r = await self.client.heartbeat(self.license_id, self.machine_hash, self.session_token)
+            if r.get("status", "OK") == "OK":
+                return None
+            return r.get("message") or r.get("status")
+        except Exception as e:
+            return str(e)
+        finally:
+            metrics.observe("license.heartbeat_rtt", time.monotonic() - t0)
+
+    async def _run(self):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        while not self._stopped:
+            error = await self._beat()
+            if self._stopped:
+                break
+            if error is None:
+                self.failures = 0
+            else:
+                metrics.incr("license.heartbeat_failures")
+                self.failures += 1
+                self.last_error = error
+                if self.on_failure and self.failures >= self.max_failures:
+                    try:
+                        await self.client.core.run_blocking(self.on_failure, self.failures, error)
+                    except Exception:
+                        pass
+            next_at += self.interval
+            now = loop.time()
+            if next_at < now:
+                next_at = now + self.interval
+            await asyncio.sleep(next_at - now)
+
+    def stop(self, timeout: float = None):
+        # 取消任务立即打断正在等待的请求或节拍
+        self._stopped = True
+        future = self._future
+        if future is None:
+            return
+        future.cancel()
+        if timeout is not None and not self.client.core.in_loop():
             try:
-                heartbeat(self.license_id, self.machine_hash, self.session_token)
-            except Exception:
+                future.result(timeout)
+            except BaseException:
                 pass
-            time.sleep(self.interval)
 
-    def stop(self):
-        self._stop = True
+# 每个进程只允许一个心跳，新会话开始时停止旧心跳
+_heartbeat = None
+_heartbeat_lock = threading.Lock()
+
+def start_heartbeat(license_id: int, machine_hash: str, session_token: str, interval: int = 30,
+                    on_failure=None, max_failures: int = 3, client: AsyncLicenseClient = None):
+    """client 为 AsyncLicenseClient 时心跳作为事件循环任务运行（AsyncHeartbeat），否则为独立线程"""
+    global _heartbeat
+    with _heartbeat_lock:
+        if _heartbeat is not None:
+            _heartbeat.stop()
+        if client is not None:
+            _heartbeat = AsyncHeartbeat(client, license_id, machine_hash, session_token, interval=interval,
+                                        on_failure=on_failure, max_failures=max_failures)
+        else:
+            _heartbeat = HeartbeatThread(license_id, machine_hash, session_token, interval=interval,
+                                         on_failure=on_failure, max_failures=max_failures)
+        _heartbeat.start()
+        return _heartbeat
+
+# 续期换发的会话令牌通知调用方：listener(license_id, session_token)
+_session_listener = None
+
+def set_session_listener(listener=None):
+    global _session_listener
+    _session_listener = listener
+
+def _renew_session(result: dict, machine_hash: str):
+    """续期验证换发的会话：同一许可证的心跳改用新令牌并通知监听者，然后结束旧会话；
+    没有心跳时新会话无人使用，直接结束"""
+    token = result.get("session_token")
+    license_id = result.get("license_id")
+    if not token:
+        return
+    with _heartbeat_lock:
+        hb = _heartbeat
+        if hb is not None and hb.license_id == license_id:
+            stale, hb.session_token = hb.session_token, token
+        else:
+            hb, stale = None, token
+    if hb is not None and _session_listener is not None:
+        try:
+            _session_listener(license_id, token)
+        except Exception:
+            pass
+    if stale and (hb is None or stale != token):
+        try:
+            end_session(license_id, machine_hash, stale)
+        except Exception:
+            pass
+
+def stop_heartbeat(timeout: float = None):
+    global _heartbeat
+    with _heartbeat_lock:
+        hb, _heartbeat = _heartbeat, None
+    if hb is not None:
+        hb.stop(timeout)
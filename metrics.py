@@ -0,0 +1,136 @@
+"""
+轻量指标 - 固定桶延迟直方图、计时器/计数器注册表和定期 JSONL 导出
+"""
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+# 默认桶上界（秒）
+LATENCY_BOUNDS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+# 热路径阶段耗时通常在微秒级，桶从 1µs 起
+STAGE_BOUNDS = (0.000001, 0.000002, 0.000005, 0.00001, 0.00002, 0.00005, 0.0001, 0.0002) + LATENCY_BOUNDS
+
+
+class LatencyHistogram:
+    """固定桶直方图，记录为 O(log 桶数)，内存固定"""
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = tuple(bounds)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q):
+        """返回分位数所在桶的上界（最后一个桶返回最大值）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target and c:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self.counts)
+            count, total, mx = self.count, self.total, self.max
+        buckets = {f"le_{b:g}": c for b, c in zip(self.bounds, counts) if c}
+        if counts[-1]:
+            buckets["inf"] = counts[-1]
+        return {
+            "count": count,
+            "avg": total / count if count else 0.0,
+            "max": mx,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class Metrics:
+    """计时器（固定桶直方图）和计数器注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+
+    def timer(self, name, bounds=STAGE_BOUNDS):
+        hist = self.timers.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self.timers.setdefault(name, LatencyHistogram(bounds))
+        return hist
+
+    def observe(self, name, seconds):
+        self.timer(name).observe(seconds)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            timers = list(self.timers.items())
+            counters = dict(self.counters)
+        return {"timers": {name: hist.snapshot() for name, hist in timers}, "counters": counters}
+
+    def reset(self):
+        with self._lock:
+            timers = list(self.timers.values())
+            self.counters = {}
+        for hist in timers:
+            hist.reset()
+
+
+# 进程级默认注册表
+metrics = Metrics()
+
+
+class MetricsDumper(threading.Thread):
+    """定期把 snapshot() 的结果追加到 JSONL 文件"""
+
+    def __init__(self, path, snapshot, interval=10.0):
+        super().__init__(daemon=True)
+        self.path = path
+        self.snapshot = snapshot
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def _dump(self):
+        try:
+            line = json.dumps(dict(self.snapshot(), ts=time.time()), ensure_ascii=False, default=str)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except Exception as e:
+            print(f"写入指标失败: {e}", file=sys.stderr)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self._dump()
+        self._dump()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(2.0)
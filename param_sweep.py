@@ -0,0 +1,99 @@
+"""
+参数扫描 - 同一关键词只采集一次（取网格中最宽松的阈值），每组阈值在本地结果库中离线评估
+
+网格为 {"price": [...], "pinned": [...], "reviews": [...]}，缺省的字段为 [0]（不限）。
+阈值语义与采集一致：价格不高于 price、拼单数不低于 pinned、评价数不低于 reviews，0 为不限。
+每组阈值输出条数、均值，可选导出文件；换一组网格重新评估不需要重新采集。
+"""
+import itertools
+import os
+import time
+
+from metrics import metrics
+from result_export import EXPORT_FORMATS, normalize_format
+
+SWEEP_FIELDS = ("price", "pinned", "reviews")
+MAX_COMBINATIONS = int(os.getenv("PDD_SWEEP_MAX", "200"))
+EXPORT_COLUMNS = ["title", "price", "pinned", "reviews", "url", "collected_at"]
+
+
+def parse_grid(grid):
+    """校验网格，返回各字段排序去重后的取值；组合数超过 MAX_COMBINATIONS 时抛出 ValueError"""
+    if not isinstance(grid, dict):
+        raise ValueError("网格应为 {price: [...], pinned: [...], reviews: [...]}")
+    unknown = set(grid) - set(SWEEP_FIELDS)
+    if unknown:
+        raise ValueError(f"不支持的扫描字段: {', '.join(sorted(unknown))}")
+    out = {}
+    for field in SWEEP_FIELDS:
+        values = grid.get(field)
+        if values is None or values == []:
+            values = [0]
+        elif not isinstance(values, (list, tuple)):
+            values = [values]
+        values = sorted({float(v) for v in values})
+        if values[0] < 0:
+            raise ValueError(f"{field} 阈值不能为负数")
+        out[field] = values
+    count = len(out["price"]) * len(out["pinned"]) * len(out["reviews"])
+    if count > MAX_COMBINATIONS:
+        raise ValueError(f"组合数 {count} 超过上限 {MAX_COMBINATIONS}")
+    return out
+
+
+def combinations(grid):
+    return [dict(zip(SWEEP_FIELDS, values)) for values in itertools.product(*(grid[f] for f in SWEEP_FIELDS))]
+
+
+def loosest(grid):
+    """覆盖网格中所有组合的采集阈值"""
+    prices = grid["price"]
+    return {
+        "price": 0.0 if 0 in prices else max(prices),
+        "pinned": min(grid["pinned"]),
+        "reviews": int(min(grid["reviews"])),
+    }
+
+
+def combo_filters(run_id, combo):
+    """一组阈值对应的结果库查询条件（见 result_warehouse.build_where）"""
+    filters = {"runId": run_id}
+    if combo["price"] > 0:
+        filters["maxPrice"] = combo["price"]
+    if combo["pinned"] > 0:
+        filters["minPinned"] = combo["pinned"]
+    if combo["reviews"] > 0:
+        filters["minReviews"] = combo["reviews"]
+    return filters
+
+
+def combo_name(combo):
+    return f"p{combo['price']:g}_n{combo['pinned']:g}_r{combo['reviews']:g}"
+
+
+def evaluate(warehouse, run_id, grid, export_dir=None, fmt="csv"):
+    """在结果库中评估网格的每组阈值；export_dir 不为空时每组（有结果的）导出一个文件
+
+    返回 {run_id, grid, candidates, combinations: [{price, pinned, reviews, count, avg_*,
+    min_price, max_price, file_path?, file_size?}], seconds}。
+    """
+    t0 = time.perf_counter()
+    grid = parse_grid(grid)
+    combos = combinations(grid)
+    filters = [combo_filters(run_id, c) for c in combos]
+    candidates = warehouse.aggregate([{"runId": run_id}])[0]["count"]
+    rows = []
+    for combo, f, stats in zip(combos, filters, warehouse.aggregate(filters)):
+        row = dict(combo, **stats)
+        if export_dir and stats["count"]:
+            # 阈值可能带小数点，不用 export_path（按扩展名截断）拼文件名
+            name = f"pdd_sweep_{run_id}_{combo_name(combo)}.{EXPORT_FORMATS[normalize_format(fmt)]}"
+            path = os.path.join(export_dir, name)
+            warehouse.export(path, fmt, f, "id", EXPORT_COLUMNS)
+            row["file_path"] = path
+            row["file_size"] = os.path.getsize(path)
+        rows.append(row)
+    seconds = time.perf_counter() - t0
+    metrics.observe("sweep.evaluate", seconds)
+    return {"run_id": run_id, "grid": grid, "candidates": candidates, "combinations": rows,
+            "seconds": round(seconds, 3)}
@@ -0,0 +1,100 @@
+"""
+子进程采集引擎 - run_scraper 在独立进程中运行，商品/进度经队列流回主进程回调
+
+run_in_process 与 run_scraper 签名一致，可直接作为 ScrapeJob.run 的 runner。
+"""
+import multiprocessing
+import queue
+import time
+
+ITEM_BATCH = 50  # 子进程每批回传的商品数
+ITEM_BATCH_DELAY = 0.05  # 未攒满时最长等待（秒）
+KILL_TIMEOUT = 5.0  # 请求停止后等待子进程自行退出的时间
+
+
+def _child_main(keyword, price, pinned, reviews, events, stop_event, cursor=None):
+    """子进程入口：批量回传商品，进度前先把已有商品发出去以保证顺序"""
+    batch = []
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal batch, last_flush
+        if batch:
+            events.put(("items", batch))
+            batch = []
+        last_flush = time.monotonic()
+
+    def on_item(item):
+        batch.append(item)
+        if len(batch) >= ITEM_BATCH or time.monotonic() - last_flush >= ITEM_BATCH_DELAY:
+            flush()
+
+    def on_progress(info):
+        flush()
+        events.put(("progress", dict(info)))
+
+    try:
+        from pdd_scraper import run_scraper
+        resume = {"cursor": cursor} if cursor is not None else {}
+        run_scraper(keyword, price, pinned, reviews, on_item=on_item, on_progress=on_progress,
+                    stop_event=stop_event, output_path=None, **resume)
+        flush()
+        events.put(("done", None))
+    except BaseException as e:
+        flush()
+        events.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def _terminate(proc):
+    proc.terminate()
+    proc.join(1.0)
+    if proc.is_alive():
+        proc.kill()
+        proc.join(1.0)
+
+
+def run_in_process(keyword, price, pinned, reviews, on_item=None, on_progress=None, stop_event=None,
+                   output_path=None, cursor=None, kill_timeout=KILL_TIMEOUT):
+    """在子进程中执行 run_scraper；stop_event 置位后先协作停止，超时强制结束
+
+    cursor 为继续采集的游标，原样传给子进程中的 run_scraper。
+    """
+    ctx = multiprocessing.get_context("spawn")
+    events = ctx.Queue(maxsize=1000)
+    child_stop = ctx.Event()
+    proc = ctx.Process(target=_child_main, args=(keyword, price, pinned, reviews, events, child_stop, cursor),
+                       name="pdd-scraper", daemon=True)
+    proc.start()
+    stop_requested = None
+    try:
+        while True:
+            if stop_event is not None and stop_event.is_set() and stop_requested is None:
+                child_stop.set()
+                stop_requested = time.monotonic()
+            if stop_requested is not None and time.monotonic() - stop_requested > kill_timeout:
+                _terminate(proc)
+                return
+            try:
+                kind, payload = events.get(timeout=0.1)
+            except queue.Empty:
+                if not proc.is_alive():
+                    if stop_requested is not None:
+                        return
+                    raise RuntimeError(f"采集子进程异常退出 (exitcode={proc.exitcode})")
+                continue
+            if kind == "items":
+                if on_item:
+                    for item in payload:
+                        on_item(item)
+            elif kind == "progress":
+                if on_progress:
+                    on_progress(payload)
+            elif kind == "done":
+                return
+            elif kind == "error":
+                raise RuntimeError(payload)
+    finally:
+        proc.join(1.0)
+        if proc.is_alive():
+            _terminate(proc)
+        events.close()
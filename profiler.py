@@ -0,0 +1,157 @@
+"""
+采集剖析 - 按需启用的 cProfile 或调用栈采样器，一次只剖析一次采集
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_MODES = ("sampler", "cprofile")
+SAMPLE_INTERVAL = 0.005  # 采样间隔（秒）
+MAX_DEPTH = 64
+# 栈顶停在这些模块里的线程视为空闲等待，不计入采样
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py")
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """定时读取所有线程的调用栈（sys._current_frames），按折叠栈计数
+
+    不需要在被采样线程中启用，开销只取决于采样频率；结果可直接用于火焰图工具。
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, max_depth=MAX_DEPTH):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == own or os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(2.0)
+
+    def top(self, limit=30):
+        """按自身采样数排序的函数列表"""
+        own, total = Counter(), Counter()
+        for stack, n in self.stacks.items():
+            if not stack:
+                continue
+            own[stack[-1]] += n
+            for name in set(stack):
+                total[name] += n
+        return [{"func": name, "self": n, "total": total[name]} for name, n in own.most_common(limit)]
+
+    def write(self, path):
+        """写出折叠栈（每行 "a;b;c 次数"）"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(";".join(stack) + f" {n}\n")
+
+
+class RunProfiler:
+    """一次采集的剖析器
+
+    sampler 模式创建后即可 start()，采样所有线程；cprofile 模式由采集线程在
+    运行开始时 enable()、结束时 disable()（cProfile 只记录调用它的线程）。
+    """
+
+    def __init__(self, mode="sampler", interval=SAMPLE_INTERVAL):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"不支持的剖析模式: {mode}")
+        self.mode = mode
+        self.interval = interval
+        self.started_at = None
+        self.stopped_at = None
+        self.path = None
+        self._sampler = None
+        self._profile = cProfile.Profile() if mode == "cprofile" else None
+
+    @property
+    def running(self):
+        return self.started_at is not None and self.stopped_at is None
+
+    def start(self):
+        self.started_at = time.time()
+        if self._sampler is None and self.mode == "sampler":
+            self._sampler = StackSampler(self.interval)
+            self._sampler.start()
+
+    def enable(self):
+        """在采集线程中调用"""
+        if self._profile is not None:
+            if self.started_at is None:
+                self.started_at = time.time()
+            self._profile.enable()
+
+    def disable(self):
+        """在采集线程中调用"""
+        if self._profile is not None:
+            self._profile.disable()
+
+    def stop(self, path=None):
+        """停止剖析，传入 path 时写出结果（sampler 为折叠栈文本，cprofile 为 pstats 文件）"""
+        if self.stopped_at is None:
+            self.stopped_at = time.time()
+            if self._sampler is not None:
+                self._sampler.stop()
+        if path:
+            try:
+                if self._sampler is not None:
+                    self._sampler.write(path)
+                elif self._profile is not None:
+                    self._profile.dump_stats(path)
+                self.path = path
+            except Exception as e:
+                print(f"写入剖析结果失败: {e}", file=sys.stderr)
+        return self.summary()
+
+    def summary(self, limit=30):
+        s = {
+            "mode": self.mode,
+            "running": self.running,
+            "started_at": self.started_at,
+            "duration": round((self.stopped_at or time.time()) - self.started_at, 3) if self.started_at else 0.0,
+            "path": self.path,
+        }
+        if self._sampler is not None:
+            s["samples"] = self._sampler.samples
+            s["top"] = self._sampler.top(limit)
+        elif self._profile is not None and self.stopped_at is not None:
+            s["top"] = self._cprofile_top(limit)
+        return s
+
+    def _cprofile_top(self, limit):
+        try:
+            stats = pstats.Stats(self._profile, stream=io.StringIO())
+        except TypeError:
+            return []  # 尚未记录到任何调用
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, callers) in stats.stats.items():
+            rows.append({"func": f"{func} ({os.path.basename(filename)}:{line})", "calls": nc,
+                         "self": round(tt, 6), "total": round(ct, 6)})
+        rows.sort(key=lambda r: r["self"], reverse=True)
+        return rows[:limit]
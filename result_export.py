@@ -0,0 +1,178 @@
+"""
+结果导出 - 从结果库/内存结果流式写出 xlsx、csv、jsonl（可 gzip/zstd 压缩）和 Parquet/Arrow
+
+行按 chunk_size 分块写入，内存只保留一块；zstd 需要 zstandard，Parquet/Arrow 需要 pyarrow。
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from metrics import metrics
+from result_sink import COLUMNS, HEADERS
+
+CHUNK_SIZE = 5000
+# 格式 -> 扩展名
+EXPORT_FORMATS = {
+    "xlsx": "xlsx",
+    "excel": "xlsx",
+    "csv": "csv",
+    "csv.gz": "csv.gz",
+    "csv.zst": "csv.zst",
+    "jsonl": "jsonl",
+    "jsonl.gz": "jsonl.gz",
+    "jsonl.zst": "jsonl.zst",
+    "parquet": "parquet",
+    "arrow": "arrow",
+}
+# 列式格式的列类型，未列出的列按字符串
+NUMERIC_COLUMNS = {"price": "float64", "pinned": "float64", "reviews": "int64"}
+
+
+class ExportUnavailable(RuntimeError):
+    """导出格式需要的可选依赖未安装"""
+
+
+def normalize_format(fmt):
+    fmt = (fmt or "xlsx").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    return "xlsx" if fmt == "excel" else fmt
+
+
+def export_path(base, fmt):
+    """base 去掉扩展名后加上格式对应的扩展名"""
+    return f"{os.path.splitext(base)[0]}.{EXPORT_FORMATS[normalize_format(fmt)]}"
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _open_text(path, compression, bom=False):
+    if compression == "gz":
+        # mtime=0 让相同内容生成相同文件
+        return io.TextIOWrapper(gzip.GzipFile(path, "wb", compresslevel=6, mtime=0), encoding="utf-8", newline="")
+    if compression == "zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise ExportUnavailable("zstd 压缩需要安装 zstandard")
+        raw = open(path, "wb")
+        return io.TextIOWrapper(zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True), encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8-sig" if bom else "utf-8", newline="")
+
+
+def _write_csv(f, chunks, columns):
+    w = csv.writer(f)
+    w.writerow([HEADERS.get(c, c) for c in columns])
+    rows = 0
+    for chunk in chunks:
+        w.writerows([[item.get(c, "") for c in columns] for item in chunk])
+        rows += len(chunk)
+    return rows
+
+
+def _write_jsonl(f, chunks, columns):
+    rows = 0
+    for chunk in chunks:
+        f.write("".join(json.dumps({c: item.get(c) for c in columns}, ensure_ascii=False) + "\n" for item in chunk))
+        rows += len(chunk)
+    return rows
+
+
+def _write_xlsx(path, chunks, columns):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportUnavailable("xlsx 导出需要安装 openpyxl")
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("结果")
+    ws.append([HEADERS.get(c, c) for c in columns])
+    rows = 0
+    for chunk in chunks:
+        for item in chunk:
+            ws.append([item.get(c, "") for c in columns])
+        rows += len(chunk)
+    wb.save(path)
+    return rows
+
+
+def _arrow_batch(pa, schema, chunk, columns):
+    arrays = []
+    for c in columns:
+        kind = NUMERIC_COLUMNS.get(c)
+        if kind == "float64":
+            values = [float(item.get(c) or 0) for item in chunk]
+        elif kind == "int64":
+            values = [int(float(item.get(c) or 0)) for item in chunk]
+        else:
+            values = [None if item.get(c) is None else str(item.get(c)) for item in chunk]
+        arrays.append(pa.array(values, type=schema.field(c).type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _write_columnar(path, fmt, chunks, columns):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ExportUnavailable("Parquet/Arrow 导出需要安装 pyarrow")
+    schema = pa.schema([(c, getattr(pa, NUMERIC_COLUMNS.get(c, "string"))()) for c in columns])
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(path, schema, compression="zstd")
+        write = writer.write_batch
+    else:
+        sink = pa.OSFile(path, "wb")
+        writer = pa.ipc.new_file(sink, schema)
+        write = writer.write_batch
+    rows = 0
+    try:
+        for chunk in chunks:
+            write(_arrow_batch(pa, schema, chunk, columns))
+            rows += len(chunk)
+    finally:
+        writer.close()
+        if fmt != "parquet":
+            sink.close()
+    return rows
+
+
+def export_rows(rows, path, fmt=None, columns=None, chunk_size=CHUNK_SIZE):
+    """把可迭代的结果行（dict）分块写入 path，返回写入行数
+
+    先写到临时文件，成功后再替换目标文件，失败时不会留下半截文件。
+    """
+    fmt = normalize_format(fmt or os.path.basename(path).split(".", 1)[-1])
+    t0 = time.perf_counter()
+    columns = list(columns or COLUMNS)
+    chunks = _chunks(rows, chunk_size)
+    tmp = f"{path}.tmp"
+    try:
+        if fmt == "xlsx":
+            n = _write_xlsx(tmp, chunks, columns)
+        elif fmt in ("parquet", "arrow"):
+            n = _write_columnar(tmp, fmt, chunks, columns)
+        else:
+            base, _, compression = fmt.partition(".")
+            # 未压缩的 csv 带 BOM，Excel 才能正确识别中文
+            with _open_text(tmp, compression, bom=(fmt == "csv")) as f:
+                n = (_write_csv if base == "csv" else _write_jsonl)(f, chunks, columns)
+        os.replace(tmp, path)
+        metrics.observe(f"export.{fmt}", time.perf_counter() - t0)
+        return n
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,239 @@
+"""
+结果流式写入 - 边采集边落盘（xlsx / csv / jsonl），带断点文件
+"""
+import csv
+import json
+import os
+import sys
+import time
+
+COLUMNS = ["title", "price", "pinned", "reviews", "url"]
+HEADERS = {
+    "title": "标题", "price": "价格", "pinned": "拼单数", "reviews": "评价数", "url": "链接",
+    "keyword": "关键词", "run_id": "任务ID", "collected_at": "采集时间",
+}
+CHECKPOINT_SUFFIX = ".ckpt"
+SPOOL_SUFFIX = ".part.jsonl"  # xlsx 采集中的暂存文件
+
+
+def _write_json_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    try:
+        with open(path + CHECKPOINT_SUFFIX, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+class ResultSink:
+    """追加写入的结果文件基类
+
+    行先进入缓冲区，每满 chunk_size 条写入磁盘一次并更新断点文件
+    （已写行数 + 文件偏移），崩溃后可截断到最后一个完整块继续写或直接恢复。
+    resume 为 True 时从断点文件继续，也可直接传入之前保存的断点（checkpoint 属性）。
+    """
+
+    format = ""
+
+    def __init__(self, path, columns=None, chunk_size=500, resume=False):
+        self.path = path
+        self.columns = list(columns or COLUMNS)
+        self.chunk_size = chunk_size
+        self.checkpoint_path = path + CHECKPOINT_SUFFIX
+        self.rows = 0
+        self.checkpoint = None  # 最近一次写入的断点
+        self._buffer = []
+        self._file = None
+        self._open(resume)
+
+    @property
+    def data_path(self):
+        """实际追加写入的文件"""
+        return self.path
+
+    @property
+    def closed(self):
+        return self._file is None
+
+    def _open(self, resume):
+        ckpt = resume if isinstance(resume, dict) else load_checkpoint(self.path) if resume else None
+        if ckpt:
+            self.rows = ckpt.get("rows", 0)
+            self.columns = ckpt.get("columns") or self.columns
+            self._file = self._open_file("r+")
+            # 丢弃最后一次断点之后写入的半截数据
+            self._file.truncate(ckpt.get("offset", 0))
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = self._open_file("w")
+            self._write_header()
+            self._file.flush()
+            self._save_checkpoint()
+
+    def _open_file(self, mode):
+        return open(self.data_path, mode, encoding="utf-8", newline="")
+
+    def _write_header(self):
+        pass
+
+    def _write_rows(self, items):
+        raise NotImplementedError
+
+    def write(self, item):
+        self._buffer.append(item)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        self._write_buffer()
+        if self.checkpoint is not None and self.checkpoint["rows"] == self.rows:
+            return
+        self._file.flush()
+        self._save_checkpoint()
+
+    def _write_buffer(self):
+        if self._buffer:
+            self._write_rows(self._buffer)
+            self.rows += len(self._buffer)
+            self._buffer = []
+
+    def position(self):
+        """写出缓冲中的行（不落盘、不更新断点文件），返回可用于继续写入的断点：到目前为止的行数和文件偏移"""
+        self._write_buffer()
+        return dict(self.checkpoint or {}, rows=self.rows, offset=self._file.tell(), complete=False)
+
+    def _save_checkpoint(self, complete=False):
+        self.checkpoint = {
+            "path": self.path,
+            "format": self.format,
+            "columns": self.columns,
+            "rows": self.rows,
+            "offset": self._file.tell(),
+            "complete": complete,
+            "updated_at": time.time(),
+        }
+        _write_json_atomic(self.checkpoint_path, self.checkpoint)
+
+    def _finalize(self, keep):
+        pass
+
+    def close(self, keep_checkpoint=False):
+        """写出剩余数据并完成文件，成功后删除断点文件
+
+        keep_checkpoint=True 时保留断点（标记为完整）和追加用的数据，之后可以继续写入。
+        """
+        if self._file is None:
+            return
+        self.flush()
+        if keep_checkpoint:
+            self._save_checkpoint(complete=True)
+        self._file.close()
+        self._file = None
+        self._finalize(keep_checkpoint)
+        if not keep_checkpoint:
+            discard_checkpoint(self.path)
+
+
+class CsvSink(ResultSink):
+    format = "csv"
+
+    def _open_file(self, mode):
+        # utf-8-sig 让 Excel 正确识别中文
+        encoding = "utf-8-sig" if mode == "w" else "utf-8"
+        return open(self.data_path, mode, encoding=encoding, newline="")
+
+    def _write_header(self):
+        csv.writer(self._file).writerow([HEADERS.get(c, c) for c in self.columns])
+
+    def _write_rows(self, items):
+        w = csv.writer(self._file)
+        w.writerows([[item.get(c, "") for c in self.columns] for item in items])
+
+
+class JsonlSink(ResultSink):
+    format = "jsonl"
+
+    def _write_rows(self, items):
+        self._file.write("".join(json.dumps(item, ensure_ascii=False) + "\n" for item in items))
+
+
+class XlsxSink(JsonlSink):
+    """xlsx 无法追加写入：采集中写 jsonl 暂存文件，结束时用 write-only 模式流式转换"""
+
+    format = "xlsx"
+
+    @property
+    def data_path(self):
+        return self.path + SPOOL_SUFFIX
+
+    def _finalize(self, keep):
+        spool_to_xlsx(self.data_path, self.path, self.columns)
+        if not keep:
+            os.remove(self.data_path)
+
+
+def spool_to_xlsx(spool_path, xlsx_path, columns):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("结果")
+    ws.append([HEADERS.get(c, c) for c in columns])
+    with open(spool_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                break  # 末尾未写完整的行
+            ws.append([item.get(c, "") for c in columns])
+    wb.save(xlsx_path)
+
+
+SINKS = {"xlsx": XlsxSink, "excel": XlsxSink, "csv": CsvSink, "jsonl": JsonlSink}
+
+
+def open_sink(path, fmt=None, resume=False, **kwargs):
+    """按格式（默认取扩展名）创建结果写入器"""
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".") or "xlsx").lower()
+    if fmt not in SINKS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    return SINKS[fmt](path, resume=resume, **kwargs)
+
+
+def discard_checkpoint(path):
+    """删除结果文件的断点和 xlsx 暂存文件，结果文件本身保留"""
+    for extra in (path + CHECKPOINT_SUFFIX, path + SPOOL_SUFFIX):
+        try:
+            os.remove(extra)
+        except OSError:
+            pass
+
+
+def recover_sink(path):
+    """将中断的结果文件恢复为完整文件，返回已恢复的行数（已完整的文件返回 None）"""
+    ckpt = load_checkpoint(path)
+    if not ckpt or ckpt.get("complete"):
+        return None
+    sink = SINKS[ckpt.get("format") or "xlsx"](path, resume=True)
+    sink.close()
+    return sink.rows
+
+
+def recover_dir(directory):
+    """恢复目录下所有带断点文件的结果"""
+    recovered = []
+    for name in os.listdir(directory):
+        if name.endswith(CHECKPOINT_SUFFIX):
+            path = os.path.join(directory, name[:-len(CHECKPOINT_SUFFIX)])
+            try:
+                rows = recover_sink(path)
+                if rows is not None:
+                    recovered.append({"file_path": path, "rows": rows})
+            except Exception as e:
+                print(f"恢复结果文件失败 {path}: {e}", file=sys.stderr)
+    return recovered
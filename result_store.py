@@ -0,0 +1,383 @@
+"""
+内存结果存储 - 定长环形缓冲 + 增量统计（计数/求和/最值/近似分位数）
+"""
+import threading
+import time
+from collections import deque
+
+DEFAULT_RETENTION = 10000
+STAT_FIELDS = ("price", "pinned", "reviews")
+
+
+def _to_float(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class P2Quantile:
+    """P² 算法的流式分位数估计，固定 5 个标记点，O(1) 内存"""
+
+    __slots__ = ("p", "_init", "q", "n", "np", "dn")
+
+    def __init__(self, p):
+        self.p = p
+        self._init = []
+        self.q = None
+        self.n = None
+        self.np = None
+        self.dn = (0.0, p / 2, p, (1 + p) / 2, 1.0)
+
+    def add(self, x):
+        if self.q is None:
+            self._init.append(x)
+            if len(self._init) == 5:
+                self._init.sort()
+                self.q = self._init
+                self.n = [0, 1, 2, 3, 4]
+                p = self.p
+                self.np = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+            return
+        q, n = self.q, self.n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np[i] += self.dn[i]
+        for i in (1, 2, 3):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = self._parabolic(i, d)
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.q, self.n
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def state(self):
+        if self.q is None:
+            return {"init": list(self._init)}
+        return {"init": [], "q": list(self.q), "n": list(self.n), "np": list(self.np)}
+
+    def load_state(self, state):
+        self._init = list(state.get("init") or [])
+        self.q, self.n, self.np = state.get("q"), state.get("n"), state.get("np")
+
+    def value(self):
+        if self.q is not None:
+            return self.q[2]
+        if not self._init:
+            return 0.0
+        s = sorted(self._init)
+        return s[min(len(s) - 1, int(round(self.p * (len(s) - 1))))]
+
+
+class RunningStat:
+    """单个字段的增量统计"""
+
+    __slots__ = ("count", "total", "min", "max", "quantiles")
+
+    def __init__(self, quantiles=(0.5, 0.9)):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.quantiles = {p: P2Quantile(p) for p in quantiles}
+
+    def add(self, x):
+        self.count += 1
+        self.total += x
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+        for est in self.quantiles.values():
+            est.add(x)
+
+    def add_many(self, values):
+        """整批更新；分位数估计仍需逐个加入"""
+        if not values:
+            return
+        self.count += len(values)
+        self.total += sum(values)
+        lo, hi = min(values), max(values)
+        if self.min is None or lo < self.min:
+            self.min = lo
+        if self.max is None or hi > self.max:
+            self.max = hi
+        for est in self.quantiles.values():
+            add = est.add
+            for x in values:
+                add(x)
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count else 0.0
+
+    def state(self):
+        """可 JSON 序列化的完整状态（含分位数估计），用于断点"""
+        return {
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            "quantiles": {str(p): est.state() for p, est in self.quantiles.items()},
+        }
+
+    def load_state(self, state):
+        self.count = state.get("count", 0)
+        self.total = state.get("total", 0.0)
+        self.min = state.get("min")
+        self.max = state.get("max")
+        for p, est_state in (state.get("quantiles") or {}).items():
+            est = self.quantiles.get(float(p))
+            if est is not None:
+                est.load_state(est_state)
+
+    def snapshot(self):
+        s = {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min or 0.0,
+            "max": self.max or 0.0,
+            "avg": self.avg,
+        }
+        for p, est in self.quantiles.items():
+            s[f"p{int(p * 100)}"] = est.value()
+        return s
+
+
+DERIVED_FIELDS = ("price_per_review", "price_pct", "pinned_pct")  # 批量阶段补充的字段（见 batch_filter）
+
+
+class ResultRecord:
+    """单条结果，__slots__ 避免每条记录一个 dict；派生字段没有时为 None，不出现在 to_dict 中"""
+
+    __slots__ = ("seq", "title", "price", "pinned", "reviews", "url") + DERIVED_FIELDS
+
+    def __init__(self, seq, title, price, pinned, reviews, url, price_per_review=None, price_pct=None,
+                 pinned_pct=None):
+        self.seq = seq
+        self.title = title
+        self.price = price
+        self.pinned = pinned
+        self.reviews = reviews
+        self.url = url
+        self.price_per_review = price_per_review
+        self.price_pct = price_pct
+        self.pinned_pct = pinned_pct
+
+    def to_dict(self):
+        d = {
+            "seq": self.seq,
+            "title": self.title,
+            "price": self.price,
+            "pinned": self.pinned,
+            "reviews": self.reviews,
+            "url": self.url,
+        }
+        if self.price_pct is not None:
+            d["price_per_review"] = self.price_per_review
+            d["price_pct"] = self.price_pct
+            d["pinned_pct"] = self.pinned_pct
+        return d
+
+
+class ResultStore:
+    """保留最近 retention 条结果，统计覆盖全部结果
+
+    添加一条记录为 O(1)：deque(maxlen) 自动淘汰最旧记录，统计增量更新。
+
+    写入（采集线程的 add，以及 reset/clear/load_state）在写锁内进行，并在前后各递增一次
+    写序号（奇数表示正在写）；读取不加锁：读前读后序号相同且为偶数才采用结果，否则重试，
+    多次重试仍失败时才在写锁内读取。读取方拿到的总是某一时刻一致的记录和统计。
+    """
+
+    READ_RETRIES = 8
+
+    def __init__(self, retention=DEFAULT_RETENTION):
+        self.retention = retention
+        self._records = deque(maxlen=retention)
+        self._next_seq = 0
+        self.stats = {f: RunningStat() for f in STAT_FIELDS}
+        self._write_lock = threading.Lock()
+        self._write_seq = 0
+
+    def _read(self, fn):
+        """无锁一致读：fn 期间没有写入时返回其结果"""
+        for _ in range(self.READ_RETRIES):
+            seq = self._write_seq
+            if seq & 1:
+                time.sleep(0)
+                continue
+            try:
+                out = fn()
+            except Exception:  # 读到写了一半的状态（如 deque mutated during iteration），重试
+                continue
+            if self._write_seq == seq:
+                return out
+        with self._write_lock:
+            return fn()
+
+    def reset(self, retention=None):
+        with self._write_lock:
+            self._write_seq += 1
+            if retention:
+                self.retention = retention
+            self._records = deque(maxlen=self.retention)
+            self._next_seq = 0
+            self.stats = {f: RunningStat() for f in STAT_FIELDS}
+            self._write_seq += 1
+
+    def add(self, item):
+        price = _to_float(item.get("price"))
+        pinned = _to_float(item.get("pinned"))
+        reviews = _to_float(item.get("reviews"))
+        with self._write_lock:
+            self._write_seq += 1
+            rec = ResultRecord(self._next_seq, item.get("title") or "", price, pinned, reviews, item.get("url") or "",
+                               item.get("price_per_review"), item.get("price_pct"), item.get("pinned_pct"))
+            self._next_seq += 1
+            self._records.append(rec)
+            stats = self.stats
+            stats["price"].add(price)
+            stats["pinned"].add(pinned)
+            stats["reviews"].add(reviews)
+            self._write_seq += 1
+        return rec
+
+    def add_batch(self, items, price, pinned, reviews):
+        """整批添加（数值列已解析为 float），一次写入；返回第一条的序号"""
+        with self._write_lock:
+            self._write_seq += 1
+            first = self._next_seq
+            append = self._records.append
+            for seq, (item, p, n, r) in enumerate(zip(items, price, pinned, reviews), first):
+                append(ResultRecord(seq, item.get("title") or "", p, n, r, item.get("url") or "",
+                                    item.get("price_per_review"), item.get("price_pct"), item.get("pinned_pct")))
+            self._next_seq = first + len(items)
+            stats = self.stats
+            stats["price"].add_many(price)
+            stats["pinned"].add_many(pinned)
+            stats["reviews"].add_many(reviews)
+            self._write_seq += 1
+        return first
+
+    def clear(self):
+        """清空保留的记录，统计保持不变"""
+        with self._write_lock:
+            self._write_seq += 1
+            self._records.clear()
+            self._write_seq += 1
+
+    @property
+    def count(self):
+        """累计添加的结果数"""
+        return self._next_seq
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        """按最早在前遍历保留的记录（dict），遍历的是快照，采集中也可安全导出"""
+        for r in self._read(lambda: list(self._records)):
+            yield r.to_dict()
+
+    @property
+    def newest(self):
+        """最新保留记录的序号，没有记录时为 -1"""
+        return self._read(lambda: self._records[-1].seq if self._records else -1)
+
+    @property
+    def oldest(self):
+        """最早保留记录的序号（更早的已被淘汰）"""
+        return self._read(lambda: self._records[0].seq if self._records else self._next_seq)
+
+    def _page(self, limit, offset, cursor, since):
+        records = self._records
+        if not records:
+            return []
+        newest = records[-1].seq
+        if cursor is not None and int(cursor) < newest:
+            offset += newest - int(cursor)
+        out = []
+        # 直接按下标取（deque 下标按块跳转），不逐条跳过 offset 之前的记录
+        last = len(records) - 1 - offset
+        for i in range(last, max(-1, last - limit), -1):
+            r = records[i]
+            if r.seq <= since:
+                break
+            out.append(r.to_dict())
+        return out
+
+    def page(self, limit=50, offset=0, cursor=None, since=None):
+        """按最新在前分页
+
+        cursor 为游标：只返回 seq <= cursor 的记录，新结果不断追加时翻页位置不变；
+        since 只返回 seq > since 的记录。序号连续，游标直接换算成下标，按下标取记录，
+        不逐条跳过前面的记录（deque 下标访问按 64 条一块跳转，代价约为 min(下标, 总数-下标)/64）。
+        """
+        offset = max(0, int(offset or 0))
+        limit = max(0, int(limit or 0))
+        since = -1 if since is None else int(since)
+        return self._read(lambda: self._page(limit, offset, cursor, since))
+
+    def view(self, limit=50, offset=0, cursor=None, since=None):
+        """同一时刻的分页、序号范围和统计（getResults 用）"""
+        offset = max(0, int(offset or 0))
+        limit = max(0, int(limit or 0))
+        since = -1 if since is None else int(since)
+
+        def read():
+            records = self._records
+            return {
+                "items": self._page(limit, offset, cursor, since),
+                "total": len(records),
+                "count": self._next_seq,
+                "newest": records[-1].seq if records else -1,
+                "oldest": records[0].seq if records else self._next_seq,
+                "stats": self._summary(),
+            }
+        return self._read(read)
+
+    def _summary(self):
+        return {f: st.snapshot() for f, st in self.stats.items()}
+
+    def summary(self):
+        return self._read(self._summary)
+
+    def averages(self):
+        """价格和拼单数的均值（一致读取）"""
+        return self._read(lambda: {f: self.stats[f].avg for f in ("price", "pinned")})
+
+    def state(self):
+        """累计条数和统计（不含保留的记录），用于断点续采"""
+        return self._read(lambda: {"count": self._next_seq, "stats": {f: st.state() for f, st in self.stats.items()}})
+
+    def load_state(self, state):
+        """从断点恢复：序号和统计接着累计，保留的记录为空"""
+        with self._write_lock:
+            self._write_seq += 1
+            self._records.clear()
+            self._next_seq = state.get("count", 0)
+            for f, st_state in (state.get("stats") or {}).items():
+                if f in self.stats:
+                    self.stats[f].load_state(st_state)
+            self._write_seq += 1
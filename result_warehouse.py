@@ -0,0 +1,299 @@
+"""
+本地结果库 - 所有采集结果批量写入 SQLite（WAL），跨任务按条件查询和流式导出
+
+写入由独立线程批量提交，采集线程只负责入队；查询各自打开只读连接，
+WAL 模式下与写入互不阻塞。
+"""
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from item_pipeline import BoundedQueue
+from result_export import export_rows
+
+BATCH_SIZE = 500  # 每个事务最多写入的行数
+BATCH_DELAY = 1.0  # 未攒满时最长等待（秒）
+QUERY_COLUMNS = ["keyword", "title", "price", "pinned", "reviews", "url", "run_id", "collected_at"]
+SORT_FIELDS = ("price", "pinned", "reviews", "collected_at", "keyword", "id")
+MAX_PAGE = 1000
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS runs (
+        id TEXT PRIMARY KEY, keyword TEXT, params TEXT, outfile TEXT, status TEXT,
+        rows INTEGER DEFAULT 0, started_at REAL, finished_at REAL)""",
+    """CREATE TABLE IF NOT EXISTS items (
+        id INTEGER PRIMARY KEY, run_id TEXT NOT NULL, keyword TEXT, goods_id TEXT, title TEXT,
+        price REAL, pinned REAL, reviews INTEGER, url TEXT, collected_at REAL NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS idx_items_keyword ON items (keyword)",
+    "CREATE INDEX IF NOT EXISTS idx_items_price ON items (price)",
+    "CREATE INDEX IF NOT EXISTS idx_items_pinned ON items (pinned)",
+    "CREATE INDEX IF NOT EXISTS idx_items_reviews ON items (reviews)",
+    "CREATE INDEX IF NOT EXISTS idx_items_run ON items (run_id)",
+    "CREATE INDEX IF NOT EXISTS idx_items_collected ON items (collected_at)",
+)
+
+
+def _to_float(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _timestamp(value):
+    """时间条件：数字为 Unix 时间戳，字符串按 ISO 格式解析"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+def build_where(filters):
+    """把前端的过滤条件转为 WHERE 子句和参数，只接受已知字段"""
+    filters = filters or {}
+    clauses, args = [], []
+    keyword = filters.get("keyword")
+    if keyword:
+        keywords = keyword if isinstance(keyword, (list, tuple)) else [keyword]
+        clauses.append(f"keyword IN ({','.join('?' * len(keywords))})")
+        args.extend(keywords)
+    if filters.get("runId"):
+        clauses.append("run_id = ?")
+        args.append(filters["runId"])
+    for field in ("price", "pinned", "reviews"):
+        suffix = field.capitalize()
+        if filters.get("min" + suffix) is not None:
+            clauses.append(f"{field} >= ?")
+            args.append(float(filters["min" + suffix]))
+        if filters.get("max" + suffix) is not None:
+            clauses.append(f"{field} <= ?")
+            args.append(float(filters["max" + suffix]))
+    if filters.get("days"):
+        clauses.append("collected_at >= ?")
+        args.append(time.time() - float(filters["days"]) * 86400)
+    if filters.get("since"):
+        clauses.append("collected_at >= ?")
+        args.append(_timestamp(filters["since"]))
+    if filters.get("until"):
+        clauses.append("collected_at < ?")
+        args.append(_timestamp(filters["until"]))
+    if filters.get("title"):
+        clauses.append("title LIKE ?")
+        args.append(f"%{filters['title']}%")
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+
+def build_order(sort):
+    """sort 为字段名，前缀 - 表示降序；可传列表；默认最新在前"""
+    fields = sort if isinstance(sort, (list, tuple)) else [sort] if sort else []
+    parts = []
+    for field in fields:
+        desc = field.startswith("-")
+        name = field.lstrip("-+")
+        if name not in SORT_FIELDS:
+            raise ValueError(f"不支持的排序字段: {name}")
+        parts.append(f"{name} {'DESC' if desc else 'ASC'}")
+    return " ORDER BY " + ", ".join(parts or ["id DESC"])
+
+
+class ResultWarehouse(threading.Thread):
+    """结果库写入线程；add() 只入队，队列满时按 policy 处理（默认 block：阻塞采集线程而不是丢数据）"""
+
+    def __init__(self, path, maxsize=20000, policy="block"):
+        super().__init__(name="result-warehouse", daemon=True)
+        self.path = path
+        self._queue = BoundedQueue(maxsize, policy)
+        self._stop_event = threading.Event()
+        self.counters = {"rows_written": 0, "transactions": 0, "write_errors": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = self._connect()
+        db.execute("PRAGMA journal_mode=WAL")
+        for sql in SCHEMA:
+            db.execute(sql)
+        db.commit()
+        db.close()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    # 写入（任意线程调用，由写入线程执行）
+
+    def begin_run(self, run_id, keyword, params=None, outfile=None):
+        self._queue.put(("run", (run_id, keyword, json.dumps(params or {}, ensure_ascii=False, default=str),
+                                 outfile, "running", time.time())))
+
+    def add(self, run_id, keyword, item, policy=None):
+        """商品行入队；policy 缺省为队列的策略，运行记录等控制消息总是等待入队"""
+        self._queue.put(("item", (
+            run_id, keyword, str(item.get("goods_id") or "") or None, item.get("title") or "",
+            _to_float(item.get("price")), _to_float(item.get("pinned")), int(_to_float(item.get("reviews"))),
+            item.get("url") or "", time.time(),
+        )), policy)
+
+    def end_run(self, run_id, status, rows):
+        self._queue.put(("end", (status, rows, time.time(), run_id)))
+
+    def trim_run(self, run_id, after):
+        """删除某次采集在 after 时刻之后写入的行（从断点继续时丢弃断点之后的结果）"""
+        self._queue.put(("trim", (run_id, after)))
+
+    def sync(self, timeout=10.0):
+        """等待此前入队的记录全部提交，返回是否在 timeout 内完成"""
+        if not self.is_alive():
+            return self._queue.empty()
+        done = threading.Event()
+        self._queue.put(("sync", done))
+        return done.wait(timeout)
+
+    _insert_sql = ("INSERT INTO items (run_id, keyword, goods_id, title, price, pinned, reviews, url, collected_at) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+    def _write(self, db, batch):
+        """一批记录一个事务，按入队顺序执行（连续的商品行合并为一次 executemany）"""
+        items = []
+        synced = [args for kind, args in batch if kind == "sync"]
+        try:
+            with db:
+                for kind, args in batch:
+                    if kind == "sync":
+                        continue
+                    if kind == "item":
+                        items.append(args)
+                        continue
+                    if items:
+                        db.executemany(self._insert_sql, items)
+                        items = []
+                    if kind == "run":
+                        # 继续采集时保留原来的开始时间
+                        db.execute("INSERT INTO runs (id, keyword, params, outfile, status, started_at) "
+                                   "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                                   "status = excluded.status, finished_at = NULL", args)
+                    elif kind == "trim":
+                        db.execute("DELETE FROM items WHERE run_id = ? AND collected_at > ?", args)
+                    else:
+                        db.execute("UPDATE runs SET status = ?, rows = ?, finished_at = ? WHERE id = ?", args)
+                if items:
+                    db.executemany(self._insert_sql, items)
+            self.counters["rows_written"] += sum(1 for kind, _ in batch if kind == "item")
+            self.counters["transactions"] += 1
+        except Exception as e:
+            self.counters["write_errors"] += 1
+            print(f"写入结果库失败: {e}", file=sys.stderr)
+        for done in synced:
+            done.set()
+
+    def run(self):
+        db = self._connect()
+        try:
+            while True:
+                stopping = self._stop_event.is_set()
+                batch = []
+                deadline = time.monotonic() + BATCH_DELAY
+                while len(batch) < BATCH_SIZE:
+                    timeout = deadline - time.monotonic()
+                    try:
+                        if stopping or timeout <= 0:
+                            batch.append(self._queue.get_nowait())
+                        else:
+                            batch.append(self._queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                    if batch[-1][0] == "sync":
+                        break  # 有人在等待，立即提交
+                if batch:
+                    self._write(db, batch)
+                if stopping and self._queue.empty():
+                    return
+        finally:
+            db.close()
+
+    def stop(self, timeout=5.0):
+        """写完队列中剩余的行后退出"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def stats(self):
+        s = dict(self.counters)
+        s["queue_depth"] = self._queue.qsize()
+        s["queue"] = self._queue.stats()
+        s["path"] = self.path
+        return s
+
+    # 查询（调用方线程，独立只读连接）
+
+    def _reader(self):
+        db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def query(self, filters=None, sort=None, limit=50, offset=0):
+        where, args = build_where(filters)
+        order = build_order(sort)
+        limit = max(1, min(int(limit), MAX_PAGE))
+        db = self._reader()
+        try:
+            total = db.execute("SELECT COUNT(*) FROM items" + where, args).fetchone()[0]
+            rows = db.execute(f"SELECT id, {', '.join(QUERY_COLUMNS)} FROM items{where}{order} LIMIT ? OFFSET ?",
+                              args + [limit, int(offset)]).fetchall()
+        finally:
+            db.close()
+        return {"items": [dict(r) for r in rows], "total": total, "limit": limit, "offset": int(offset)}
+
+    def iter_query(self, filters=None, sort=None, chunk=1000):
+        """逐块读取查询结果，内存只保留一块"""
+        where, args = build_where(filters)
+        db = self._reader()
+        try:
+            cur = db.execute(f"SELECT {', '.join(QUERY_COLUMNS)} FROM items{where}{build_order(sort)}", args)
+            while True:
+                rows = cur.fetchmany(chunk)
+                if not rows:
+                    return
+                for r in rows:
+                    item = dict(r)
+                    item["collected_at"] = datetime.fromtimestamp(item["collected_at"]).isoformat(timespec="seconds")
+                    yield item
+        finally:
+            db.close()
+
+    def aggregate(self, filters_list):
+        """每组过滤条件的条数、价格/拼单数/评价数均值和价格范围（同一个只读连接依次执行）"""
+        db = self._reader()
+        try:
+            out = []
+            for filters in filters_list:
+                where, args = build_where(filters)
+                count, price, pinned, reviews, lo, hi = db.execute(
+                    "SELECT COUNT(*), AVG(price), AVG(pinned), AVG(reviews), MIN(price), MAX(price) FROM items" + where,
+                    args).fetchone()
+                out.append({
+                    "count": count,
+                    "avg_price": round(price or 0.0, 2),
+                    "avg_pinned": round(pinned or 0.0, 1),
+                    "avg_reviews": round(reviews or 0.0, 1),
+                    "min_price": lo,
+                    "max_price": hi,
+                })
+        finally:
+            db.close()
+        return out
+
+    def export(self, path, fmt=None, filters=None, sort=None, columns=QUERY_COLUMNS):
+        """查询结果分块流式写入文件（格式见 result_export.EXPORT_FORMATS），返回行数"""
+        return export_rows(self.iter_query(filters, sort), path, fmt, columns)
+
+    def runs(self, limit=50):
+        db = self._reader()
+        try:
+            rows = db.execute("SELECT id, keyword, outfile, status, rows, started_at, finished_at FROM runs "
+                              "ORDER BY started_at DESC LIMIT ?", (int(limit),)).fetchall()
+        finally:
+            db.close()
+        return [dict(r) for r in rows]
@@ -0,0 +1,1075 @@
+"""
+采集服务 - 与界面无关的状态、任务、结果文件和许可证逻辑
+
+WebView 桥接（enhanced_webview.EnhancedBridge）和无界面运行（headless）共用。
+"""
+import json
+import sys
+import threading
+import os
+import time
+import uuid
+from datetime import datetime
+from functools import partial
+from license_client import get_machine_hash, activate as lic_activate, start_heartbeat, stop_heartbeat, end_session, load_license_state, save_license_state, validate_cached, get_client as get_license_client
+from license_client import AsyncLicenseClient, validate_cached_async, set_timer_factory, set_session_listener, READ_TIMEOUT
+from ui_dispatcher import UIDispatcher, AsyncUIDispatcher
+from async_core import AsyncCore, ASYNC_MODE
+from result_sink import recover_dir, SINKS, COLUMNS, discard_checkpoint as discard_sink_checkpoint
+from result_export import export_rows, export_path, normalize_format, ExportUnavailable
+from result_store import ResultStore, DEFAULT_RETENTION
+from app_state import AppState
+from job_scheduler import JobScheduler, ScrapeJob, make_output_path, ENGINES, DEFAULT_ENGINE, FINAL_STATUSES
+from metrics import metrics, MetricsDumper
+from result_warehouse import ResultWarehouse
+from job_checkpoint import checkpoint_path, read_checkpoint, remove_checkpoint, list_checkpoints
+from dedup_index import DedupIndex, DedupFilter, scope_for, DEDUP_SCOPES, DEFAULT_SCOPE as DEFAULT_DEDUP
+from batch_filter import BatchFilter, DEFAULT_BATCH_SIZE
+from item_pipeline import parse_policies
+from config_store import get_config, CONFIG_DIR
+from param_sweep import parse_grid, loosest, evaluate as evaluate_sweep
+
+CHECKPOINT_DIR = os.path.join(CONFIG_DIR, "checkpoints")
+
+# pdd_scraper 依赖较重，启动时在后台线程导入
+_scraper = None
+_scraper_lock = threading.Lock()
+
+def load_scraper():
+    """导入采集模块（只导入一次）"""
+    global _scraper
+    with _scraper_lock:
+        if _scraper is None:
+            import pdd_scraper
+            _scraper = pdd_scraper
+        return _scraper
+
+def run_scraper(*args, **kwargs):
+    """延迟导入的 pdd_scraper.run_scraper"""
+    return load_scraper().run_scraper(*args, **kwargs)
+
+def scraper_defaults():
+    m = load_scraper()
+    return {
+        "keyword": m.DEFAULT_KEYWORD,
+        "price": m.DEFAULT_PRICE_THRESHOLD,
+        "pinned": m.DEFAULT_PINNED_THRESHOLD,
+        "reviews": m.DEFAULT_REVIEWS_THRESHOLD,
+    }
+
+def read_export_dir():
+    """配置中保存的导出目录（目录已不存在时为空）"""
+    export_dir = get_config().get("export_dir")
+    return export_dir if export_dir and os.path.exists(export_dir) else ""
+
+# 记入 last_params 的采集参数（下次启动时预填）
+MAX_RETENTION = 1000000  # 界面结果保留条数上限
+LAST_PARAM_KEYS = ("keyword", "price", "pinned", "reviews", "format", "engine", "dedup", "batchSize")
+# job_history 每条保留的字段
+HISTORY_FIELDS = ("id", "status", "keyword", "price", "pinned", "reviews", "engine", "outfile", "rows", "skipped",
+                  "rejected", "avg_price", "avg_pinned", "run_time", "error", "created_at", "visited", "collected")
+
+class ScraperService:
+    """采集服务：状态、任务、结果与许可证逻辑，不依赖 webview
+
+    emit(callback_name, payload) 由分发线程调用，负责把事件送到前端
+    （WebView 中为 evaluate_js，无界面模式下为 NDJSON 输出）。
+    
+    构造时不做磁盘/网络/重模块导入，这些工作在后台预热线程中完成，
+    完成后 state["ready"] 变为 True。
+
+    async_mode（默认取 PDD_ASYNC）为 True 时许可证请求、心跳、租约续期和前端分发
+    由一个事件循环（async_core.AsyncCore）调度，采集在其线程池中运行；activate/validate/
+    endSession 立即返回 PENDING 和 request_id，结果通过 __onLicense 事件送到前端。
+    """
+    
+    def __init__(self, emit, retention=DEFAULT_RETENTION, max_jobs=None, started_at=None, async_mode=None):
+        self.started_at = started_at or time.perf_counter()
+        self.startup = {}
+        self._startup_lock = threading.Lock()
+        self._ready = threading.Event()
+        self.defaults = None
+        self.session = {"license_id": None, "token": None}
+        self.hb_thread = None
+        # 租约续期换发的会话令牌（心跳已改用新令牌）
+        set_session_listener(self._on_session_renewed)
+        self.stop_event = threading.Event()
+        self.scraping_thread = None
+        self.job = None
+        self._paused = False  # 界面上的任务因心跳失败被停止，结束后保持 paused
+        self.metrics_dumper = None
+        self.profiler = None
+        self._profiled_job = None
+        self._dedup_index = None
+        self._db_lock = threading.Lock()
+        self._warehouse = None
+        self.config = get_config()
+        self.sweeps = {}  # 任务ID -> 参数扫描的评估结果
+        
+        # 多关键词任务队列（与界面上的单次采集相互独立）
+        self.jobs = JobScheduler(run_scraper, max_workers=max_jobs)
+        
+        # 异步核心（可选）：许可证、心跳、续期和分发共用一个事件循环
+        self.core = None
+        self.license_async = None
+        if ASYNC_MODE if async_mode is None else async_mode:
+            self.core = AsyncCore().start()
+            self.license_async = AsyncLicenseClient(self.core)
+            set_timer_factory(self.core.call_later)
+        
+        # 前端事件分发（批量合并 evaluate_js 调用）
+        if self.core is not None:
+            self.dispatcher = AsyncUIDispatcher(emit, self.core)
+        else:
+            self.dispatcher = UIDispatcher(emit)
+        self.dispatcher.start()
+        
+        # 应用状态（带版本号，getState 可按版本增量读取）
+        self.state = AppState({
+            "keyword": "",
+            "price": None,
+            "pinned": None,
+            "reviews": None,
+            "exportDir": "",
+            "outfile": "",
+            "status": "idle",
+            "visited": 0,
+            "collected": 0,
+            "filtered": 0,
+            "list_count": 0,
+            "batch_progress": "0/0",
+            "avg_price": 0.0,
+            "avg_pinned": 0.0,
+            "skipped": 0,
+            "rejected": 0,
+            "throughput": None,
+            "start_time": None,
+            "machine_hash": "",
+            "is_activated": False,
+            "session_active": False,
+            "ready": False,
+            "startup": {},
+            "profile": None,
+            "sweep": None,
+            "pipeline": None,
+        })
+        
+        # 采集结果（定长环形缓冲 + 增量统计）
+        self.results = ResultStore(retention)
+        
+        # 后台预热：机器码、配置、许可证状态、采集模块和 HTTP 连接栈
+        if self.core is not None:
+            self.core.spawn(self._warm_up)
+        else:
+            threading.Thread(target=self._warm_up, name="warm-up", daemon=True).start()
+    
+    @property
+    def mac(self):
+        return get_machine_hash()
+    
+    def mark_startup(self, name):
+        """记录启动阶段耗时（毫秒，从进程启动计），页面加载和预热都完成即为可交互"""
+        with self._startup_lock:
+            self.startup[name] = round((time.perf_counter() - self.started_at) * 1000, 1)
+            if "loaded" in self.startup and "ready" in self.startup and "interactive" not in self.startup:
+                self.startup["interactive"] = max(self.startup["loaded"], self.startup["ready"])
+            self.state["startup"] = dict(self.startup)
+    
+    def _warm_up(self):
+        """依次预热配置、采集器默认值和许可证 HTTP 会话；某一步失败时记到 stderr 并继续后面的步骤"""
+        for step, fn in (("config", self._warm_config), ("scraper", self._warm_scraper), ("http", self._warm_http)):
+            try:
+                fn()
+            except Exception as e:
+                print(f"启动预热失败（{step}）: {e}", file=sys.stderr)
+            self.mark_startup(step)
+        self._ready.set()
+        self.state["ready"] = True
+        self.mark_startup("ready")
+    
+    def _warm_config(self):
+        self.state["machine_hash"] = self.mac
+        self.state["is_activated"] = bool(load_license_state().get("license_key"))
+        if not self.state["exportDir"]:
+            self.state["exportDir"] = read_export_dir()
+        last = self.config.get("last_params")
+        self.state.update({k: last[k] for k in ("keyword", "price", "pinned", "reviews")
+                           if last.get(k) is not None and not self.state[k]})
+    
+    def _warm_scraper(self):
+        self.defaults = scraper_defaults()
+        for key, value in self.defaults.items():
+            if not self.state[key]:
+                self.state[key] = value
+    
+    def _warm_http(self):
+        if self.license_async is None or not self.license_async.http:
+            get_license_client().session
+    
+    def _wait_ready(self, timeout=30):
+        self._ready.wait(timeout)
+        if self.defaults is None:
+            self.defaults = scraper_defaults()
+        return self.defaults
+    
+    def getMachineHash(self):
+        """获取机器码"""
+        return self.mac
+    
+    def getSystemInfo(self):
+        """获取系统信息"""
+        import platform
+        return {
+            "platform": platform.system(),
+            "version": platform.version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "python_version": platform.python_version()
+        }
+    
+    def setExportDir(self, path):
+        """设置并保存导出目录（后台写盘）"""
+        try:
+            self.state["exportDir"] = path
+            self.config.set("export_dir", path)
+            return {"status": "OK", "path": path}
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    def _pending(self, action, coro, wait=False):
+        """异步模式：在事件循环中执行许可证协程，立即返回 PENDING，完成后发送 __onLicense
+
+        wait=True 时（命令行）等待结果并直接返回。
+        """
+        request_id = uuid.uuid4().hex[:8]
+        future = self.core.submit(coro)
+        if wait:
+            return future.result()
+        
+        def done(f):
+            try:
+                result = f.result()
+            except BaseException as e:
+                result = {"status": "ERROR", "message": str(e)}
+            # 在线程池中入队，分发队列满时不阻塞事件循环
+            self.core.executor.submit(self.dispatcher.push_event, "__onLicense",
+                                      {"request_id": request_id, "action": action, "result": result})
+        
+        future.add_done_callback(done)
+        return {"status": "PENDING", "request_id": request_id, "action": action}
+    
+    def activate(self, code, wait=False):
+        """激活许可证"""
+        if self.core is not None:
+            return self._pending("activate", self._activate_async(code), wait)
+        try:
+            return self._on_activated(code, lic_activate(code, self.mac))
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    async def _activate_async(self, code):
+        try:
+            return self._on_activated(code, await self.license_async.activate(code, self.mac))
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    def _on_activated(self, code, result):
+        if result.get("status") == "OK":
+            save_license_state({"license_key": code, "license_id": result.get("license_id")})
+            self.session["license_id"] = result.get("license_id")
+            self.state["is_activated"] = True
+        return result
+    
+    def validate(self, wait=False):
+        """验证许可证"""
+        key = load_license_state().get("license_key")
+        if not key:
+            return {"status": "NO_KEY"}
+        if self.core is not None:
+            return self._pending("validate", self._validate_async(key), wait)
+        try:
+            return self._on_validated(validate_cached(key, self.mac, force=True))
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    async def _validate_async(self, key):
+        try:
+            return self._on_validated(await validate_cached_async(self.license_async, key, self.mac, force=True))
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    def _on_validated(self, result):
+        if result.get("status") == "OK":
+            self.session["license_id"] = result.get("license_id")
+            self.session["token"] = result.get("session_token")
+            self.state["session_active"] = True
+            
+            # 启动心跳（会替换掉旧会话的心跳）；异步模式下为事件循环中的任务
+            self.hb_thread = start_heartbeat(
+                result.get("license_id"), 
+                self.mac, 
+                result.get("session_token"), 
+                interval=30,
+                on_failure=self._on_heartbeat_failure,
+                client=self.license_async
+            )
+        return result
+    
+    def endSession(self, wait=False):
+        """结束会话"""
+        if not (self.session.get("license_id") and self.session.get("token")):
+            return {"status": "NO_SESSION"}
+        if self.core is not None:
+            return self._pending("endSession", self._end_session_async(), wait)
+        try:
+            return self._on_session_ended(end_session(self.session["license_id"], self.mac, self.session["token"]))
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    async def _end_session_async(self):
+        try:
+            return self._on_session_ended(
+                await self.license_async.end_session(self.session["license_id"], self.mac, self.session["token"]))
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    def _on_session_ended(self, result):
+        if result.get("status") == "OK":
+            stop_heartbeat()
+            self.hb_thread = None
+            self.session["token"] = None
+            self.state["session_active"] = False
+        return result
+    
+    def _on_session_renewed(self, license_id, token):
+        if self.session.get("license_id") == license_id:
+            self.session["token"] = token
+    
+    def _on_heartbeat_failure(self, failures, error):
+        """心跳连续失败：在服务端回收会话前暂停界面上的采集，队列中未结束的任务一并停止
+        （运行中的留下断点，可用 resumeScrape 继续）"""
+        print(f"心跳连续失败 {failures} 次: {error}", file=sys.stderr)
+        self.state["session_active"] = False
+        self.jobs.stop_all()
+        if self.state["status"] == "running":
+            self._paused = True
+            self.stop_event.set()
+            self.state["status"] = "paused"
+            self.dispatcher.push_status("paused")
+    
+    def _parse_params(self, params):
+        """解析采集参数，缺省值取当前状态/默认阈值"""
+        defaults = self._wait_ready()
+        parsed = {
+            "keyword": (params.get("keyword") or defaults["keyword"]).strip(),
+            "price": float(params.get("price") or defaults["price"]),
+            "pinned": float(params.get("pinned") or defaults["pinned"]),
+            "reviews": int(params.get("reviews") or defaults["reviews"]),
+            "exportDir": params.get("exportDir") or self.state.get("exportDir") or "",
+            "format": (params.get("format") or "xlsx").lower(),
+            "retention": self._parse_retention(params.get("retention")),
+            "engine": (params.get("engine") or DEFAULT_ENGINE).lower(),
+            "dedup": (params.get("dedup") or DEFAULT_DEDUP).lower(),
+            "dedupTtl": float(params["dedupTtl"]) if params.get("dedupTtl") else None,
+            "warehouse": params.get("warehouse", os.getenv("PDD_WAREHOUSE", "1") != "0") not in (False, 0, "0"),
+            "batchSize": int(params["batchSize"]) if params.get("batchSize") is not None else DEFAULT_BATCH_SIZE,
+            "overflow": parse_policies(params.get("overflow")),
+        }
+        if parsed["format"] not in SINKS:
+            raise ValueError(f"不支持的导出格式: {parsed['format']}")
+        if parsed["engine"] not in ENGINES:
+            raise ValueError(f"不支持的采集引擎: {parsed['engine']}")
+        if parsed["dedup"] not in DEDUP_SCOPES:
+            raise ValueError(f"不支持的去重范围: {parsed['dedup']}")
+        return parsed
+    
+    @staticmethod
+    def _parse_retention(value):
+        """保留条数：缺省（None）时沿用当前值，否则限制在 1 到 MAX_RETENTION 之间"""
+        if value is None or value == "":
+            return None
+        return max(1, min(MAX_RETENTION, int(value)))
+    
+    def _get_dedup_index(self):
+        """首次使用时打开去重索引（配置目录下 dedup.sqlite3）"""
+        with self._db_lock:
+            if self._dedup_index is None:
+                self._dedup_index = DedupIndex(os.path.join(CONFIG_DIR, "dedup.sqlite3"))
+            return self._dedup_index
+    
+    def _get_warehouse(self):
+        """首次使用时打开本地结果库（配置目录下 results.sqlite3）并启动写入线程"""
+        with self._db_lock:
+            if self._warehouse is None:
+                self._warehouse = ResultWarehouse(os.path.join(CONFIG_DIR, "results.sqlite3"))
+                self._warehouse.start()
+            return self._warehouse
+    
+    def _dedup_filter(self, parsed):
+        if parsed["dedup"] == "off":
+            return None
+        return DedupFilter(self._get_dedup_index(), scope_for(parsed["dedup"], parsed["keyword"]), parsed["dedupTtl"])
+    
+    @staticmethod
+    def _batch_filter(parsed):
+        """batchSize 为 0 时逐条处理"""
+        size = parsed.get("batchSize", DEFAULT_BATCH_SIZE)
+        if not size or size <= 0:
+            return None
+        return BatchFilter(parsed["price"], parsed["pinned"], parsed["reviews"], size)
+    
+    def _check_license(self):
+        """验证许可证，通过返回 None，否则返回错误结果"""
+        st = load_license_state()
+        if not st.get("license_key"):
+            return {"status": "NO_KEY", "message": "未找到激活码"}
+        
+        try:
+            if self.core is not None:
+                # 租约有效时立即返回；否则通过事件循环验证
+                result = self.core.submit(validate_cached_async(self.license_async, st["license_key"], self.mac)).result()
+            else:
+                result = validate_cached(st["license_key"], self.mac)
+        except Exception as e:
+            return {"status": "ERROR", "message": f"许可证验证失败: {str(e)}"}
+        
+        if result.get("status") != "OK":
+            return result
+        return None
+    
+    def startScrape(self, params):
+        """开始采集"""
+        try:
+            # 验证参数
+            parsed = self._parse_params(params)
+        except Exception as e:
+            return {"status": "ERROR", "message": f"参数错误: {str(e)}"}
+        return self._start(parsed)
+    
+    def startSweep(self, params):
+        """参数扫描：按 params.grid 中最宽松的阈值采集一次，结束后离线评估每组阈值
+
+        params 与 startScrape 相同，另加 grid（{price, pinned, reviews} 各为取值列表）、
+        sweepExport（是否每组导出文件，默认是）和 sweepFormat（默认 csv）。结果通过
+        __onSweep 事件发送，也可用 getSweep(job_id) 读取。
+        """
+        try:
+            parsed = self._parse_params(params)
+            grid = parse_grid(params.get("grid") or {})
+            fmt = normalize_format(params.get("sweepFormat") or "csv")
+        except Exception as e:
+            return {"status": "ERROR", "message": f"参数错误: {str(e)}"}
+        parsed.update(loosest(grid))
+        # 候选商品全部保存在本地结果库中供离线评估：不跳过之前采集过的商品（也不写入去重索引），
+        # 结果库队列满时等待而不丢行
+        parsed["warehouse"] = True
+        parsed["dedup"] = "off"
+        parsed["overflow"] = dict(parsed["overflow"], warehouse="block")
+        parsed["sweep"] = {"grid": grid, "export": params.get("sweepExport", True) not in (False, 0, "0"), "format": fmt}
+        r = self._start(parsed)
+        if r.get("status") == "OK":
+            r["crawl"] = {k: parsed[k] for k in ("price", "pinned", "reviews")}
+            r["combinations"] = len(grid["price"]) * len(grid["pinned"]) * len(grid["reviews"])
+        return r
+    
+    def _start(self, parsed):
+        self.state.update({k: parsed[k] for k in ("keyword", "price", "pinned", "reviews", "exportDir")})
+        if not parsed["exportDir"]:
+            return {"status": "NO_EXPORT_DIR", "message": "请选择导出目录"}
+        
+        # 验证许可证
+        error = self._check_license()
+        if error:
+            return error
+        
+        # 检查是否已在运行
+        if self.scraping_thread and self.scraping_thread.is_alive():
+            return {"status": "ALREADY_RUNNING", "message": "采集已在进行中"}
+        
+        # 重置状态
+        self.results.reset(parsed["retention"])
+        
+        try:
+            dedup = self._dedup_filter(parsed)
+            warehouse = self._get_warehouse() if parsed["warehouse"] else None
+        except Exception as e:
+            return {"status": "ERROR", "message": f"打开本地数据库失败: {str(e)}"}
+        
+        # 设置输出文件路径，结果边采集边写入
+        out_path = make_output_path(parsed["exportDir"], parsed["format"])
+        job_id = self.jobs.new_job_id()
+        job = ScrapeJob(
+            job_id,
+            parsed,
+            out_path,
+            results=self.results,
+            on_item=self._on_job_item,
+            on_progress=self._on_job_progress,
+            on_status=self._on_job_status,
+            dedup=dedup,
+            warehouse=warehouse,
+            checkpoint_path=checkpoint_path(CHECKPOINT_DIR, job_id),
+            batch=self._batch_filter(parsed)
+        )
+        error = self._launch(job)
+        if error:
+            return error
+        # 只记住成功开始的参数；参数扫描的阈值和去重/溢出设置是临时改写的，不记入
+        if not parsed.get("sweep"):
+            self.config.set("last_params", {k: parsed[k] for k in LAST_PARAM_KEYS})
+        return {"status": "OK", "message": "采集已开始", "job_id": job_id}
+    
+    def _launch(self, job, start_time=None):
+        """打开结果文件并在采集线程中运行界面上的任务，失败时返回错误结果"""
+        try:
+            job.open_sink()
+        except Exception as e:
+            return {"status": "ERROR", "message": f"创建结果文件失败: {str(e)}"}
+        
+        self.job = job
+        self.stop_event = job.stop_event
+        self._paused = False
+        self._attach_profiler(job)
+        self.dispatcher.progress.reset()
+        self.dispatcher.progress.enrich = partial(self._progress_fields, job)
+        self.state.update({k: job.params[k] for k in ("keyword", "price", "pinned", "reviews", "exportDir")})
+        self.state.update({
+            "status": "running",
+            "start_time": start_time or datetime.now().isoformat(),
+            "outfile": job.out_path,
+            **job.progress,
+            **self._averages(job),
+            "throughput": None,
+        })
+        
+        # 启动采集线程（异步模式下在核心线程池中运行）
+        if self.core is not None:
+            self.scraping_thread = self.core.spawn(job.run, self.jobs.runner_for(job))
+        else:
+            self.scraping_thread = threading.Thread(target=job.run, args=(self.jobs.runner_for(job),), daemon=True)
+            self.scraping_thread.start()
+        return None
+    
+    def resumeScrape(self, job_id):
+        """从断点继续一次停止或中断的采集：接着写同一个结果文件，进度和统计继续累计
+
+        采集器在进度中提供 cursor 时从该游标继续，否则从头采集（建议同时开启去重）。
+        断点之后、中断之前写入本地结果库和去重索引的记录会先被丢弃。
+        """
+        path = checkpoint_path(CHECKPOINT_DIR, job_id)
+        ckpt = read_checkpoint(path)
+        if ckpt is None:
+            return {"status": "NOT_FOUND", "message": "没有找到该任务的断点"}
+        
+        error = self._check_license()
+        if error:
+            return error
+        
+        if self.scraping_thread and self.scraping_thread.is_alive():
+            return {"status": "ALREADY_RUNNING", "message": "采集已在进行中"}
+        queued = self.jobs.get(job_id)
+        if queued is not None and queued.status in ("queued", "running"):
+            return {"status": "ALREADY_RUNNING", "message": "该任务仍在队列中运行"}
+        
+        parsed = ckpt["params"]
+        self.results.reset(parsed.get("retention"))
+        try:
+            dedup = self._dedup_filter(parsed)
+            warehouse = self._get_warehouse() if parsed.get("warehouse") else None
+        except Exception as e:
+            return {"status": "ERROR", "message": f"打开本地数据库失败: {str(e)}"}
+        if dedup is not None:
+            dedup.index.forget_since(dedup.scope, ckpt["saved_at"])
+        if warehouse is not None:
+            warehouse.trim_run(job_id, ckpt["saved_at"])
+        
+        job = ScrapeJob(
+            job_id,
+            parsed,
+            ckpt["out_path"],
+            results=self.results,
+            on_item=self._on_job_item,
+            on_progress=self._on_job_progress,
+            on_status=self._on_job_status,
+            dedup=dedup,
+            warehouse=warehouse,
+            checkpoint_path=path,
+            resume=ckpt,
+            batch=self._batch_filter(parsed)
+        )
+        error = self._launch(job, datetime.fromtimestamp(job.created_at).isoformat())
+        if error:
+            return error
+        return {"status": "OK", "message": "采集已继续", "job_id": job_id, "rows": job.results.count,
+                "cursor": job.cursor}
+    
+    def listCheckpoints(self):
+        """可继续的采集（停止、出错或中断时留下的断点），最近的在前"""
+        try:
+            return {"status": "OK", "checkpoints": list_checkpoints(CHECKPOINT_DIR)}
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    def discardCheckpoint(self, job_id):
+        """放弃继续：删除断点以及结果文件的追加断点，已写出的结果文件保留"""
+        path = checkpoint_path(CHECKPOINT_DIR, job_id)
+        ckpt = read_checkpoint(path)
+        if ckpt is None:
+            return {"status": "NOT_FOUND", "message": "没有找到该任务的断点"}
+        if self.job is not None and self.job.id == job_id and self.job.status == "running":
+            return {"status": "BUSY", "message": "该任务正在运行"}
+        remove_checkpoint(path)
+        discard_sink_checkpoint(ckpt["out_path"])
+        return {"status": "OK"}
+    
+    def _on_job_item(self, job, item):
+        """处理单个商品项（结果和文件已由任务写入，均值随进度发送时更新）"""
+        # 交给分发线程批量发送到前端（item 已带结果序号，前端按序号分页补齐）
+        self.dispatcher.push_item(item, job.policies["ui"])
+    
+    def _on_job_progress(self, job, info):
+        """处理进度更新：只覆盖最新一份，由分发线程按自适应频率发送"""
+        self.state.update(job.progress)
+        self.dispatcher.push_progress(info)
+    
+    @staticmethod
+    def _averages(job):
+        avg = job.results.averages()
+        return {"avg_price": avg["price"], "avg_pinned": avg["pinned"], "skipped": job.skipped, "rejected": job.rejected}
+    
+    def _update_averages(self, job):
+        self.state.update(self._averages(job))
+    
+    def _progress_fields(self, job, info):
+        """分发线程发送进度前补充运行时间、均值和结果文件，吞吐指标同时写入状态"""
+        self._update_averages(job)
+        info["run_time"] = int(job.run_time)
+        info["avg_price"] = self.state["avg_price"]
+        info["avg_pinned"] = self.state["avg_pinned"]
+        info["outfile"] = job.out_path
+        info["skipped"] = self.state["skipped"]
+        info["rejected"] = self.state["rejected"]
+        self.state["throughput"] = {k: info[k] for k in ("items_per_s", "visited_per_s", "filter_ratio", "eta", "progress_hz")}
+        self.state["pipeline"] = self._pipeline_stats(job)
+        return info
+    
+    def _pipeline_stats(self, job):
+        """界面任务各阶段的队列深度、滞后和丢弃数（见 item_pipeline）"""
+        s = job.pipeline_stats()
+        s["ui"] = self.dispatcher.stats()["queue"]
+        return s
+    
+    def setProgressRate(self, max_hz):
+        """设置进度推送的最高频率（次/秒），前端调用变慢时会自动降低"""
+        try:
+            self.dispatcher.progress.set_rate(float(max_hz))
+            return {"status": "OK", "max_hz": self.dispatcher.progress.max_hz}
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    def _record_history(self, job, status):
+        """已结束的任务写入配置中的 job_history"""
+        if status in FINAL_STATUSES:
+            info = job.to_dict()
+            entry = {k: info.get(k) for k in HISTORY_FIELDS}
+            entry["finished_at"] = job.finished_at
+            self.config.append("job_history", entry)
+    
+    def _on_queued_status(self, job, status):
+        self._record_history(job, status)
+    
+    def getHistory(self, limit=50):
+        """已结束任务的摘要（界面上的采集和队列任务），最近的在前"""
+        history = self.config.get("job_history")
+        return {"status": "OK", "jobs": history[::-1][:max(0, int(limit))]}
+    
+    def _run_sweep(self, job):
+        """扫描采集结束后等结果库写完，评估网格，汇总写入导出目录下 pdd_sweep_<任务ID>.json"""
+        spec = job.params["sweep"]
+        self.state["sweep"] = {"job_id": job.id, "status": "evaluating"}
+        try:
+            job.warehouse.sync()
+            export_dir = job.params["exportDir"]
+            result = evaluate_sweep(job.warehouse, job.id, spec["grid"], export_dir if spec["export"] else None,
+                                    spec["format"])
+            result["status"] = "OK"
+            result["summary_path"] = os.path.join(export_dir, f"pdd_sweep_{job.id}.json")
+            with open(result["summary_path"], "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=1)
+        except Exception as e:
+            print(f"参数扫描评估失败: {e}", file=sys.stderr)
+            result = {"status": "ERROR", "run_id": job.id, "message": str(e)}
+        self.sweeps[job.id] = result
+        self.state["sweep"] = {"job_id": job.id, "status": result["status"],
+                               "combinations": len(result.get("combinations") or [])}
+        self.dispatcher.push_event("__onSweep", result)
+    
+    def getSweep(self, job_id=None):
+        """参数扫描的评估结果（默认最近一次）"""
+        if job_id is None:
+            job_id = (self.state.get("sweep") or {}).get("job_id")
+        result = self.sweeps.get(job_id)
+        if result is None:
+            return {"status": "NOT_FOUND", "message": "没有该任务的扫描结果"}
+        return result
+    
+    def evaluateSweep(self, run_id, grid, export=False, format="csv"):
+        """对结果库中已有的一次采集重新评估一组阈值网格，不重新采集
+
+        只有采集时的阈值不比网格更严时结果才完整（扫描采集满足这一点）。
+        """
+        try:
+            warehouse = self._get_warehouse()
+            warehouse.sync()
+            export_dir = self.state.get("exportDir")
+            if export and (not export_dir or not os.path.isdir(export_dir)):
+                return {"status": "NO_EXPORT_DIR", "message": "请选择导出目录"}
+            result = evaluate_sweep(warehouse, run_id, grid, export_dir if export else None, format)
+            return {"status": "OK", **result}
+        except ValueError as e:
+            return {"status": "ERROR", "message": f"参数错误: {str(e)}"}
+        except ExportUnavailable as e:
+            return {"status": "UNSUPPORTED", "message": str(e)}
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    def _on_job_status(self, job, status):
+        """任务结束后回到待机状态；出错或因心跳失败暂停时保持 error / paused"""
+        if status == "running":
+            return
+        self._record_history(job, status)
+        if job.params.get("sweep") and status in ("done", "stopped"):
+            self._run_sweep(job)
+        self._update_averages(job)
+        self.state["pipeline"] = self._pipeline_stats(job)
+        if self._profiled_job is job:
+            self._finish_profiler()
+        final = "error" if status == "error" else "paused" if self._paused else "idle"
+        self._paused = False
+        self.state["status"] = final
+        self.dispatcher.push_status(final)
+    
+    def stopScrape(self):
+        """停止采集"""
+        if self.state["status"] != "running":
+            return {"status": "NOT_RUNNING", "message": "采集未在运行"}
+        
+        self.stop_event.set()
+        self.state["status"] = "stopped"
+        self.dispatcher.push_status("stopped")
+        
+        return {"status": "OK", "message": "采集已停止"}
+    
+    def getState(self, since_version=None, include=None):
+        """获取当前状态；传入上次返回的 version 时只返回之后变化的字段
+
+        分发统计（dispatch）、结果统计（stats）和许可证接口延迟（license）默认不返回，需要时通过 include 指定；
+        pipeline 字段随进度更新，include 中指定 pipeline 时返回当前值。
+        """
+        s = self.state.snapshot(since_version)
+        s["now"] = datetime.now().isoformat()
+        include = include or ()
+        if "dispatch" in include:
+            s["dispatch"] = self.dispatcher.stats()
+        if "stats" in include:
+            s["stats"] = self.results.summary()
+        if "license" in include:
+            s["license"] = get_license_client().stats()
+        if "pipeline" in include and self.job is not None:
+            s["pipeline"] = self._pipeline_stats(self.job)
+        return s
+    
+    def _metrics_snapshot(self):
+        s = metrics.snapshot()
+        s["dispatch"] = self.dispatcher.stats()
+        s["license"] = get_license_client().stats()
+        if self.core is not None:
+            s["async"] = self.core.stats()
+        if self._warehouse is not None:
+            s["warehouse"] = self._warehouse.stats()
+        return s
+    
+    def getMetrics(self, reset=False):
+        """各阶段耗时直方图、计数器、分发统计和许可证接口延迟；reset=True 时读取后清零"""
+        s = self._metrics_snapshot()
+        s["status"] = "OK"
+        s["profiler"] = self.profiler.summary() if self.profiler else None
+        if reset:
+            metrics.reset()
+        return s
+    
+    def _export_file(self, path, default_name):
+        """相对路径放在导出目录（未设置时为配置目录）下；解析后不在该目录内时抛出 ValueError"""
+        base = os.path.realpath(self.state.get("exportDir") or CONFIG_DIR)
+        full = os.path.realpath(os.path.join(base, path or default_name))
+        if os.path.commonpath([base, full]) != base:
+            raise ValueError("文件必须位于导出目录内")
+        return full
+    
+    def startMetricsDump(self, path=None, interval=10):
+        """定期把指标追加写入 JSONL 文件（默认在导出目录下的 pdd_metrics.jsonl，只能写在导出目录内）"""
+        try:
+            self.stopMetricsDump()
+            path = self._export_file(path, "pdd_metrics.jsonl")
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.metrics_dumper = MetricsDumper(path, self._metrics_snapshot, float(interval))
+            self.metrics_dumper.start()
+            return {"status": "OK", "path": path}
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    def stopMetricsDump(self):
+        """停止定期写入（停止前再写一次）"""
+        if self.metrics_dumper is None:
+            return {"status": "NOT_RUNNING"}
+        dumper, self.metrics_dumper = self.metrics_dumper, None
+        dumper.stop()
+        return {"status": "OK", "path": dumper.path}
+    
+    def startProfiler(self, mode="sampler"):
+        """剖析一次采集：空闲时在下一次采集开始时启用，采集结束自动停止并写出结果
+
+        sampler 模式在采集进行中也可立即开始；cprofile 只能在采集开始前启用。
+        """
+        from profiler import RunProfiler
+        if self.profiler is not None and self.profiler.stopped_at is None:
+            return {"status": "ALREADY_RUNNING", "message": "剖析已在进行中"}
+        try:
+            profiler = RunProfiler(mode)
+        except ValueError as e:
+            return {"status": "ERROR", "message": str(e)}
+        running = self.state["status"] == "running" and self.job is not None
+        if running and mode != "sampler":
+            return {"status": "BUSY", "message": "cprofile 需在采集开始前启用"}
+        self.profiler = profiler
+        self._profiled_job = None
+        if running:
+            self._attach_profiler(self.job)
+            return {"status": "OK", "message": "剖析已开始"}
+        return {"status": "OK", "message": "将在下一次采集时开始剖析"}
+    
+    def stopProfiler(self):
+        """提前停止剖析并返回结果"""
+        if self.profiler is None:
+            return {"status": "NOT_RUNNING"}
+        return {"status": "OK", **self._finish_profiler()}
+    
+    def _attach_profiler(self, job):
+        profiler = self.profiler
+        if profiler is None or self._profiled_job is not None or profiler.stopped_at is not None:
+            return
+        self._profiled_job = job
+        if profiler.mode == "cprofile":
+            job.profiler = profiler
+        else:
+            profiler.start()
+    
+    def _finish_profiler(self):
+        profiler, job = self.profiler, self._profiled_job
+        self._profiled_job = None
+        path = None
+        if job is not None and profiler.stopped_at is None:
+            ext = ".prof" if profiler.mode == "cprofile" else ".stacks.txt"
+            path = os.path.splitext(job.out_path)[0] + ext
+        summary = profiler.stop(path)
+        self.state["profile"] = {k: summary[k] for k in ("mode", "duration", "path")}
+        return summary
+    
+    def getResults(self, limit=50, offset=0, cursor=None, since=None):
+        """获取采集结果（最新在前分页），记录、序号范围和统计取自同一时刻
+
+        cursor 为上次返回的 cursor（或任意 seq）时只返回该序号及更早的记录，翻页不受新结果影响；
+        since 只返回该序号之后的记录。newest/oldest 为当前保留的序号范围。
+        """
+        view = self.results.view(limit, offset, cursor, since)
+        state = self.state.view().data
+        newest = view["newest"]
+        return {
+            "items": view["items"],
+            "total": view["total"],
+            "offset": offset,
+            "cursor": newest if cursor is None else min(int(cursor), newest),
+            "newest": newest,
+            "oldest": view["oldest"],
+            "stats": view["stats"],
+            "collected": state["collected"],
+            "filtered": state["filtered"]
+        }
+    
+    def clearResults(self):
+        """清空结果"""
+        self.results.clear()
+        return {"status": "OK"}
+    
+    def recoverResults(self):
+        """恢复导出目录中中断的结果文件"""
+        try:
+            export_dir = self.state.get("exportDir")
+            if not export_dir or not os.path.isdir(export_dir):
+                return {"status": "NO_EXPORT_DIR", "message": "请选择导出目录"}
+            return {"status": "OK", "files": recover_dir(export_dir)}
+        except Exception as e:
+            return {"status": "ERROR", "message": f"恢复失败: {str(e)}"}
+    
+    def exportData(self, format="excel"):
+        """导出当前采集的结果
+
+        format 与结果文件格式相同时直接返回结果文件；否则（csv/csv.gz/csv.zst/jsonl/jsonl.gz/
+        jsonl.zst/parquet/arrow/xlsx）从本地结果库按任务流式分块写入结果文件旁的同名文件，
+        未写入结果库时退回内存中保留的结果（truncated 表示较早的结果已被淘汰）。
+        """
+        try:
+            fmt = normalize_format(format)
+            outfile = self.state["outfile"]
+            if not outfile:
+                return {"status": "NO_FILE", "message": "没有找到导出文件"}
+            job = self.job
+            path = export_path(outfile, fmt)
+            if path == outfile:
+                if not os.path.exists(outfile):
+                    return {"status": "NO_FILE", "message": "没有找到导出文件"}
+                return {
+                    "status": "OK",
+                    "format": fmt,
+                    "file_path": outfile,
+                    "file_size": os.path.getsize(outfile),
+                    "rows": job.results.count if job is not None else None
+                }
+            if job is None:
+                return {"status": "NO_FILE", "message": "没有可导出的结果"}
+            t0 = time.perf_counter()
+            truncated = False
+            if job.warehouse is not None and job.warehouse.sync():
+                rows = job.warehouse.export(path, fmt, {"runId": job.id}, "id", columns=COLUMNS)
+            else:
+                truncated = len(job.results) < job.results.count
+                rows = export_rows(job.results, path, fmt)
+            return {
+                "status": "OK",
+                "format": fmt,
+                "file_path": path,
+                "file_size": os.path.getsize(path),
+                "rows": rows,
+                "truncated": truncated,
+                "seconds": round(time.perf_counter() - t0, 3)
+            }
+        except ExportUnavailable as e:
+            return {"status": "UNSUPPORTED", "message": str(e)}
+        except Exception as e:
+            return {"status": "ERROR", "message": f"导出失败: {str(e)}"}
+    
+    def queryResults(self, filters=None, sort=None, page=None):
+        """跨任务查询本地结果库
+
+        filters 可含 keyword（字符串或列表）、runId、minPrice/maxPrice、minPinned/maxPinned、
+        minReviews/maxReviews、days（最近N天）、since/until、title（包含）；sort 为字段名，
+        前缀 - 表示降序；page 为 {"limit", "offset"}。
+        """
+        try:
+            page = page or {}
+            return {"status": "OK", **self._get_warehouse().query(filters, sort, page.get("limit", 50), page.get("offset", 0))}
+        except Exception as e:
+            return {"status": "ERROR", "message": f"查询失败: {str(e)}"}
+    
+    def exportQuery(self, format="csv", filters=None, sort=None):
+        """把查询结果流式写入导出目录下的 pdd_query_<时间戳>.<格式>"""
+        try:
+            export_dir = self.state.get("exportDir")
+            if not export_dir or not os.path.isdir(export_dir):
+                return {"status": "NO_EXPORT_DIR", "message": "请选择导出目录"}
+            fmt = normalize_format(format or "csv")
+            path = export_path(os.path.join(export_dir, f"pdd_query_{datetime.now().strftime('%Y%m%d_%H%M%S')}"), fmt)
+            rows = self._get_warehouse().export(path, fmt, filters, sort)
+            return {"status": "OK", "format": fmt, "file_path": path, "rows": rows, "file_size": os.path.getsize(path)}
+        except ExportUnavailable as e:
+            return {"status": "UNSUPPORTED", "message": str(e)}
+        except Exception as e:
+            return {"status": "ERROR", "message": f"导出失败: {str(e)}"}
+    
+    def listRuns(self, limit=50):
+        """本地结果库中的采集记录（最新在前）"""
+        try:
+            return {"status": "OK", "runs": self._get_warehouse().runs(limit)}
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    def enqueueJobs(self, jobs):
+        """批量提交采集任务，每个任务使用独立的结果文件"""
+        error = self._check_license()
+        if error:
+            return error
+        
+        accepted, rejected = [], []
+        for i, params in enumerate(jobs or []):
+            try:
+                parsed = self._parse_params(params)
+                if not parsed["exportDir"]:
+                    raise ValueError("请选择导出目录")
+                dedup = self._dedup_filter(parsed)
+                warehouse = self._get_warehouse() if parsed["warehouse"] else None
+            except Exception as e:
+                rejected.append({"index": i, "message": str(e)})
+                continue
+            job_id = self.jobs.new_job_id()
+            job = ScrapeJob(job_id, parsed, make_output_path(parsed["exportDir"], parsed["format"], job_id),
+                            dedup=dedup, warehouse=warehouse, checkpoint_path=checkpoint_path(CHECKPOINT_DIR, job_id),
+                            batch=self._batch_filter(parsed), on_status=self._on_queued_status)
+            self.jobs.submit(job)
+            accepted.append(job_id)
+        return {"status": "OK" if accepted else "ERROR", "jobs": accepted, "rejected": rejected}
+    
+    def listJobs(self):
+        """任务列表及汇总进度"""
+        return {"status": "OK", **self.jobs.summary()}
+    
+    def cancelJob(self, job_id):
+        """取消排队中或运行中的任务"""
+        job = self.jobs.cancel(job_id)
+        if job is None:
+            return {"status": "NOT_FOUND", "message": "任务不存在"}
+        return {"status": "OK", "job": job.to_dict()}
+    
+    def getDedupStats(self):
+        """去重索引大小（按范围）、命中与查库次数"""
+        try:
+            return {"status": "OK", **self._get_dedup_index().stats()}
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    def clearDedup(self, keyword=None):
+        """清空去重记录；传入关键词时只清该关键词范围"""
+        try:
+            scope = scope_for("keyword", keyword) if keyword else None
+            return {"status": "OK", "removed": self._get_dedup_index().clear(scope)}
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+    
+    def shutdown(self):
+        """停止所有采集、心跳和会话，清空待发送事件"""
+        self.stop_event.set()
+        self.jobs.shutdown()
+        self.stopMetricsDump()
+        if self._dedup_index is not None:
+            self._dedup_index.flush()
+        if self._warehouse is not None:
+            self._warehouse.stop()
+        stop_heartbeat(timeout=1.0)
+        if self.session.get("license_id") and self.session.get("token"):
+            try:
+                if self.core is not None:
+                    self.core.submit(self.license_async.end_session(
+                        self.session["license_id"], self.mac, self.session["token"])).result(READ_TIMEOUT)
+                else:
+                    end_session(self.session["license_id"], self.mac, self.session["token"])
+            except Exception:
+                pass
+        set_session_listener(None)
+        self.dispatcher.stop()
+        self.config.flush()
+        if self.core is not None:
+            try:
+                self.core.submit(self.license_async.aclose()).result(1.0)
+            except Exception:
+                pass
+            set_timer_factory(None)
+            self.core.stop()
@@ -0,0 +1,300 @@
+"""
+前端事件分发线程 - 合并商品/进度事件，批量调用 evaluate_js
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import wait
+
+from item_pipeline import BoundedQueue, DEFAULT_POLICIES
+from metrics import metrics
+
+PROGRESS_HZ = float(os.getenv("PDD_PROGRESS_HZ", "8"))  # 进度最高发送频率
+MIN_PROGRESS_HZ = 1.0  # 前端调用变慢时最低降到的频率
+EMIT_BUDGET = 0.05  # 进度发送最多占用的前端调用时间比例
+RATE_ALPHA = 0.3  # 速率的指数平滑系数
+
+
+def _parse_batch(value):
+    """batch_progress "已完成/总数" -> (已完成, 总数)"""
+    try:
+        done, total = str(value).split("/", 1)
+        return int(done), int(total)
+    except (TypeError, ValueError):
+        return None, None
+
+
+class ProgressAggregator:
+    """进度聚合：采集线程只覆盖最新一份原始进度，分发线程到期时才计算并发送
+
+    发送间隔不小于 1/max_hz；前端调用（evaluate_js）变慢时按平均耗时自动拉长，
+    使进度发送占用的时间不超过 EMIT_BUDGET，最低 MIN_PROGRESS_HZ。
+    发送时附带派生指标：items_per_s、visited_per_s、filter_ratio、eta（秒，来自 batch_progress）。
+    enrich(info) 可在发送前补充字段（在分发线程中调用）。
+    """
+
+    def __init__(self, max_hz=PROGRESS_HZ, min_hz=MIN_PROGRESS_HZ, enrich=None):
+        self._lock = threading.Lock()
+        self.enrich = enrich
+        self.set_rate(max_hz, min_hz)
+        self.reset()
+
+    def set_rate(self, max_hz, min_hz=MIN_PROGRESS_HZ):
+        self.max_hz = max(0.1, float(max_hz))
+        self.min_hz = min(self.max_hz, float(min_hz))
+        self.interval = 1.0 / self.max_hz
+
+    def reset(self):
+        with self._lock:
+            self._latest = None
+            self.coalesced = 0
+        self._last_sent = 0.0
+        self._prev = None  # (时刻, collected, visited, 批次已完成数)
+        self.rates = {"items_per_s": 0.0, "visited_per_s": 0.0, "batch_per_s": 0.0}
+        self.emit_latency = 0.0
+
+    def update(self, info):
+        with self._lock:
+            if self._latest is not None:
+                self.coalesced += 1
+            self._latest = info
+
+    @property
+    def pending(self):
+        return self._latest is not None
+
+    def observe_emit(self, seconds):
+        """记录一次前端调用耗时并调整发送间隔"""
+        self.emit_latency += RATE_ALPHA * (seconds - self.emit_latency)
+        self.interval = min(1.0 / self.min_hz, max(1.0 / self.max_hz, self.emit_latency / EMIT_BUDGET))
+
+    def take(self, force=False):
+        """到期（或 force）时返回要发送的进度，否则返回 None"""
+        now = time.monotonic()
+        if not force and now - self._last_sent < self.interval:
+            return None
+        with self._lock:
+            info, self._latest = self._latest, None
+        if info is None:
+            return None
+        self._last_sent = now
+        info = dict(info)
+        info.update(self._derive(now, info))
+        if self.enrich:
+            info = self.enrich(info)
+        return info
+
+    def _derive(self, now, info):
+        collected = info.get("collected") or 0
+        visited = info.get("visited") or 0
+        filtered = info.get("filtered") or 0
+        done, total = _parse_batch(info.get("batch_progress"))
+        if self._prev is not None:
+            dt = now - self._prev[0]
+            if dt > 0:
+                for key, cur, prev in (("items_per_s", collected, self._prev[1]),
+                                       ("visited_per_s", visited, self._prev[2]),
+                                       ("batch_per_s", done or 0, self._prev[3])):
+                    rate = max(0.0, (cur - prev) / dt)
+                    self.rates[key] += RATE_ALPHA * (rate - self.rates[key])
+        self._prev = (now, collected, visited, done or 0)
+        eta = None
+        if total and done is not None and self.rates["batch_per_s"] > 0:
+            eta = round(max(0, total - done) / self.rates["batch_per_s"], 1)
+        return {
+            "items_per_s": round(self.rates["items_per_s"], 2),
+            "visited_per_s": round(self.rates["visited_per_s"], 2),
+            "filter_ratio": round(filtered / visited, 4) if visited else 0.0,
+            "eta": eta,
+            "progress_hz": round(1.0 / self.interval, 2),
+        }
+
+
+class UIDispatcher(threading.Thread):
+    """独立的分发线程：采集线程只负责入队，永不阻塞在 UI 调用上
+
+    - 商品按帧合并：每帧最多 max_batch 条或等待 max_delay 秒，一帧一次 __onItems(batch)
+    - 进度只保留最新快照，由 ProgressAggregator 按自适应频率发送 __onProgress
+    - 状态等事件（push_event）按顺序排在之前的商品之后发送
+    - 商品队列满时按 policy 处理（见 item_pipeline），默认丢弃最旧的商品；事件不会被丢弃
+    """
+
+    def __init__(self, emit, max_batch=50, max_delay=0.1, maxsize=5000, progress_hz=PROGRESS_HZ,
+                 policy=DEFAULT_POLICIES["ui"]):
+        super().__init__(daemon=True)
+        self.emit = emit  # emit(callback_name, payload)，在分发线程中调用
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = BoundedQueue(maxsize, policy)
+        self.progress = ProgressAggregator(progress_hz)
+        self._stop_event = threading.Event()
+        self.counters = {
+            "items_in": 0,
+            "items_sent": 0,
+            "frames": 0,
+            "progress_sent": 0,
+            "emit_errors": 0,
+        }
+
+    def push_item(self, item, policy=None):
+        """商品入队；队列满时按 policy（缺省为分发器的策略）处理"""
+        self.counters["items_in"] += 1
+        self._queue.put(("item", item), policy)
+
+    def push_progress(self, info):
+        """覆盖最新进度快照"""
+        self.progress.update(info)
+
+    def push_event(self, name, payload):
+        """单独的前端回调（状态、许可证结果等）很少，排队时允许短暂等待，保证不丢失"""
+        self._queue.put(("event", (name, payload)), "block", timeout=1.0)
+
+    def push_status(self, status):
+        self.push_event("__onStatus", status)
+
+    def stats(self):
+        s = dict(self.counters)
+        s["coalesced_progress"] = self.progress.coalesced
+        q = self._queue.stats()
+        s["queue_depth"] = q["depth"]
+        s["dropped_items"] = q["dropped"] + q["sampled"]
+        s["queue"] = q
+        s["progress_hz"] = round(1.0 / self.progress.interval, 2)
+        s["emit_latency"] = self.progress.emit_latency
+        return s
+
+    def stop(self, timeout=2.0):
+        """停止分发，剩余事件会在退出前发送"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def _send(self, name, payload):
+        t0 = time.perf_counter()
+        try:
+            self.emit(name, payload)
+        except Exception:
+            self.counters["emit_errors"] += 1
+        elapsed = time.perf_counter() - t0
+        self.progress.observe_emit(elapsed)
+        metrics.observe(f"emit.{name.lstrip('_')}", elapsed)
+
+    def _flush(self, batch, events, force=False):
+        if batch:
+            self._send("__onItems", batch)
+            self.counters["items_sent"] += len(batch)
+            self.counters["frames"] += 1
+        # 状态变化前先把最新进度发出去，保证前端看到最终数字
+        try:
+            info = self.progress.take(force=force or bool(events))
+        except Exception:
+            info = None
+            self.counters["emit_errors"] += 1
+        if info is not None:
+            self._send("__onProgress", info)
+            self.counters["progress_sent"] += 1
+        for name, payload in events:
+            self._send(name, payload)
+
+    def run(self):
+        while True:
+            stopping = self._stop_event.is_set()
+            batch, events = [], []
+            deadline = time.monotonic() + self.max_delay
+            # 收集一帧：攒满 max_batch 条、遇到状态事件或到达帧截止时间
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    if stopping or timeout <= 0:
+                        kind, payload = self._queue.get_nowait()
+                    else:
+                        kind, payload = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if kind == "event":
+                    events.append(payload)
+                    break
+                batch.append(payload)
+            self._flush(batch, events, force=stopping)
+            if stopping and self._queue.empty() and not self.progress.pending:
+                return
+
+
+class AsyncUIDispatcher(UIDispatcher):
+    """UIDispatcher 的事件循环版本：帧的收集作为 async_core 循环中的任务运行，
+    每帧的 evaluate_js 在核心线程池中调用，上一帧发完才收集下一帧，顺序不变
+
+    帧内队列为空时等待 asyncio.Event（最多到帧截止时间），push_item/push_event/stop
+    通过 loop.call_soon_threadsafe 唤醒；只在任务正在等待时唤醒，入队不会每条都写循环的唤醒管道。
+    """
+
+    def __init__(self, emit, core, **kwargs):
+        super().__init__(emit, **kwargs)
+        self.core = core
+        self._future = None
+        self._loop = None
+        self._wakeup = None
+        self._waiting = False
+
+    def start(self):
+        self._future = self.core.submit(self._run_async())
+
+    def is_alive(self):
+        return self._future is not None and not self._future.done()
+
+    def push_item(self, item, policy=None):
+        super().push_item(item, policy)
+        self._wake()
+
+    def push_event(self, name, payload):
+        super().push_event(name, payload)
+        self._wake()
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        self._wake()
+        if self.is_alive() and not self.core.in_loop():
+            wait([self._future], timeout)
+
+    def _wake(self):
+        # 先入队再检查 _waiting；任务先置 _waiting 再检查队列，两边至少一方看到对方
+        if self._waiting:
+            self._waiting = False
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass  # 循环已关闭
+
+    async def _run_async(self):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        self._loop, self._wakeup = loop, asyncio.Event()
+        while True:
+            stopping = self._stop_event.is_set()
+            batch, events = [], []
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    kind, payload = self._queue.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - loop.time()
+                    if stopping or remaining <= 0 or self._stop_event.is_set():
+                        break
+                    self._wakeup.clear()
+                    self._waiting = True
+                    if self._queue.empty() and not self._stop_event.is_set():
+                        try:
+                            await asyncio.wait_for(self._wakeup.wait(), remaining)
+                        except asyncio.TimeoutError:
+                            pass
+                    self._waiting = False
+                    continue
+                if kind == "event":
+                    events.append(payload)
+                    break
+                batch.append(payload)
+            if batch or events or self.progress.pending:
+                await self.core.run_blocking(self._flush, batch, events, stopping)
+            if stopping and self._queue.empty() and not self.progress.pending:
+                return
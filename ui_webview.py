@@ -4,8 +4,10 @@ import os
 import time
 import webview
 from datetime import datetime
+from app_state import AppState
 from pdd_scraper import run_scraper, DEFAULT_KEYWORD, DEFAULT_PRICE_THRESHOLD, DEFAULT_PINNED_THRESHOLD, DEFAULT_REVIEWS_THRESHOLD
-from license_client import get_machine_hash, activate as lic_activate, validate as lic_validate, HeartbeatThread, end_session, load_license_state, save_license_state
+from license_client import get_machine_hash, activate as lic_activate, start_heartbeat, stop_heartbeat, end_session, load_license_state, save_license_state, validate_cached
+from config_store import get_config
 
 class Bridge:
     def __init__(self, window):
@@ -14,7 +16,7 @@ class Bridge:
         self.session = {"license_id": None, "token": None}
         self.hb_thread = None
         self.stop_event = threading.Event()
-        self.state = {
+        self.state = AppState({
             "keyword": DEFAULT_KEYWORD,
             "price": DEFAULT_PRICE_THRESHOLD,
             "pinned": DEFAULT_PINNED_THRESHOLD,
@@ -29,7 +31,7 @@ class Bridge:
             "batch_progress": "0/0",
             "avg_price": 0.0,
             "avg_pinned": 0.0,
-        }
+        })
         self._sum_price = 0.0
         self._sum_pinned = 0.0
         self._sum_count = 0
@@ -44,12 +46,7 @@ class Bridge:
                 path = path[0]
             if path:
                 self.state["exportDir"] = path
-                cfg = {"client": {"export_dir": path}}
-                try:
-                    with open(os.path.join(os.getenv("APPDATA", os.path.expanduser("~")), "PDDScraper", "app.ini"), "w", encoding="utf-8") as f:
-                        f.write("[client]\nexport_dir=" + path)
-                except Exception:
-                    pass
+                get_config().set("export_dir", path)
             return {"status": "OK", "path": path or ""}
         except Exception as e:
             return {"status": "ERROR", "message": str(e)}
@@ -69,17 +66,11 @@ class Bridge:
         if not key:
             return {"status": "NO_KEY"}
         try:
-            r = lic_validate(key, self.mac)
+            r = validate_cached(key, self.mac, force=True)
             if r.get("status") == "OK":
                 self.session["license_id"] = r.get("license_id")
                 self.session["token"] = r.get("session_token")
-                if self.hb_thread:
-                    try:
-                        self.hb_thread.stop()
-                    except Exception:
-                        pass
-                self.hb_thread = HeartbeatThread(r.get("license_id"), self.mac, r.get("session_token"), interval=30)
-                self.hb_thread.start()
+                self.hb_thread = start_heartbeat(r.get("license_id"), self.mac, r.get("session_token"), interval=30)
             return r
         except Exception as e:
             return {"status": "ERROR", "message": str(e)}
@@ -90,11 +81,8 @@ class Bridge:
         try:
             r = end_session(self.session["license_id"], self.mac, self.session["token"])
             if r.get("status") == "OK":
-                if self.hb_thread:
-                    try:
-                        self.hb_thread.stop()
-                    except Exception:
-                        pass
+                stop_heartbeat()
+                self.hb_thread = None
                 self.session["token"] = None
             return r
         except Exception as e:
@@ -115,7 +103,7 @@ class Bridge:
         if not st.get("license_key"):
             return {"status": "NO_KEY"}
         try:
-            r = lic_validate(st["license_key"], self.mac)
+            r = validate_cached(st["license_key"], self.mac)
         except Exception as e:
             return {"status": "ERROR", "message": str(e)}
         if r.get("status") != "OK":
@@ -132,8 +120,11 @@ class Bridge:
                 self._sum_price += float(item.get("price") or 0)
                 self._sum_pinned += float(item.get("pinned") or 0)
                 self._sum_count += 1
-                self.state["avg_price"] = self._sum_price / max(1, self._sum_count)
-                self.state["avg_pinned"] = self._sum_pinned / max(1, self._sum_count)
+                # 两个均值一起发布，getState 不会读到只更新了一半的均值
+                self.state.update({
+                    "avg_price": self._sum_price / max(1, self._sum_count),
+                    "avg_pinned": self._sum_pinned / max(1, self._sum_count),
+                })
                 self.window.evaluate_js("window.__onItem && window.__onItem(" + json.dumps(item) + ")")
             except Exception:
                 pass
@@ -177,7 +168,7 @@ class Bridge:
         return {"status": "OK"}
 
     def getState(self):
-        s = dict(self.state)
+        s = self.state.snapshot()
         s["now"] = datetime.now().isoformat()
         return s
 
@@ -198,8 +189,9 @@ class Bridge:
         """Exit the application"""
         try:
             # End any active session first
+            stop_heartbeat(timeout=1.0)
             if self.session.get("license_id") and self.session.get("token"):
-                end_session(self.session["license_id"], self.session["token"])
+                end_session(self.session["license_id"], self.mac, self.session["token"])
             
             # Destroy the window
             self.window.destroy()
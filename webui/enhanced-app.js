@@ -20,6 +20,59 @@ let appState = {
 // DOM元素缓存
 const elements = {};
 
+// 结果列表与日志：固定数量的节点，每帧最多渲染一次
+const ROW_HEIGHT = 37;      // 结果行固定高度（px），与 style.css 中 .resultRow 一致
+const OVERSCAN = 6;         // 可见区域上下多渲染的行数
+const LIVE_KEEP = 500;      // 前端保留的最新商品数，更早的按需向后端分页读取
+const PAGE_SIZE = 100;      // 每次分页读取的条数
+const CACHE_LIMIT = 2000;   // 分页缓存的最大条数
+const CARD_COUNT = 50;      // 实时卡片数
+const LOG_SIZE = 150;       // 实时日志行数
+
+const resultView = {
+    generation: 0,          // 每次开始采集加一，丢弃上一轮的分页响应
+    newestSeq: -1,          // 已知最新商品序号
+    oldestSeq: 0,           // 后端仍保留的最早序号
+    live: [],               // 最新 LIVE_KEEP 条（末尾最新）
+    cache: new Map(),       // 分页读取的较早商品 seq -> item（null 表示后端已无此条）
+    loading: new Set(),     // 正在请求的页号
+    pending: [],            // 等待下一帧处理的商品
+    rows: [],               // 结果行节点池
+    cards: [],              // 卡片节点池
+    spacer: null,
+    dirty: false
+};
+const logRing = { lines: [], cleared: false };
+let frameRequested = false;
+
+// 异步模式下许可证调用先返回 PENDING，结果由 __onLicense 送回：request_id -> resolve
+const pendingLicense = new Map();
+const arrivedLicense = new Map();  // 先于 PENDING 返回值到达的结果
+
+window.__onLicense = function(event) {
+    const resolve = pendingLicense.get(event.request_id);
+    if (resolve) {
+        pendingLicense.delete(event.request_id);
+        resolve(event.result);
+    } else {
+        arrivedLicense.set(event.request_id, event.result);
+    }
+};
+
+// 调用许可证接口，两种模式下都返回最终结果
+async function callLicense(method, ...args) {
+    const result = await window.pywebview.api[method](...args);
+    if (!result || result.status !== 'PENDING') {
+        return result;
+    }
+    if (arrivedLicense.has(result.request_id)) {
+        const arrived = arrivedLicense.get(result.request_id);
+        arrivedLicense.delete(result.request_id);
+        return arrived;
+    }
+    return new Promise(resolve => pendingLicense.set(result.request_id, resolve));
+}
+
 // 初始化应用
 document.addEventListener('DOMContentLoaded', function() {
     // Bind disclaimer events immediately
@@ -139,6 +192,12 @@ function bindEvents() {
     if (elements.copyMachineBtn) {
         elements.copyMachineBtn.addEventListener('click', copyMachineCode);
     }
+    if (elements.resultBox) {
+        elements.resultBox.addEventListener('scroll', function() {
+            resultView.dirty = true;
+            scheduleFrame();
+        }, { passive: true });
+    }
 }
 
 // 加载初始状态
@@ -166,8 +225,14 @@ async function loadInitialState() {
         elements.machine.textContent = `机器码：${machineHash}`;
         
         // 获取应用状态
-        const state = await window.pywebview.api.getState();
+        let state = await window.pywebview.api.getState();
         if (state) {
+            // 后端在后台预热，未就绪时按版本增量轮询直到默认参数可用
+            while (!state.ready) {
+                await new Promise(resolve => setTimeout(resolve, 200));
+                const delta = await window.pywebview.api.getState(state.version);
+                state = Object.assign(state, delta);
+            }
             elements.kw.value = state.keyword || '';
             elements.price.value = state.price || '';
             elements.pinned.value = state.pinned || '';
@@ -177,11 +242,20 @@ async function loadInitialState() {
                 toggleExportTip();
             }
             updateStatus(state.status);
+            
+            // 页面重新加载时从后端已有结果开始浏览
+            const page = await window.pywebview.api.getResults(1);
+            if (page && page.newest >= 0) {
+                resultView.newestSeq = page.newest;
+                resultView.oldestSeq = page.oldest;
+                resultView.dirty = true;
+                scheduleFrame();
+            }
         }
         
         // 验证现有许可证 - simplified for customer interface
         try {
-            const result = await window.pywebview.api.validate();
+            const result = await callLicense('validate');
             if (result.status === 'OK') {
                 appState.licenseId = result.license_id;
                 appState.sessionToken = result.session_token;
@@ -262,7 +336,7 @@ async function activateLicense() {
     
     try {
         showMessage('正在激活...', 'info');
-        const result = await window.pywebview.api.activate(licenseKey);
+        const result = await callLicense('activate', licenseKey);
         
         if (result.status === 'OK') {
             appState.licenseKey = licenseKey;
@@ -333,6 +407,7 @@ async function startScraping() {
         const result = await window.pywebview.api.startScrape(params);
         
         if (result.status === 'OK') {
+            resetResultView();
             appState.scrapingActive = true;
             elements.startBtn.disabled = true;
             elements.stopBtn.disabled = false;
@@ -347,9 +422,25 @@ async function startScraping() {
                 addResultItem(item);
             };
             
+            // 批量商品回调（后端按帧合并发送）
+            window.__onItems = function(items) {
+                resultView.pending.push(...items);
+                scheduleFrame();
+            };
+            
             window.__onStatus = function(status) {
                 updateStatus(status);
-                if (status === 'idle') {
+                if (status === 'paused') {
+                    appState.scrapingActive = false;
+                    elements.startBtn.disabled = false;
+                    elements.stopBtn.disabled = true;
+                    showMessage('许可证心跳连续失败，采集已暂停', 'error');
+                } else if (status === 'error') {
+                    appState.scrapingActive = false;
+                    elements.startBtn.disabled = false;
+                    elements.stopBtn.disabled = true;
+                    showMessage('采集出错，已停止', 'error');
+                } else if (status === 'idle') {
                     appState.scrapingActive = false;
                     elements.startBtn.disabled = false;
                     elements.stopBtn.disabled = true;
@@ -398,7 +489,14 @@ async function stopScraping() {
 
 // 更新进度
 function updateProgress(data) {
-    const progressText = `已访:${data.visited || 0} | 采:${data.collected || 0} | 过:${data.filtered || 0}`;
+    let progressText = `已访:${data.visited || 0} | 采:${data.collected || 0} | 过:${data.filtered || 0}`;
+    // 后端按自适应频率推送，附带吞吐和预计剩余时间
+    if (data.items_per_s) {
+        progressText += ` | ${Number(data.items_per_s).toFixed(1)}条/秒`;
+    }
+    if (data.eta !== undefined && data.eta !== null) {
+        progressText += ` | 剩余约${formatDuration(data.eta)}`;
+    }
     appendNowLine(progressText);
     if (elements.mCollected) {
         elements.mCollected.textContent = data.collected || 0;
@@ -411,49 +509,236 @@ function updateProgress(data) {
     }
 }
 
-// 添加结果项
+function formatDuration(seconds) {
+    const s = Math.max(0, Math.round(seconds));
+    if (s < 60) return `${s}秒`;
+    if (s < 3600) return `${Math.floor(s / 60)}分${s % 60}秒`;
+    return `${Math.floor(s / 3600)}小时${Math.floor((s % 3600) / 60)}分`;
+}
+
+// 添加结果项（下一帧统一渲染）
 function addResultItem(item) {
-    const list = elements.cardList;
-    if (list) {
-        const idx = list.children.length + 1;
-        const title = (item.title || '').toString().slice(0, 10);
-        const price = item.price || 0;
-        const pinned = item.pinned || 0;
-        const reviews = item.reviews || 0;
-        const url = item.url || '';
-        const card = document.createElement('div');
-        card.className = 'itemCard';
-        card.innerHTML = `
-            <div class="index">${idx}</div>
-            <div class="meta">${title}</div>
-            <div class="price">¥${price}</div>
-            <div>拼单:${pinned}</div>
-            <div>评价:${reviews}</div>
-        `;
-        list.insertBefore(card, list.firstChild);
-        while (list.children.length > 50) {
-            list.removeChild(list.lastChild);
+    resultView.pending.push(item);
+    scheduleFrame();
+}
+
+function scheduleFrame() {
+    if (frameRequested) return;
+    frameRequested = true;
+    requestAnimationFrame(renderFrame);
+}
+
+function renderFrame() {
+    frameRequested = false;
+    flushPendingItems();
+    if (resultView.dirty) {
+        resultView.dirty = false;
+        renderResults();
+        renderCards();
+    }
+    if (logRing.lines.length) {
+        renderLog();
+    }
+}
+
+// 开始新一轮采集时清空列表（后端结果同时重置）
+function resetResultView() {
+    resultView.generation += 1;
+    resultView.newestSeq = -1;
+    resultView.oldestSeq = 0;
+    resultView.live = [];
+    resultView.cache.clear();
+    resultView.loading.clear();
+    resultView.pending = [];
+    resultView.dirty = true;
+    if (elements.resultBox) elements.resultBox.scrollTop = 0;
+    scheduleFrame();
+}
+
+function itemTitle(item) {
+    return (item.title || '未知商品').toString();
+}
+
+function flushPendingItems() {
+    const items = resultView.pending;
+    if (!items.length) return;
+    resultView.pending = [];
+    let added = 0;
+    for (const item of items) {
+        // 没有序号的商品（旧版回调）按到达顺序编号
+        const seq = typeof item.seq === 'number' ? item.seq : resultView.newestSeq + 1;
+        if (seq <= resultView.newestSeq) continue;
+        item.seq = seq;
+        added += seq - resultView.newestSeq;
+        resultView.newestSeq = seq;
+        resultView.live.push(item);
+        appendNowLine(`${itemTitle(item).slice(0, 10)} | ¥${item.price || 0} | 拼:${item.pinned || 0} | 评:${item.reviews || 0}`);
+    }
+    if (resultView.live.length > LIVE_KEEP) {
+        resultView.live.splice(0, resultView.live.length - LIVE_KEEP);
+    }
+    const box = elements.resultBox;
+    if (box && resultView.spacer) {
+        resultView.spacer.style.height = `${resultTotal() * ROW_HEIGHT}px`;
+        // 用户向下浏览较早结果时保持当前可见行不动，停在顶部时跟随最新
+        if (added && box.scrollTop >= ROW_HEIGHT) {
+            box.scrollTop += added * ROW_HEIGHT;
         }
-        appendNowLine(`${title} | ¥${price} | 拼:${pinned} | 评:${reviews}`);
     }
-    if (elements.resultBox) {
-        const row = document.createElement('div');
-        row.className = 'resultRow';
-        const title = (item.title || '未知商品').toString();
-        row.innerHTML = `
-            <div class="title">${item.url ? `<a href="${item.url}" target="_blank">${title}</a>` : title}</div>
-            <div class="price">¥${item.price || 0}</div>
-            <div class="pinned">${item.pinned || 0}</div>
-            <div class="reviews">${item.reviews || 0}</div>
-        `;
-        elements.resultBox.insertBefore(row, elements.resultBox.firstChild);
-        while (elements.resultBox.children.length > 200) {
-            elements.resultBox.removeChild(elements.resultBox.lastChild);
+    resultView.dirty = true;
+}
+
+function resultTotal() {
+    return Math.max(0, resultView.newestSeq - resultView.oldestSeq + 1);
+}
+
+function lookupItem(seq) {
+    const live = resultView.live;
+    if (live.length && seq >= live[0].seq) {
+        // 序号连续时直接定位，有缺口（分发丢弃）时退回查找
+        const i = live.length - 1 - (resultView.newestSeq - seq);
+        if (i >= 0 && live[i].seq === seq) return live[i];
+        const found = live.find(item => item.seq === seq);
+        if (found) return found;
+    }
+    return resultView.cache.get(seq);
+}
+
+async function requestPage(seq) {
+    const page = Math.floor(seq / PAGE_SIZE);
+    if (resultView.loading.has(page) || !(window.pywebview && window.pywebview.api)) return;
+    resultView.loading.add(page);
+    const generation = resultView.generation;
+    const first = page * PAGE_SIZE;
+    try {
+        const r = await window.pywebview.api.getResults(PAGE_SIZE, 0, first + PAGE_SIZE - 1, first - 1);
+        if (generation !== resultView.generation) return;
+        if (typeof r.oldest === 'number') resultView.oldestSeq = r.oldest;
+        const got = new Map((r.items || []).map(item => [item.seq, item]));
+        for (let s = first; s < first + PAGE_SIZE && s <= resultView.newestSeq; s++) {
+            resultView.cache.set(s, got.has(s) ? got.get(s) : null);
         }
-        if (elements.badgeCnt) {
-            const current = Number(elements.mCollected ? elements.mCollected.textContent : 0) || 0;
-            elements.badgeCnt.textContent = `已采集：${current} 条数据`;
+        // Map 按插入顺序迭代，先删最早写入的
+        for (const key of resultView.cache.keys()) {
+            if (resultView.cache.size <= CACHE_LIMIT) break;
+            resultView.cache.delete(key);
         }
+        resultView.dirty = true;
+        scheduleFrame();
+    } catch (error) {
+        console.log('读取结果分页失败:', error);
+    } finally {
+        resultView.loading.delete(page);
+    }
+}
+
+function ensureResultPool() {
+    const box = elements.resultBox;
+    if (resultView.spacer) return;
+    box.textContent = '';
+    resultView.spacer = document.createElement('div');
+    resultView.spacer.className = 'resultSpacer';
+    box.appendChild(resultView.spacer);
+    const count = Math.ceil((box.clientHeight || 300) / ROW_HEIGHT) + OVERSCAN * 2;
+    for (let i = 0; i < count; i++) {
+        const el = document.createElement('div');
+        el.className = 'resultRow';
+        const title = document.createElement('div');
+        title.className = 'title';
+        const link = document.createElement('a');
+        link.target = '_blank';
+        title.appendChild(link);
+        const price = document.createElement('div');
+        price.className = 'price';
+        const pinned = document.createElement('div');
+        pinned.className = 'pinned';
+        const reviews = document.createElement('div');
+        reviews.className = 'reviews';
+        el.append(title, price, pinned, reviews);
+        el.style.display = 'none';
+        box.appendChild(el);
+        resultView.rows.push({ el, link, price, pinned, reviews, seq: null, item: undefined });
+    }
+}
+
+// 虚拟列表：只渲染可见区域附近的行，节点数与结果总数无关
+function renderResults() {
+    const box = elements.resultBox;
+    if (!box) return;
+    ensureResultPool();
+    const total = resultTotal();
+    resultView.spacer.style.height = `${total * ROW_HEIGHT}px`;
+    const first = Math.max(0, Math.floor(box.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    resultView.rows.forEach((row, i) => {
+        const idx = first + i;
+        if (idx >= total) {
+            row.el.style.display = 'none';
+            row.seq = null;
+            return;
+        }
+        const seq = resultView.newestSeq - idx;
+        const item = lookupItem(seq);
+        row.el.style.display = '';
+        row.el.style.transform = `translateY(${idx * ROW_HEIGHT}px)`;
+        if (item === undefined) requestPage(seq);
+        if (row.seq === seq && row.item === item) return;
+        row.seq = seq;
+        row.item = item;
+        if (item) {
+            row.link.textContent = itemTitle(item);
+            if (item.url) {
+                row.link.href = item.url;
+            } else {
+                row.link.removeAttribute('href');
+            }
+            row.price.textContent = `¥${item.price || 0}`;
+            row.pinned.textContent = item.pinned || 0;
+            row.reviews.textContent = item.reviews || 0;
+        } else {
+            row.link.removeAttribute('href');
+            row.link.textContent = item === null ? '（已超出保留范围）' : '加载中…';
+            row.price.textContent = row.pinned.textContent = row.reviews.textContent = '';
+        }
+    });
+    if (elements.badgeCnt) {
+        const current = Number(elements.mCollected ? elements.mCollected.textContent : 0) || 0;
+        elements.badgeCnt.textContent = `已采集：${Math.max(current, resultView.newestSeq + 1)} 条数据`;
+    }
+}
+
+// 实时卡片：最新 CARD_COUNT 条，复用节点
+function renderCards() {
+    const list = elements.cardList;
+    if (!list) return;
+    const live = resultView.live;
+    for (let i = 0; i < CARD_COUNT; i++) {
+        let card = resultView.cards[i];
+        const item = live[live.length - 1 - i];
+        if (!item) {
+            if (card) card.el.style.display = 'none';
+            continue;
+        }
+        if (!card) {
+            const el = document.createElement('div');
+            el.className = 'itemCard';
+            const parts = ['index', 'meta', 'price', '', ''].map(cls => {
+                const div = document.createElement('div');
+                if (cls) div.className = cls;
+                el.appendChild(div);
+                return div;
+            });
+            list.appendChild(el);
+            card = resultView.cards[i] = { el, parts, item: null };
+        }
+        card.el.style.display = '';
+        if (card.item === item) continue;
+        card.item = item;
+        const [index, meta, price, pinned, reviews] = card.parts;
+        index.textContent = item.seq + 1;
+        meta.textContent = itemTitle(item).slice(0, 10);
+        price.textContent = `¥${item.price || 0}`;
+        pinned.textContent = `拼单:${item.pinned || 0}`;
+        reviews.textContent = `评价:${item.reviews || 0}`;
     }
 }
 
@@ -619,15 +904,31 @@ async function copyMachineCode() {
     }
 }
 
+// 日志写入定长缓冲，下一帧只渲染最后 LOG_SIZE 行，节点循环复用
 function appendNowLine(text){
-    if(!elements.nowList) return;
-    const line=document.createElement('div');
-    line.textContent=text;
-    elements.nowList.appendChild(line);
-    while(elements.nowList.children.length>150){
-        elements.nowList.removeChild(elements.nowList.firstChild);
-    }
-    elements.nowList.scrollTop=elements.nowList.scrollHeight;
+    logRing.lines.push(text);
+    if(logRing.lines.length>LOG_SIZE){
+        logRing.lines.splice(0,logRing.lines.length-LOG_SIZE);
+    }
+    scheduleFrame();
+}
+
+function renderLog(){
+    const list=elements.nowList;
+    const lines=logRing.lines;
+    logRing.lines=[];
+    if(!list) return;
+    if(!logRing.cleared){
+        list.textContent='';
+        logRing.cleared=true;
+    }
+    for(const text of lines){
+        const line=list.children.length<LOG_SIZE? document.createElement('div'):list.firstElementChild;
+        line.textContent=text;
+        list.appendChild(line);
+    }
+    const scroller=list.parentElement||list;
+    scroller.scrollTop=scroller.scrollHeight;
 }
 
 function toggleExportTip(){